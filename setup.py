@@ -5,12 +5,26 @@ It needs to be called manually with python3 cython_build.py build_ext --inplace.
 
 from __future__ import annotations
 
+import sys
+
 import numpy as np
 from Cython.Build import cythonize
-from setuptools import setup
+from setuptools import Extension, setup
 
 __copyright__ = "Copyright 2024, Molara"
 
+# OpenMP flags for the modules that evaluate grids in parallel. Apple clang does not ship OpenMP, hence the modules
+# are compiled without it on macOS and the parallel loops run serially.
+if sys.platform == "win32":
+    openmp_compile_args = ["/openmp"]
+    openmp_link_args: list[str] = []
+elif sys.platform == "darwin":
+    openmp_compile_args = []
+    openmp_link_args = []
+else:
+    openmp_compile_args = ["-fopenmp"]
+    openmp_link_args = ["-fopenmp"]
+
 # Modules to be compiled and include_dirs when necessary
 extensions = [
     "src/molara/rendering/cylinders.pyx",
@@ -23,9 +37,24 @@ extensions = [
     "src/molara/eval/aos.pxd",
     "src/molara/eval/mos.pyx",
     "src/molara/eval/mos.pxd",
-    "src/molara/eval/generate_voxel_grid.pyx",
-    "src/molara/eval/marchingcubes.pyx",
     "src/molara/eval/marchingsquares.pyx",
+    "src/molara/eval/overlap.pyx",
+]
+
+# Modules to be compiled with OpenMP support
+parallel_extensions = [
+    Extension(
+        "molara.eval.generate_voxel_grid",
+        ["src/molara/eval/generate_voxel_grid.pyx"],
+        extra_compile_args=openmp_compile_args,
+        extra_link_args=openmp_link_args,
+    ),
+    Extension(
+        "molara.eval.marchingcubes",
+        ["src/molara/eval/marchingcubes.pyx"],
+        extra_compile_args=openmp_compile_args,
+        extra_link_args=openmp_link_args,
+    ),
 ]
 
 
@@ -35,6 +64,6 @@ setup(
     # A list of compiler Directives is available at
     # https://cython.readthedocs.io/en/latest/src/userguide/source_files_and_compilation.html#compiler-directives
     # external to be compiled
-    ext_modules=cythonize(extensions, compiler_directives={"language_level": 3}),
+    ext_modules=cythonize(extensions + parallel_extensions, compiler_directives={"language_level": 3}),
     include_dirs=[np.get_include()],
 )
@@ -0,0 +1,247 @@
+"""Coarse-to-fine evaluation of orbital grids, refining only the regions around an isosurface."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+from scipy import ndimage
+
+from molara.eval.generate_voxel_grid import generate_voxel_grids, grid_dtype
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from numpy.typing import DTypeLike, NDArray
+
+    from molara.structure.basisset import PackedBasisSet
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+def coarse_grid_parameters(
+    voxel_size: NDArray,
+    voxel_number: NDArray,
+    coarsening_factor: int,
+) -> tuple[NDArray, NDArray]:
+    """Calculate the voxel size and number of a coarse grid with the same origin as the given grid.
+
+    Every coarsening_factor-th point of the fine grid is a point of the coarse grid and the coarse grid covers the
+    whole fine grid, so its last points may lie outside of the fine grid.
+
+    :param voxel_size: 2D array (3x3) defining the size of the voxels of the fine grid in each direction
+    :param voxel_number: number of voxels of the fine grid in each direction
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :return: voxel size and voxel number of the coarse grid
+    """
+    if coarsening_factor < 1:
+        msg = "The coarsening factor must be a positive integer"
+        raise ValueError(msg)
+    voxel_number = np.asarray(voxel_number, dtype=np.int64)
+    coarse_voxel_number = (np.maximum(voxel_number, 1) - 1 + coarsening_factor - 1) // coarsening_factor + 1
+    coarse_voxel_size = np.asarray(voxel_size, dtype=np.float64) * coarsening_factor
+    return coarse_voxel_size, coarse_voxel_number.astype(np.int64)
+
+
+def coarse_cell_indices(number_of_points: int, coarsening_factor: int, number_of_coarse_points: int) -> NDArray:
+    """Return the index of the coarse cell containing each point of the fine grid along one axis.
+
+    :param number_of_points: number of points of the fine grid along the axis
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :param number_of_coarse_points: number of points of the coarse grid along the axis
+    :return: index of the first coarse point of the cell of each fine point
+    """
+    return np.minimum(np.arange(number_of_points) // coarsening_factor, max(number_of_coarse_points - 2, 0))
+
+
+def interpolate_coarse_grid(coarse_grid: NDArray, voxel_number: NDArray, coarsening_factor: int) -> NDArray:
+    """Interpolate a coarse grid trilinearly to the points of the fine grid.
+
+    The interpolation is separable and applied along one axis after the other. The leading axes of coarse_grid which
+    are not part of the grid (e.g. several orbitals) are kept. Grids of single precision are interpolated in single
+    precision.
+
+    :param coarse_grid: values on the coarse grid, the grid axes are the last three axes
+    :param voxel_number: number of voxels of the fine grid in each direction
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :return: values on the fine grid
+    """
+    grid = np.asarray(coarse_grid)
+    if grid.dtype != np.float32:
+        grid = grid.astype(np.float64, copy=False)
+    number_of_grid_dimensions = 3
+    for axis in range(number_of_grid_dimensions):
+        grid_axis = grid.ndim - number_of_grid_dimensions + axis
+        number_of_coarse_points = grid.shape[grid_axis]
+        lower = coarse_cell_indices(int(voxel_number[axis]), coarsening_factor, number_of_coarse_points)
+        upper = np.minimum(lower + 1, number_of_coarse_points - 1)
+        weights = np.clip(np.arange(voxel_number[axis]) / coarsening_factor - lower, 0.0, 1.0)
+        shape = [1] * grid.ndim
+        shape[grid_axis] = -1
+        weights = weights.reshape(shape).astype(grid.dtype)
+        grid = np.take(grid, lower, axis=grid_axis) * (1.0 - weights) + np.take(grid, upper, axis=grid_axis) * weights
+    return grid
+
+
+def refinement_mask(
+    coarse_grids: NDArray,
+    voxel_number: NDArray,
+    coarsening_factor: int,
+    iso_value: float,
+) -> NDArray:
+    """Mark the points of the fine grid that lie in coarse cells crossed by the isosurfaces at +iso_value or -iso_value.
+
+    A coarse cell is crossed if the values at its corners enclose one of the iso values in any of the grids. The
+    crossed cells are extended by their neighbouring cells, so the surface stays within the refined region, even if the
+    coarse grid places it slightly off.
+
+    :param coarse_grids: values on the coarse grid, the grid axes are the last three axes
+    :param voxel_number: number of voxels of the fine grid in each direction
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :param iso_value: iso value of the surfaces
+    :return: boolean array with the shape of the fine grid
+    """
+    grids = np.asarray(coarse_grids, dtype=np.float64)
+    grids = grids.reshape(-1, *grids.shape[-3:])
+    # Grids with a single point along an axis are extended, so that they consist of at least one cell
+    grids = np.concatenate([grids, grids[:, -1:]], axis=1) if grids.shape[1] == 1 else grids
+    grids = np.concatenate([grids, grids[:, :, -1:]], axis=2) if grids.shape[2] == 1 else grids
+    grids = np.concatenate([grids, grids[:, :, :, -1:]], axis=3) if grids.shape[3] == 1 else grids
+
+    # Minimum and maximum of the eight corners of each cell
+    corners = [
+        grids[:, i : grids.shape[1] - 1 + i, j : grids.shape[2] - 1 + j, k : grids.shape[3] - 1 + k]
+        for i in range(2)
+        for j in range(2)
+        for k in range(2)
+    ]
+    minimum = np.minimum.reduce(corners)
+    maximum = np.maximum.reduce(corners)
+    crossed = np.zeros(minimum.shape[1:], dtype=bool)
+    for level in (iso_value, -iso_value):
+        crossed |= np.any((minimum <= level) & (maximum >= level), axis=0)
+    crossed = ndimage.binary_dilation(crossed, structure=np.ones((3, 3, 3), dtype=bool))
+
+    cells = [
+        coarse_cell_indices(int(voxel_number[axis]), coarsening_factor, crossed.shape[axis] + 1) for axis in range(3)
+    ]
+    return crossed[np.ix_(*cells)]
+
+
+def generate_voxel_grids_in_chunks(  # noqa: PLR0913
+    origin: NDArray,
+    voxel_size: NDArray,
+    voxel_number: NDArray,
+    aos: PackedBasisSet,
+    mo_coeffs: NDArray,
+    cut_off_distances: NDArray,
+    number_of_threads: int = 1,
+    mask: NDArray | None = None,
+    dtype: DTypeLike = np.float64,
+    check_cancelled: Callable[[], None] | None = None,
+    slabs_per_chunk: int = 8,
+) -> NDArray:
+    """Evaluate the grids of several orbitals in chunks of slabs along the first axis (see generate_voxel_grids).
+
+    The rows of each chunk are still distributed over all threads. Between the chunks, check_cancelled is called, which
+    stops a calculation running in a worker by raising an exception, instead of keeping all threads busy until the
+    whole grids are evaluated.
+
+    :param origin: origin of the voxel grid
+    :param voxel_size: 2D array (3x3) defining the size of the voxels in each direction
+    :param voxel_number: number of voxels in each direction
+    :param aos: packed basis set of the molecule
+    :param mo_coeffs: coefficients of the orbitals, one column per orbital
+    :param cut_off_distances: cutoff distances of the shells, which must be valid for all orbitals
+    :param number_of_threads: number of threads used to evaluate the grid
+    :param mask: optional boolean array with the shape of the grid, marking the points to evaluate
+    :param dtype: type of the values of the grids, float64 or float32
+    :param check_cancelled: called before each chunk and after the last one, or None
+    :param slabs_per_chunk: number of slabs along the first axis evaluated at once
+    :return: grids of the orbitals, which are zero at the points outside of the mask (orbitals x voxel number)
+    """
+    origin = np.asarray(origin, dtype=np.float64)
+    voxel_size = np.asarray(voxel_size, dtype=np.float64)
+    voxel_number = np.asarray(voxel_number, dtype=np.int64)
+    grids = np.zeros((np.shape(mo_coeffs)[1], *voxel_number), dtype=grid_dtype(dtype))
+    for first_slab in range(0, voxel_number[0], slabs_per_chunk):
+        if check_cancelled is not None:
+            check_cancelled()
+        last_slab = min(first_slab + slabs_per_chunk, voxel_number[0])
+        grids[:, first_slab:last_slab] = generate_voxel_grids(
+            origin + first_slab * voxel_size[0],
+            voxel_size,
+            np.array([last_slab - first_slab, *voxel_number[1:]], dtype=np.int64),
+            aos,
+            mo_coeffs,
+            cut_off_distances,
+            number_of_threads,
+            None if mask is None else mask[first_slab:last_slab],
+            dtype,
+        )
+    if check_cancelled is not None:
+        check_cancelled()
+    return grids
+
+
+def refine_voxel_grids(  # noqa: PLR0913
+    coarse_grids: NDArray,
+    origin: NDArray,
+    voxel_size: NDArray,
+    voxel_number: NDArray,
+    aos: PackedBasisSet,
+    mo_coeffs: NDArray,
+    cut_off_distances: NDArray,
+    iso_value: float,
+    coarsening_factor: int = 4,
+    number_of_threads: int = 1,
+    dtype: DTypeLike = np.float64,
+    grids: NDArray | None = None,
+    refined_points: NDArray | None = None,
+    check_cancelled: Callable[[], None] | None = None,
+) -> tuple[NDArray, NDArray]:
+    """Refine the coarse grids of several orbitals around the isosurfaces at +iso_value and -iso_value.
+
+    The points of the fine grid in the cells crossed by the isosurfaces are evaluated exactly, all other points are
+    interpolated from the coarse grids. Features smaller than a coarse cell, which the coarse grid does not resolve,
+    are not refined. Grids which were already refined for other iso values can be passed with the mask of their exact
+    points, then only the points which are not exact yet are evaluated. The given grids and mask are not changed.
+
+    :param coarse_grids: grids of the orbitals on the coarse grid (orbitals x coarse voxel number)
+    :param origin: origin of the voxel grid
+    :param voxel_size: 2D array (3x3) defining the size of the voxels of the fine grid in each direction
+    :param voxel_number: number of voxels of the fine grid in each direction
+    :param aos: packed basis set of the molecule
+    :param mo_coeffs: coefficients of the orbitals, one column per orbital
+    :param cut_off_distances: cutoff distances of the shells, which must be valid for all orbitals
+    :param iso_value: iso value of the surfaces
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :param number_of_threads: number of threads used to evaluate the grid
+    :param dtype: type of the values of the grids, float64 or float32, ignored if the grids are given
+    :param grids: grids of the orbitals on the fine grid refined before, or None to interpolate the coarse grids
+    :param refined_points: mask of the exact points of the given grids, or None if no point is exact
+    :param check_cancelled: called between the chunks of the evaluation (see generate_voxel_grids_in_chunks), or None
+    :return: grids of the orbitals on the fine grid (orbitals x voxel number) and mask of their exact points
+    """
+    voxel_number = np.asarray(voxel_number, dtype=np.int64)
+    if grids is None:
+        grids = interpolate_coarse_grid(coarse_grids, voxel_number, coarsening_factor)
+        grids = grids.astype(grid_dtype(dtype), copy=False)
+    if refined_points is None:
+        refined_points = np.zeros(voxel_number, dtype=bool)
+    mask = refinement_mask(coarse_grids, voxel_number, coarsening_factor, iso_value) & ~refined_points
+    if not np.any(mask):
+        return grids, refined_points
+    exact_grids = generate_voxel_grids_in_chunks(
+        origin,
+        voxel_size,
+        voxel_number,
+        aos,
+        mo_coeffs,
+        cut_off_distances,
+        number_of_threads,
+        mask,
+        grids.dtype,
+        check_cancelled,
+    )
+    return np.where(mask, exact_grids, grids), refined_points | mask
@@ -1,3 +1,5 @@
+from libc.stdint cimport int64_t
+
 cpdef int calculate_aos(
     double[:],
     double[:],
@@ -5,4 +7,55 @@ cpdef int calculate_aos(
     double[:],
     double[:],
     int,
-    double[:]) nogil
+    double[:]) noexcept nogil
+
+cdef void calculate_aos_batch(
+    double[:, ::1],
+    int,
+    double[:],
+    double[:],
+    double[:],
+    double[:],
+    int,
+    int,
+    double,
+    double[:, ::1],
+    double[:, ::1],
+    int) noexcept nogil
+
+cdef void calculate_spherical_aos_batch(
+    double[:, ::1],
+    int,
+    double[:],
+    double[:],
+    double[:],
+    double[:],
+    int,
+    int,
+    double,
+    double[:, ::1],
+    double[:, ::1],
+    int) noexcept nogil
+
+cdef void calculate_ao_gradients(
+    double[:],
+    double[:],
+    double[:],
+    double[:],
+    double[:],
+    int,
+    int,
+    double[:, ::1]) noexcept nogil
+
+cdef void calculate_spherical_ao_gradients(
+    double[:],
+    double[:],
+    double[:],
+    double[:],
+    double[:],
+    int,
+    int,
+    int64_t[:],
+    int64_t[:, :],
+    double[:],
+    double[:, ::1]) noexcept nogil
@@ -1,10 +1,40 @@
 """This module serves the calculation of atomic orbitals."""
 
+import numpy as np
 from cython.parallel import prange
-from cython import boundscheck, exceptval, cdivision
+from cython import boundscheck, exceptval, cdivision, wraparound
 from libc.math cimport exp
+from libc.stdint cimport int64_t
 
 __copyright__ = "Copyright 2024, Molara"
+
+cdef double sqr3_ = 1.73205080756887729
+cdef double sqr5_ = 2.236067977499789696
+cdef double sqr7_ = 2.645751311064591
+
+# Exponents of x, y and z and normalization factors of the cartesian basis functions of the shells, in the same order
+# as in calculate_aos. The functions of a shell with angular momentum l start at angular_offsets[l].
+cdef int64_t[:] angular_offsets = np.array([0, 1, 4, 10, 20, 35], dtype=np.int64)
+cdef int64_t[:, :] angular_exponents = np.array([
+    [0, 0, 0],
+    [1, 0, 0], [0, 1, 0], [0, 0, 1],
+    [2, 0, 0], [0, 2, 0], [0, 0, 2], [1, 1, 0], [1, 0, 1], [0, 1, 1],
+    [3, 0, 0], [0, 3, 0], [0, 0, 3], [1, 2, 0], [2, 1, 0], [2, 0, 1], [1, 0, 2], [0, 1, 2], [0, 2, 1], [1, 1, 1],
+    [4, 0, 0], [0, 4, 0], [0, 0, 4], [3, 1, 0], [3, 0, 1], [1, 3, 0], [0, 3, 1], [1, 0, 3], [0, 1, 3],
+    [2, 2, 0], [2, 0, 2], [0, 2, 2], [2, 1, 1], [1, 2, 1], [1, 1, 2],
+], dtype=np.int64)
+cdef double[:] angular_factors = np.array([
+    1.0,
+    1.0, 1.0, 1.0,
+    1.0, 1.0, 1.0, sqr3_, sqr3_, sqr3_,
+    1.0, 1.0, 1.0, sqr5_, sqr5_, sqr5_, sqr5_, sqr5_, sqr5_, sqr5_ * sqr3_,
+    1.0, 1.0, 1.0, sqr7_, sqr7_, sqr7_, sqr7_, sqr7_, sqr7_,
+    sqr7_ * sqr5_ / sqr3_, sqr7_ * sqr5_ / sqr3_, sqr7_ * sqr5_ / sqr3_, sqr7_ * sqr5_, sqr7_ * sqr5_, sqr7_ * sqr5_,
+], dtype=np.float64)
+
+# Every cartesian basis function is a single term of the polynomials of the shells, see calculate_polynomial_gradients
+cdef int64_t[:] cartesian_term_offsets = np.arange(36, dtype=np.int64)
+
 @exceptval(check=False)
 @boundscheck(False)
 @cdivision(True)
@@ -15,7 +45,7 @@ cpdef int calculate_aos(
     double[:] coefficients,
     double[:] norms,
     int orbital,
-    double[:] uao) nogil:
+    double[:] uao) noexcept nogil:
 
     cdef double sqr3 = 1.73205080756887729
     cdef double sqr5 = 2.236067977499789696
@@ -136,3 +166,465 @@ cpdef int calculate_aos(
         uao[gyyxz] = dy * dxyz * u
         uao[gzzxy] = dz * dxyz * u
     return 0
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void calculate_radial_batch(
+    double[:, ::1] electron_coords,
+    int number_of_points,
+    double[:] atom_coords,
+    double[:] exponents,
+    double[:] coefficients,
+    double[:] norms,
+    int number_of_primitives,
+    double cut_off_distance_sq,
+    double[:, ::1] scratch) noexcept nogil:
+    """Calculate the relative positions and the radial part of one shell for a batch of electron positions.
+
+    The radial part is evaluated primitive by primitive for all points at once, so that the inner loops run over the
+    points and can be vectorised. Points outside the cutoff distance of the shell get the value zero.
+
+    :param electron_coords: positions of the electrons (number_of_points x 3)
+    :param number_of_points: number of points to be evaluated
+    :param atom_coords: position of the shell
+    :param exponents: exponents of the primitive gaussians
+    :param coefficients: contraction coefficients of the primitive gaussians
+    :param norms: normalization factors of the primitive gaussians
+    :param number_of_primitives: number of primitive gaussians of the shell
+    :param cut_off_distance_sq: squared cutoff distance of the shell
+    :param scratch: scratch buffer (at least 5 x number_of_points), returns x, y, z, r^2 and the radial part
+    """
+    cdef double[:] dx = scratch[0, :]
+    cdef double[:] dy = scratch[1, :]
+    cdef double[:] dz = scratch[2, :]
+    cdef double[:] r2 = scratch[3, :]
+    cdef double[:] u = scratch[4, :]
+    cdef double exponent, prefactor
+    cdef int ic, point
+
+    for point in range(number_of_points):
+        dx[point] = electron_coords[point, 0] - atom_coords[0]
+        dy[point] = electron_coords[point, 1] - atom_coords[1]
+        dz[point] = electron_coords[point, 2] - atom_coords[2]
+        r2[point] = dx[point] * dx[point] + dy[point] * dy[point] + dz[point] * dz[point]
+        u[point] = 0.0
+
+    # Radial part, one primitive after another for all points
+    for ic in range(number_of_primitives):
+        exponent = exponents[ic]
+        prefactor = norms[ic] * coefficients[ic]
+        for point in range(number_of_points):
+            u[point] += prefactor * exp(-exponent * r2[point])
+
+    for point in range(number_of_points):
+        if r2[point] >= cut_off_distance_sq:
+            u[point] = 0.0
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void calculate_aos_batch(
+    double[:, ::1] electron_coords,
+    int number_of_points,
+    double[:] atom_coords,
+    double[:] exponents,
+    double[:] coefficients,
+    double[:] norms,
+    int number_of_primitives,
+    int orbital,
+    double cut_off_distance_sq,
+    double[:, ::1] scratch,
+    double[:, ::1] uao,
+    int column) noexcept nogil:
+    """Calculate the atomic orbitals of one shell for a batch of electron positions.
+
+    The radial part is evaluated for all points at once (see calculate_radial_batch). Points outside the cutoff
+    distance of the shell get the value zero.
+
+    :param electron_coords: positions of the electrons (number_of_points x 3)
+    :param number_of_points: number of points to be evaluated
+    :param atom_coords: position of the shell
+    :param exponents: exponents of the primitive gaussians
+    :param coefficients: contraction coefficients of the primitive gaussians
+    :param norms: normalization factors of the primitive gaussians
+    :param number_of_primitives: number of primitive gaussians of the shell
+    :param orbital: angular momentum of the shell (0 - 4)
+    :param cut_off_distance_sq: squared cutoff distance of the shell
+    :param scratch: scratch buffer (at least 5 x number_of_points)
+    :param uao: ao values to be returned (number_of_points x number of basis functions), written from column on
+    :param column: first column of the shell in uao
+    """
+    cdef double sqr3 = 1.73205080756887729
+    cdef double sqr5 = 2.236067977499789696
+    cdef double sqr7 = 2.645751311064591
+
+    cdef double[:] dx = scratch[0, :]
+    cdef double[:] dy = scratch[1, :]
+    cdef double[:] dz = scratch[2, :]
+    cdef double[:] u = scratch[4, :]
+    cdef double x, y, z, x2, y2, z2, xyz, prefactor
+    cdef int point
+
+    calculate_radial_batch(
+        electron_coords,
+        number_of_points,
+        atom_coords,
+        exponents,
+        coefficients,
+        norms,
+        number_of_primitives,
+        cut_off_distance_sq,
+        scratch,
+    )
+
+    # Angular part, the same ordering and normalization as in calculate_aos
+    if orbital == 0:
+        for point in range(number_of_points):
+            uao[point, column] = u[point]
+    elif orbital == 1:
+        for point in range(number_of_points):
+            uao[point, column] = dx[point] * u[point]
+            uao[point, column + 1] = dy[point] * u[point]
+            uao[point, column + 2] = dz[point] * u[point]
+    elif orbital == 2:
+        for point in range(number_of_points):
+            x = dx[point]
+            y = dy[point]
+            z = dz[point]
+            uao[point, column] = x * x * u[point]
+            uao[point, column + 1] = y * y * u[point]
+            uao[point, column + 2] = z * z * u[point]
+            prefactor = sqr3 * u[point]
+            uao[point, column + 3] = x * y * prefactor
+            uao[point, column + 4] = x * z * prefactor
+            uao[point, column + 5] = y * z * prefactor
+    elif orbital == 3:
+        for point in range(number_of_points):
+            x = dx[point]
+            y = dy[point]
+            z = dz[point]
+            x2 = x * x
+            y2 = y * y
+            z2 = z * z
+            xyz = x * y * z
+            uao[point, column] = x2 * x * u[point]
+            uao[point, column + 1] = y2 * y * u[point]
+            uao[point, column + 2] = z2 * z * u[point]
+            prefactor = sqr5 * u[point]
+            uao[point, column + 4] = x2 * y * prefactor
+            uao[point, column + 5] = x2 * z * prefactor
+            uao[point, column + 3] = y2 * x * prefactor
+            uao[point, column + 8] = y2 * z * prefactor
+            uao[point, column + 6] = z2 * x * prefactor
+            uao[point, column + 7] = z2 * y * prefactor
+            prefactor = sqr3 * prefactor
+            uao[point, column + 9] = xyz * prefactor
+    elif orbital == 4:
+        for point in range(number_of_points):
+            x = dx[point]
+            y = dy[point]
+            z = dz[point]
+            x2 = x * x
+            y2 = y * y
+            z2 = z * z
+            xyz = x * y * z
+            uao[point, column] = x2 * x2 * u[point]
+            uao[point, column + 1] = y2 * y2 * u[point]
+            uao[point, column + 2] = z2 * z2 * u[point]
+            prefactor = sqr7 * u[point]
+            uao[point, column + 3] = x2 * x * y * prefactor
+            uao[point, column + 4] = x2 * x * z * prefactor
+            uao[point, column + 5] = y2 * y * x * prefactor
+            uao[point, column + 6] = y2 * y * z * prefactor
+            uao[point, column + 7] = z2 * z * x * prefactor
+            uao[point, column + 8] = z2 * z * y * prefactor
+            prefactor = sqr5 / sqr3 * prefactor
+            uao[point, column + 9] = x2 * y2 * prefactor
+            uao[point, column + 10] = x2 * z2 * prefactor
+            uao[point, column + 11] = y2 * z2 * prefactor
+            prefactor = sqr3 * prefactor
+            uao[point, column + 12] = x * xyz * prefactor
+            uao[point, column + 13] = y * xyz * prefactor
+            uao[point, column + 14] = z * xyz * prefactor
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void calculate_spherical_aos_batch(
+    double[:, ::1] electron_coords,
+    int number_of_points,
+    double[:] atom_coords,
+    double[:] exponents,
+    double[:] coefficients,
+    double[:] norms,
+    int number_of_primitives,
+    int orbital,
+    double cut_off_distance_sq,
+    double[:, ::1] scratch,
+    double[:, ::1] uao,
+    int column) noexcept nogil:
+    """Calculate the spherical harmonic atomic orbitals of one d, f or g shell for a batch of electron positions.
+
+    The 2l + 1 real solid harmonics of the shell are evaluated directly as polynomials of x, y and z times the radial
+    part, without the cartesian functions of the shell. They are ordered and normalized as the functions of molden
+    files, i.e., as the combinations of the functions of calculate_aos given by MolecularOrbitals.t_sc_d, t_sc_f and
+    t_sc_g (see PackedBasisSet.pack_spherical_terms for the resulting polynomials).
+
+    :param electron_coords: positions of the electrons (number_of_points x 3)
+    :param number_of_points: number of points to be evaluated
+    :param atom_coords: position of the shell
+    :param exponents: exponents of the primitive gaussians
+    :param coefficients: contraction coefficients of the primitive gaussians
+    :param norms: normalization factors of the primitive gaussians
+    :param number_of_primitives: number of primitive gaussians of the shell
+    :param orbital: angular momentum of the shell (2 - 4)
+    :param cut_off_distance_sq: squared cutoff distance of the shell
+    :param scratch: scratch buffer (at least 5 x number_of_points)
+    :param uao: ao values to be returned (number_of_points x number of basis functions), written from column on
+    :param column: first column of the shell in uao
+    """
+    cdef double sqr3 = 1.73205080756887729
+    cdef double sqr5 = 2.236067977499789696
+    cdef double sqr6 = 2.449489742783178
+    cdef double sqr10 = 3.1622776601683795
+    cdef double sqr15 = 3.872983346207417
+    cdef double sqr35 = 5.916079783099616
+    cdef double sqr70 = 8.366600265340756
+
+    cdef double[:] dx = scratch[0, :]
+    cdef double[:] dy = scratch[1, :]
+    cdef double[:] dz = scratch[2, :]
+    cdef double[:] u = scratch[4, :]
+    cdef double x, y, z, x2, y2, z2, xy, rho2, value
+    cdef int point
+
+    calculate_radial_batch(
+        electron_coords,
+        number_of_points,
+        atom_coords,
+        exponents,
+        coefficients,
+        norms,
+        number_of_primitives,
+        cut_off_distance_sq,
+        scratch,
+    )
+
+    # d0, d+1, d-1, d+2, d-2 etc., rho2 is the squared distance from the z axis
+    if orbital == 2:
+        for point in range(number_of_points):
+            x = dx[point]
+            y = dy[point]
+            z = dz[point]
+            value = u[point]
+            uao[point, column] = (z * z - 0.5 * (x * x + y * y)) * value
+            value = sqr3 * value
+            uao[point, column + 1] = x * z * value
+            uao[point, column + 2] = y * z * value
+            uao[point, column + 3] = 0.5 * (x * x - y * y) * value
+            uao[point, column + 4] = x * y * value
+    elif orbital == 3:
+        for point in range(number_of_points):
+            x = dx[point]
+            y = dy[point]
+            z = dz[point]
+            x2 = x * x
+            y2 = y * y
+            z2 = z * z
+            rho2 = x2 + y2
+            value = u[point]
+            uao[point, column] = z * (z2 - 1.5 * rho2) * value
+            uao[point, column + 1] = 0.25 * sqr6 * x * (4.0 * z2 - rho2) * value
+            uao[point, column + 2] = 0.25 * sqr6 * y * (4.0 * z2 - rho2) * value
+            uao[point, column + 3] = 0.5 * sqr15 * z * (x2 - y2) * value
+            uao[point, column + 4] = sqr15 * x * y * z * value
+            uao[point, column + 5] = -0.25 * sqr10 * x * (x2 - 3.0 * y2) * value
+            uao[point, column + 6] = 0.25 * sqr10 * y * (y2 - 3.0 * x2) * value
+    elif orbital == 4:
+        for point in range(number_of_points):
+            x = dx[point]
+            y = dy[point]
+            z = dz[point]
+            x2 = x * x
+            y2 = y * y
+            z2 = z * z
+            xy = x * y
+            rho2 = x2 + y2
+            value = u[point]
+            uao[point, column] = (0.375 * rho2 * rho2 + z2 * z2 - 3.0 * z2 * rho2) * value
+            uao[point, column + 1] = sqr10 * x * z * (z2 - 0.75 * rho2) * value
+            uao[point, column + 2] = sqr10 * y * z * (z2 - 0.75 * rho2) * value
+            uao[point, column + 3] = 0.25 * sqr5 * (x2 - y2) * (6.0 * z2 - rho2) * value
+            uao[point, column + 4] = 0.5 * sqr5 * xy * (6.0 * z2 - rho2) * value
+            uao[point, column + 5] = -0.25 * sqr70 * x * z * (x2 - 3.0 * y2) * value
+            uao[point, column + 6] = 0.25 * sqr70 * y * z * (y2 - 3.0 * x2) * value
+            uao[point, column + 7] = -0.125 * sqr35 * (x2 * x2 - 6.0 * x2 * y2 + y2 * y2) * value
+            uao[point, column + 8] = -0.5 * sqr35 * xy * (x2 - y2) * value
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void calculate_ao_gradients(
+    double[:] electron_coords,
+    double[:] atom_coords,
+    double[:] exponents,
+    double[:] coefficients,
+    double[:] norms,
+    int number_of_primitives,
+    int orbital,
+    double[:, ::1] gradients) noexcept nogil:
+    """Calculate the gradients of the atomic orbitals of one shell at an electron position.
+
+    :param electron_coords: position of the electron
+    :param atom_coords: position of the shell
+    :param exponents: exponents of the primitive gaussians
+    :param coefficients: contraction coefficients of the primitive gaussians
+    :param norms: normalization factors of the primitive gaussians
+    :param number_of_primitives: number of primitive gaussians of the shell
+    :param orbital: angular momentum of the shell (0 - 4)
+    :param gradients: gradients of the aos to be returned (number of basis functions of the shell x 3), with the same
+        ordering and normalization as in calculate_aos
+    """
+    calculate_polynomial_gradients(
+        electron_coords,
+        atom_coords,
+        exponents,
+        coefficients,
+        norms,
+        number_of_primitives,
+        orbital,
+        angular_offsets[orbital],
+        angular_offsets[orbital + 1] - angular_offsets[orbital],
+        cartesian_term_offsets,
+        angular_exponents,
+        angular_factors,
+        gradients,
+    )
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void calculate_spherical_ao_gradients(
+    double[:] electron_coords,
+    double[:] atom_coords,
+    double[:] exponents,
+    double[:] coefficients,
+    double[:] norms,
+    int number_of_primitives,
+    int orbital,
+    int64_t[:] term_offsets,
+    int64_t[:, :] term_exponents,
+    double[:] term_coefficients,
+    double[:, ::1] gradients) noexcept nogil:
+    """Calculate the gradients of the spherical harmonic atomic orbitals of one shell at an electron position.
+
+    :param electron_coords: position of the electron
+    :param atom_coords: position of the shell
+    :param exponents: exponents of the primitive gaussians
+    :param coefficients: contraction coefficients of the primitive gaussians
+    :param norms: normalization factors of the primitive gaussians
+    :param number_of_primitives: number of primitive gaussians of the shell
+    :param orbital: angular momentum of the shell (0 - 4)
+    :param term_offsets: offsets of the terms of the spherical functions, as in calculate_spherical_aos_batch
+    :param term_exponents: exponents of x, y and z of the terms
+    :param term_coefficients: coefficients of the terms
+    :param gradients: gradients of the aos to be returned (number of basis functions of the shell x 3), with the same
+        ordering and normalization as in calculate_spherical_aos_batch
+    """
+    calculate_polynomial_gradients(
+        electron_coords,
+        atom_coords,
+        exponents,
+        coefficients,
+        norms,
+        number_of_primitives,
+        orbital,
+        orbital * orbital,
+        2 * orbital + 1,
+        term_offsets,
+        term_exponents,
+        term_coefficients,
+        gradients,
+    )
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void calculate_polynomial_gradients(
+    double[:] electron_coords,
+    double[:] atom_coords,
+    double[:] exponents,
+    double[:] coefficients,
+    double[:] norms,
+    int number_of_primitives,
+    int orbital,
+    int first_function,
+    int number_of_functions,
+    int64_t[:] term_offsets,
+    int64_t[:, :] term_exponents,
+    double[:] term_coefficients,
+    double[:, ::1] gradients) noexcept nogil:
+    """Calculate the gradients of functions, which are polynomials of x, y and z times the radial part of a shell.
+
+    The derivative of x^a y^b z^c u(r^2) along x is a x^(a-1) y^b z^c u + x^(a+1) y^b z^c u', where u' is the sum of
+    the primitives multiplied by -2 times their exponents, and accordingly along y and z. The gradients of the
+    functions are the sums of the gradients of their terms.
+
+    :param electron_coords: position of the electron
+    :param atom_coords: position of the shell
+    :param exponents: exponents of the primitive gaussians
+    :param coefficients: contraction coefficients of the primitive gaussians
+    :param norms: normalization factors of the primitive gaussians
+    :param number_of_primitives: number of primitive gaussians of the shell
+    :param orbital: angular momentum of the shell (0 - 4)
+    :param first_function: index of the first function of the shell in the term offsets
+    :param number_of_functions: number of functions of the shell
+    :param term_offsets: offsets of the terms of the functions
+    :param term_exponents: exponents of x, y and z of the terms
+    :param term_coefficients: coefficients of the terms
+    :param gradients: gradients of the functions to be returned (number of functions x 3)
+    """
+    cdef double[3] relative
+    cdef double powers[3][6]
+    cdef double r2 = 0.0, u = 0.0, du = 0.0, radial, monomial, coefficient
+    cdef int64_t ic, c, n, function, term, a, b, e
+
+    for c in range(3):
+        relative[c] = electron_coords[c] - atom_coords[c]
+        r2 += relative[c] * relative[c]
+
+    # Radial part and its derivative with respect to r^2 (times 2)
+    for ic in range(number_of_primitives):
+        radial = norms[ic] * coefficients[ic] * exp(-exponents[ic] * r2)
+        u += radial
+        du -= 2.0 * exponents[ic] * radial
+
+    for c in range(3):
+        powers[c][0] = 1.0
+        for n in range(1, orbital + 2):
+            powers[c][n] = powers[c][n - 1] * relative[c]
+
+    for function in range(number_of_functions):
+        for c in range(3):
+            gradients[function, c] = 0.0
+        for term in range(term_offsets[first_function + function], term_offsets[first_function + function + 1]):
+            a = term_exponents[term, 0]
+            b = term_exponents[term, 1]
+            e = term_exponents[term, 2]
+            coefficient = term_coefficients[term]
+            monomial = coefficient * powers[0][a] * powers[1][b] * powers[2][e]
+            for c in range(3):
+                gradients[function, c] += relative[c] * monomial * du
+            if a > 0:
+                gradients[function, 0] += coefficient * a * powers[0][a - 1] * powers[1][b] * powers[2][e] * u
+            if b > 0:
+                gradients[function, 1] += coefficient * b * powers[0][a] * powers[1][b - 1] * powers[2][e] * u
+            if e > 0:
+                gradients[function, 2] += coefficient * e * powers[0][a] * powers[1][b] * powers[2][e - 1] * u
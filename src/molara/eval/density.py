@@ -0,0 +1,141 @@
+"""Calculation of electron density and spin density grids from the density matrix."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from molara.eval.generate_voxel_grid import generate_density_grid
+from molara.eval.voxel_grid import VoxelGrid3D
+from molara.util.constants import ANGSTROM_TO_BOHR
+
+if TYPE_CHECKING:
+    from numpy.typing import DTypeLike, NDArray
+
+    from molara.structure.molecule import Molecule
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+def calculate_density_grid(  # noqa: PLR0913
+    molecule: Molecule,
+    density_matrix: NDArray,
+    origin: NDArray,
+    voxel_size: NDArray,
+    voxel_number: NDArray,
+    threshold: float = 1e-3,
+    number_of_threads: int = 1,
+    spherical: bool = False,
+    dtype: DTypeLike = np.float64,
+) -> VoxelGrid3D:
+    """Calculate the density of a density matrix on a voxel grid.
+
+    :param molecule: molecule with basis set and molecular orbitals
+    :param density_matrix: density matrix in the cartesian basis of the atomic orbitals
+    :param origin: origin of the voxel grid
+    :param voxel_size: 2D array (3x3) defining the size of voxels in each direction
+    :param voxel_number: number of voxels in each direction
+    :param threshold: threshold for the cutoff distances of the shells, refers to the square root of the density
+    :param number_of_threads: number of threads used to evaluate the grid
+    :param spherical: if true, the density matrix is given in the basis of the spherical harmonics
+    :param dtype: type of the values of the grid, float64 or float32, which halves the memory of the grid
+    :return: voxel grid of the density
+    """
+    voxel_number = np.array(voxel_number, dtype=np.int64)
+    origin = np.array(origin, dtype=np.float64)
+    voxel_size = np.array(voxel_size, dtype=np.float64)
+    max_distance = float(np.linalg.norm(np.dot(voxel_number, voxel_size)) * ANGSTROM_TO_BOHR)
+    basis_set = molecule.get_packed_basis_set(spherical=spherical)
+    cut_offs = molecule.mos.calculate_density_cut_offs(
+        basis_set,
+        density_matrix,
+        threshold=threshold,
+        max_distance=max_distance,
+        max_points_number=max(int(max_distance * 5), 2),
+    )
+    grid = np.array(
+        generate_density_grid(
+            origin,
+            voxel_size,
+            voxel_number,
+            basis_set,
+            density_matrix,
+            cut_offs,
+            number_of_threads,
+            dtype,
+        ),
+    )
+    voxel_grid = VoxelGrid3D()
+    voxel_grid.set_grid(grid, origin, voxel_size)
+    return voxel_grid
+
+
+def calculate_electron_density(  # noqa: PLR0913
+    molecule: Molecule,
+    origin: NDArray,
+    voxel_size: NDArray,
+    voxel_number: NDArray,
+    threshold: float = 1e-3,
+    number_of_threads: int = 1,
+    dtype: DTypeLike = np.float64,
+) -> VoxelGrid3D:
+    """Calculate the electron density of a molecule on a voxel grid.
+
+    :param molecule: molecule with basis set and molecular orbitals
+    :param origin: origin of the voxel grid
+    :param voxel_size: 2D array (3x3) defining the size of voxels in each direction
+    :param voxel_number: number of voxels in each direction
+    :param threshold: threshold for the cutoff distances of the shells, refers to the square root of the density
+    :param number_of_threads: number of threads used to evaluate the grid
+    :param dtype: type of the values of the grid, float64 or float32
+    :return: voxel grid of the electron density
+    """
+    # Orbitals given for spherical harmonics are evaluated in their own basis
+    spherical = molecule.mos.has_spherical_coefficients
+    return calculate_density_grid(
+        molecule,
+        molecule.mos.calculate_density_matrix(spherical=spherical),
+        origin,
+        voxel_size,
+        voxel_number,
+        threshold=threshold,
+        number_of_threads=number_of_threads,
+        spherical=spherical,
+        dtype=dtype,
+    )
+
+
+def calculate_spin_density(  # noqa: PLR0913
+    molecule: Molecule,
+    origin: NDArray,
+    voxel_size: NDArray,
+    voxel_number: NDArray,
+    threshold: float = 1e-3,
+    number_of_threads: int = 1,
+    dtype: DTypeLike = np.float64,
+) -> VoxelGrid3D:
+    """Calculate the spin density (alpha minus beta density) of a molecule on a voxel grid.
+
+    :param molecule: molecule with basis set and molecular orbitals
+    :param origin: origin of the voxel grid
+    :param voxel_size: 2D array (3x3) defining the size of voxels in each direction
+    :param voxel_number: number of voxels in each direction
+    :param threshold: threshold for the cutoff distances of the shells, refers to the square root of the density
+    :param number_of_threads: number of threads used to evaluate the grid
+    :param dtype: type of the values of the grid, float64 or float32
+    :return: voxel grid of the spin density
+    """
+    # Orbitals given for spherical harmonics are evaluated in their own basis
+    spherical = molecule.mos.has_spherical_coefficients
+    return calculate_density_grid(
+        molecule,
+        molecule.mos.calculate_spin_density_matrix(spherical=spherical),
+        origin,
+        voxel_size,
+        voxel_number,
+        threshold=threshold,
+        number_of_threads=number_of_threads,
+        spherical=spherical,
+        dtype=dtype,
+    )
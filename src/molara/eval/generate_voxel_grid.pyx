@@ -2,10 +2,20 @@
 
 cimport numpy as npc
 import numpy as np
-from cython.cimports.molara.eval.mos import calculate_mo_cartesian
-from cython import boundscheck, exceptval, wraparound
+from cython.cimports.molara.eval.aos import (
+    calculate_ao_gradients,
+    calculate_aos_batch,
+    calculate_spherical_ao_gradients,
+    calculate_spherical_aos_batch,
+)
+from cython import boundscheck, exceptval, wraparound, cdivision
+from cython cimport floating
+from cython.parallel cimport prange, threadid
+from scipy.linalg.cython_blas cimport ddot, dgemm
 
+from molara.structure.basisset import pack_basis_set
 from molara.util.constants import ANGSTROM_TO_BOHR
+from libc.math cimport ceil, floor, sqrt
 from libc.stdint cimport int64_t
 
 cdef double ANGSTROM_TO_BOHR_ = ANGSTROM_TO_BOHR
@@ -13,6 +23,300 @@ cdef double ANGSTROM_TO_BOHR_ = ANGSTROM_TO_BOHR
 __copyright__ = "Copyright 2024, Molara"
 
 
+# The grid is divided into blocks of block_size x block_size rows of segment_length points each. For every block, the
+# shells whose cutoff sphere intersects the block are determined once, so the segments of a block only loop over these
+cdef int block_size = 8
+cdef int segment_length = 32
+
+
+cdef class GridEvaluator:
+    """Evaluates the atomic orbitals of a basis set segment by segment on a voxel grid.
+
+    The basis set is packed shell by shell and the grid is divided into blocks with a precomputed list of the shells
+    reaching each block. Every thread gets its own scratch buffers for the electron positions and the ao matrix of a
+    segment, so the segments can be evaluated independently from each other. The scratch buffers only hold the basis
+    functions of the shells of a single block, so their size does not grow with the size of the basis set for large
+    molecules. For a basis set of spherical harmonics, the d, f and g shells are evaluated as spherical harmonics
+    directly.
+    """
+
+    cdef int64_t[:] shell_types, shell_offsets, shell_primitives
+    cdef double[:, :] shell_positions, shell_exponents, shell_coefficients, shell_norms
+    cdef bint spherical
+    cdef int64_t[:] spherical_term_offsets
+    cdef int64_t[:, :] spherical_term_exponents
+    cdef double[:] spherical_term_coefficients
+    cdef double[:] cut_off_distances
+    cdef double[3] origin, voxel_size_i, voxel_size_j, voxel_size_k
+    cdef int voxel_count_i, voxel_count_j, voxel_count_k, number_of_aos, number_of_threads
+    cdef int blocks_i, blocks_j, blocks_k, segment_length, max_block_functions
+    cdef int64_t[:] block_shell_offsets, block_shells
+    cdef double[:, :, ::1] electron_positions, scratch, ao_matrices
+    cdef int64_t[:, ::1] segment_functions
+
+    def __init__(
+            self,
+            double[:] origin,
+            double[:, :] voxel_size,
+            int64_t[:] voxel_count,
+            aos,
+            cut_off_distances,
+            int number_of_threads=1,
+    ):
+        """Pack the basis set, set up the shell lists of the blocks and allocate the scratch buffers of the threads.
+
+        :param origin: The origin of the voxel grid
+        :param voxel_size: A 2D array (3x3) defining the size of voxels in each direction
+        :param voxel_count: The number of voxels in each direction
+        :param aos: The packed basis set or the list of basis functions of the molecule
+        :param cut_off_distances: The cutoff distances for each shell
+        :param number_of_threads: The number of threads used to evaluate the grid
+        """
+        cdef int c
+
+        basis_set = pack_basis_set(aos)
+        self.shell_types = basis_set.shell_types
+        self.shell_offsets = basis_set.shell_offsets
+        self.shell_primitives = basis_set.shell_primitives
+        self.shell_positions = basis_set.shell_positions
+        self.shell_exponents = basis_set.shell_exponents
+        self.shell_coefficients = basis_set.shell_coefficients
+        self.shell_norms = basis_set.shell_norms
+        self.spherical = basis_set.spherical
+        self.spherical_term_offsets = basis_set.spherical_term_offsets
+        self.spherical_term_exponents = basis_set.spherical_term_exponents
+        self.spherical_term_coefficients = basis_set.spherical_term_coefficients
+        self.cut_off_distances = np.asarray(cut_off_distances, dtype=np.float64)
+
+        # The grid is evaluated in bohr
+        for c in range(3):
+            self.origin[c] = origin[c] * ANGSTROM_TO_BOHR_
+            self.voxel_size_i[c] = voxel_size[0, c] * ANGSTROM_TO_BOHR_
+            self.voxel_size_j[c] = voxel_size[1, c] * ANGSTROM_TO_BOHR_
+            self.voxel_size_k[c] = voxel_size[2, c] * ANGSTROM_TO_BOHR_
+        self.voxel_count_i = voxel_count[0]
+        self.voxel_count_j = voxel_count[1]
+        self.voxel_count_k = voxel_count[2]
+        self.number_of_aos = len(basis_set)
+        self.number_of_threads = max(number_of_threads, 1)
+
+        self.segment_length = max(min(segment_length, self.voxel_count_k), 1)
+        self.blocks_i = (self.voxel_count_i + block_size - 1) // block_size
+        self.blocks_j = (self.voxel_count_j + block_size - 1) // block_size
+        self.blocks_k = (self.voxel_count_k + self.segment_length - 1) // self.segment_length
+        self.setup_block_shells()
+
+        self.electron_positions = np.zeros((self.number_of_threads, self.segment_length, 3), dtype=np.float64)
+        self.scratch = np.zeros((self.number_of_threads, 5, self.segment_length), dtype=np.float64)
+        self.ao_matrices = np.zeros(
+            (self.number_of_threads, self.segment_length, self.max_block_functions),
+            dtype=np.float64,
+        )
+        self.segment_functions = np.zeros((self.number_of_threads, self.max_block_functions), dtype=np.int64)
+
+    cdef void setup_block_shells(self):
+        """Determine the shells whose cutoff sphere intersects the bounding sphere of each block.
+
+        The shell lists of all blocks are stored consecutively in block_shells, the list of a block starts at
+        block_shell_offsets[block] and ends at block_shell_offsets[block + 1]. The largest number of basis functions of
+        the shells of a block is stored in max_block_functions (at least one), which bounds the number of columns of
+        the ao matrix of every segment.
+        """
+        cdef int number_of_blocks = self.blocks_i * self.blocks_j * self.blocks_k
+        cdef int number_of_shells = self.shell_types.shape[0]
+        cdef int64_t[:] counts = np.zeros(number_of_blocks + 1, dtype=np.int64)
+        cdef double[:, ::1] centers = np.zeros((number_of_blocks, 3), dtype=np.float64)
+        cdef double[:] radii = np.zeros(number_of_blocks, dtype=np.float64)
+        cdef int block, bi, bj, bk, shell_index, corner, c, position, block_functions
+        cdef double[3] first, last, corner_position
+        cdef double distance_sq
+
+        for bi in range(self.blocks_i):
+            for bj in range(self.blocks_j):
+                for bk in range(self.blocks_k):
+                    block = (bi * self.blocks_j + bj) * self.blocks_k + bk
+                    first[0] = bi * block_size
+                    first[1] = bj * block_size
+                    first[2] = bk * self.segment_length
+                    last[0] = min(first[0] + block_size, self.voxel_count_i) - 1
+                    last[1] = min(first[1] + block_size, self.voxel_count_j) - 1
+                    last[2] = min(first[2] + self.segment_length, self.voxel_count_k) - 1
+                    for c in range(3):
+                        centers[block, c] = self.grid_position(
+                            0.5 * (first[0] + last[0]),
+                            0.5 * (first[1] + last[1]),
+                            0.5 * (first[2] + last[2]),
+                            c,
+                        )
+                    # The bounding sphere of the block is centered at the block center and reaches the farthest corner
+                    for corner in range(8):
+                        distance_sq = 0.0
+                        for c in range(3):
+                            corner_position[c] = self.grid_position(
+                                last[0] if corner & 1 else first[0],
+                                last[1] if corner & 2 else first[1],
+                                last[2] if corner & 4 else first[2],
+                                c,
+                            )
+                            distance_sq += (corner_position[c] - centers[block, c]) ** 2
+                        radii[block] = max(radii[block], sqrt(distance_sq))
+
+        # Count the shells of each block first and fill the lists afterwards
+        for block in range(number_of_blocks):
+            for shell_index in range(number_of_shells):
+                if self.shell_reaches_block(shell_index, centers[block], radii[block]):
+                    counts[block + 1] += 1
+        for block in range(number_of_blocks):
+            counts[block + 1] += counts[block]
+
+        self.block_shell_offsets = counts
+        self.block_shells = np.zeros(max(counts[number_of_blocks], 1), dtype=np.int64)
+        self.max_block_functions = 1
+        for block in range(number_of_blocks):
+            position = counts[block]
+            block_functions = 0
+            for shell_index in range(number_of_shells):
+                if self.shell_reaches_block(shell_index, centers[block], radii[block]):
+                    self.block_shells[position] = shell_index
+                    position += 1
+                    block_functions += self.shell_offsets[shell_index + 1] - self.shell_offsets[shell_index]
+            self.max_block_functions = max(self.max_block_functions, block_functions)
+
+    @boundscheck(False)
+    @wraparound(False)
+    cdef inline double grid_position(self, double i, double j, double k, int c) noexcept nogil:
+        """Return the cartesian coordinate c (bohr) of the (possibly fractional) grid index (i, j, k)."""
+        return self.origin[c] + self.voxel_size_i[c] * i + self.voxel_size_j[c] * j + self.voxel_size_k[c] * k
+
+    @boundscheck(False)
+    @wraparound(False)
+    cdef inline bint shell_reaches_block(self, int shell_index, double[:] center, double radius) noexcept nogil:
+        """Check if the cutoff sphere of a shell intersects the bounding sphere of a block."""
+        cdef int c
+        cdef double distance_sq = 0.0
+        cdef double reach = self.cut_off_distances[shell_index] + radius
+        for c in range(3):
+            distance_sq += (self.shell_positions[shell_index, c] - center[c]) ** 2
+        return self.cut_off_distances[shell_index] > 0.0 and distance_sq < reach * reach
+
+    @exceptval(check=False)
+    @boundscheck(False)
+    @wraparound(False)
+    @cdivision(True)
+    cdef int evaluate_segment(
+            self,
+            int i,
+            int j,
+            int block_k,
+            int first_k,
+            int number_of_points,
+            int thread,
+    ) noexcept nogil:
+        """Evaluate the aos of all shells reaching the points first_k, ... of the row (i, j) along the last axis.
+
+        The points have to lie within the segment block_k, only the shells of the block containing the segment are
+        considered. The values are written column by column into the ao matrix of the thread (points x columns) and the
+        index of the basis function of each column is stored in the segment functions of the thread.
+
+        :param i: index of the row along the first axis
+        :param j: index of the row along the second axis
+        :param block_k: index of the segment along the last axis
+        :param first_k: index of the first point along the last axis
+        :param number_of_points: number of points to evaluate
+        :param thread: index of the thread evaluating the segment
+        :return: number of columns of the ao matrix
+        """
+        cdef int k, c, list_index, shell_index, shell, shell_start, shell_size, first_point, last_point
+        cdef int number_of_columns = 0
+        cdef int block = ((i // block_size) * self.blocks_j + j // block_size) * self.blocks_k + block_k
+        cdef double[3] segment_start, step, relative
+        cdef double step_sq, t, distance_sq, cut_off, half_width
+        cdef double[:, ::1] electron_positions = self.electron_positions[thread]
+        cdef double[:, ::1] ao_matrix = self.ao_matrices[thread]
+        cdef int64_t[:] segment_functions = self.segment_functions[thread]
+
+        for c in range(3):
+            segment_start[c] = self.grid_position(i, j, first_k, c)
+            step[c] = self.voxel_size_k[c]
+        step_sq = step[0] * step[0] + step[1] * step[1] + step[2] * step[2]
+
+        for k in range(number_of_points):
+            electron_positions[k, 0] = segment_start[0] + step[0] * k
+            electron_positions[k, 1] = segment_start[1] + step[1] * k
+            electron_positions[k, 2] = segment_start[2] + step[2] * k
+
+        for list_index in range(self.block_shell_offsets[block], self.block_shell_offsets[block + 1]):
+            shell_index = self.block_shells[list_index]
+
+            # Only the points of the segment within the cutoff distance of the shell are evaluated. They are found by
+            # intersecting the line of the segment with the cutoff sphere.
+            cut_off = self.cut_off_distances[shell_index]
+            distance_sq = 0.0
+            t = 0.0
+            for c in range(3):
+                relative[c] = self.shell_positions[shell_index, c] - segment_start[c]
+                distance_sq += relative[c] * relative[c]
+            if step_sq > 0.0:
+                t = (relative[0] * step[0] + relative[1] * step[1] + relative[2] * step[2]) / step_sq
+                distance_sq = max(distance_sq - t * t * step_sq, 0.0)
+            if distance_sq >= cut_off * cut_off:
+                continue
+            first_point = 0
+            last_point = number_of_points - 1
+            if step_sq > 0.0:
+                half_width = sqrt((cut_off * cut_off - distance_sq) / step_sq)
+                first_point = <int>ceil(max(t - half_width, 0.0))
+                last_point = <int>floor(min(t + half_width, number_of_points - 1.0))
+                if first_point > last_point:
+                    continue
+
+            shell = self.shell_types[shell_index]
+            shell_start = self.shell_offsets[shell_index]
+            shell_size = self.shell_offsets[shell_index + 1] - shell_start
+            # The spherical harmonics of s and p shells are the cartesian functions
+            if self.spherical and shell > 1:
+                calculate_spherical_aos_batch(
+                    electron_positions[first_point:],
+                    last_point - first_point + 1,
+                    self.shell_positions[shell_index],
+                    self.shell_exponents[shell_index],
+                    self.shell_coefficients[shell_index],
+                    self.shell_norms[shell_index],
+                    self.shell_primitives[shell_index],
+                    shell,
+                    cut_off * cut_off,
+                    self.scratch[thread],
+                    ao_matrix[first_point:],
+                    number_of_columns,
+                )
+            else:
+                calculate_aos_batch(
+                    electron_positions[first_point:],
+                    last_point - first_point + 1,
+                    self.shell_positions[shell_index],
+                    self.shell_exponents[shell_index],
+                    self.shell_coefficients[shell_index],
+                    self.shell_norms[shell_index],
+                    self.shell_primitives[shell_index],
+                    shell,
+                    cut_off * cut_off,
+                    self.scratch[thread],
+                    ao_matrix[first_point:],
+                    number_of_columns,
+                )
+            for k in range(first_point):
+                for c in range(number_of_columns, number_of_columns + shell_size):
+                    ao_matrix[k, c] = 0.0
+            for k in range(last_point + 1, number_of_points):
+                for c in range(number_of_columns, number_of_columns + shell_size):
+                    ao_matrix[k, c] = 0.0
+            for c in range(shell_size):
+                segment_functions[number_of_columns + c] = shell_start + c
+            number_of_columns += shell_size
+
+        return number_of_columns
+
+
 cpdef generate_voxel_grid(
         double[:] origin,
         double[:,:] voxel_size,
@@ -20,6 +324,8 @@ cpdef generate_voxel_grid(
         aos,
         mo_coeff,
         cut_off_distances,
+        int number_of_threads=1,
+        dtype=np.float64,
 ):
     """
     Generates a 3D array of values. The voxel grid is defined by the origin, voxel size and voxel count.
@@ -27,155 +333,733 @@ cpdef generate_voxel_grid(
     :param origin: The origin of the voxel grid
     :param voxel_size: A 2D array (3x3) defining the size of voxels in each direction
     :param voxel_count: The number of voxels in each direction
-    :param aos: The atomic orbitals parameters
+    :param aos: The packed basis set or the list of basis functions of the molecule
     :param mo_coeff: The molecular orbital coefficients
+    :param cut_off_distances: The cutoff distances for each shell
+    :param number_of_threads: The number of threads used to evaluate the grid
+    :param dtype: The type of the values of the grid, float64 or float32 (see generate_voxel_grids)
+    :return: A 3D array of values
+    """
+    return generate_voxel_grids(
+        origin,
+        voxel_size,
+        voxel_count,
+        aos,
+        np.asarray(mo_coeff, dtype=np.float64).reshape(-1, 1),
+        cut_off_distances,
+        number_of_threads,
+        dtype=dtype,
+    )[0]
+
+
+cpdef generate_voxel_grids(
+        double[:] origin,
+        double[:,:] voxel_size,
+        int64_t[:] voxel_count,
+        aos,
+        mo_coeffs,
+        cut_off_distances,
+        int number_of_threads=1,
+        mask=None,
+        dtype=np.float64,
+):
+    """
+    Generates a 3D array of values for each of several molecular orbitals on the same voxel grid.
+
+    The grid is evaluated in segments of the rows along the last axis. For every segment, the atomic orbitals of all
+    shells within their cutoff distance are evaluated for all points of the segment at once, where only the shells
+    listed for the block containing the segment are considered. The values of all molecular orbitals are then
+    obtained from a single matrix-matrix product of the resulting ao matrix with the coefficients of the contributing
+    shells, so the atomic orbitals are evaluated only once, regardless of the number of orbitals. The rows are
+    distributed over the given number of threads. If a mask is given, only the masked points are evaluated and all
+    other points are zero, which is used to refine a grid locally.
+
+    Grids of single precision take half the memory. The atomic orbitals and their products with the coefficients are
+    still calculated in double precision, only the values stored in the grids are rounded.
+
+    :param origin: The origin of the voxel grid
+    :param voxel_size: A 2D array (3x3) defining the size of voxels in each direction
+    :param voxel_count: The number of voxels in each direction
+    :param aos: The packed basis set or the list of basis functions of the molecule
+    :param mo_coeffs: The molecular orbital coefficients, one column per orbital (number of aos x number of orbitals)
+    :param cut_off_distances: The cutoff distances for each shell, which must be valid for all orbitals
+    :param number_of_threads: The number of threads used to evaluate the grid
+    :param mask: Optional boolean array with the shape of the grid, marking the points to evaluate
+    :param dtype: The type of the values of the grids, float64 or float32
+    :return: A 4D array of values with the orbitals along the first axis
+    """
+    cdef int number_of_aos = len(aos)
+    cdef double[:, ::1] mo_coefficients = np.ascontiguousarray(mo_coeffs, dtype=np.float64).reshape(number_of_aos, -1)
+    cdef int number_of_orbitals = mo_coefficients.shape[1]
+    voxel_grids = np.zeros(
+        (number_of_orbitals, voxel_count[0], voxel_count[1], voxel_count[2]),
+        dtype=grid_dtype(dtype),
+    )
+    if voxel_grids.size == 0:
+        return voxel_grids
+
+    # Without a mask, a dummy array is passed to the loops
+    cdef bint use_mask = mask is not None
+    cdef unsigned char[:, :, ::1] point_mask = np.zeros((1, 1, 1), dtype=np.uint8)
+    if use_mask:
+        if np.shape(mask) != voxel_grids.shape[1:]:
+            msg = "The mask must have the shape of the voxel grid"
+            raise ValueError(msg)
+        point_mask = np.ascontiguousarray(mask, dtype=np.uint8)
+        if not np.any(point_mask):
+            return voxel_grids
+
+    cdef GridEvaluator evaluator = GridEvaluator(
+        origin,
+        voxel_size,
+        voxel_count,
+        aos,
+        cut_off_distances,
+        number_of_threads,
+    )
+    # Coefficients of the basis functions contributing to a segment and the values of the orbitals of a segment, before
+    # they are rounded to single precision, for each thread
+    cdef double[:, :, ::1] segment_coefficients = np.zeros(
+        (evaluator.number_of_threads, evaluator.max_block_functions, number_of_orbitals),
+        dtype=np.float64,
+    )
+    cdef double[:, :, ::1] segment_values = np.zeros(
+        (evaluator.number_of_threads, number_of_orbitals, evaluator.segment_length),
+        dtype=np.float64,
+    )
+
+    # Calculate the grids, the GIL is released, so the grids can be calculated in a background thread
+    cdef double[:, :, :, ::1] voxel_grids_view
+    cdef float[:, :, :, ::1] single_voxel_grids_view
+    if voxel_grids.dtype == np.float32:
+        single_voxel_grids_view = voxel_grids
+        with nogil:
+            voxel_grid_loops(
+                evaluator,
+                mo_coefficients,
+                segment_coefficients,
+                segment_values,
+                point_mask,
+                use_mask,
+                single_voxel_grids_view,
+            )
+    else:
+        voxel_grids_view = voxel_grids
+        with nogil:
+            voxel_grid_loops(
+                evaluator,
+                mo_coefficients,
+                segment_coefficients,
+                segment_values,
+                point_mask,
+                use_mask,
+                voxel_grids_view,
+            )
+    return voxel_grids
+
+
+cpdef generate_density_grid(
+        double[:] origin,
+        double[:,:] voxel_size,
+        int64_t[:] voxel_count,
+        aos,
+        density_matrix,
+        cut_off_distances,
+        int number_of_threads=1,
+        dtype=np.float64,
+):
+    """
+    Generates a 3D array of the density sum_mu,nu D_mu,nu phi_mu phi_nu of a density matrix D.
+
+    The grid is evaluated in segments of the rows along the last axis. For every segment, the atomic orbitals of all
+    shells within their cutoff distance are evaluated for all points of the segment at once, so only the block of the
+    density matrix belonging to these basis functions is needed. The density matrix is factorized as D = U diag(w)
+    U^T, keeping only the non-vanishing eigenvalues w. Whenever the rank of D is lower than the number of basis
+    functions of a segment, the density is evaluated as sum_p w_p (sum_mu U_mu,p phi_mu)^2, otherwise the block of D
+    is multiplied with the ao matrix directly. Thus, the low rank of the density matrix of small molecules and the
+    sparsity of the segments in large molecules are both exploited. Shells without density matrix elements have a
+    cutoff distance of zero (see MolecularOrbitals.calculate_density_cut_offs) and are never evaluated. With the
+    difference of the alpha and beta density matrices, the spin density is obtained. As for the orbitals, grids of
+    single precision only round the stored values.
+
+    :param origin: The origin of the voxel grid
+    :param voxel_size: A 2D array (3x3) defining the size of voxels in each direction
+    :param voxel_count: The number of voxels in each direction
+    :param aos: The packed basis set or the list of basis functions of the molecule
+    :param density_matrix: The symmetric density matrix in the basis of the atomic orbitals
+    :param cut_off_distances: The cutoff distances for each shell
+    :param number_of_threads: The number of threads used to evaluate the grid
+    :param dtype: The type of the values of the grid, float64 or float32
     :return: A 3D array of values
     """
     cdef int number_of_aos = len(aos)
-    cdef double[:, :, :] voxel_grid = npc.ndarray(shape=(voxel_count[0], voxel_count[1], voxel_count[2]), dtype=np.float64)
-    cdef double[:, :] orbital_positions = npc.ndarray(shape=(number_of_aos, 3), dtype=np.float64)
-    cdef int64_t[:,:] orbital_ijks = npc.ndarray(shape=(number_of_aos, 3), dtype=np.intp)
-    cdef int max_length = 0, ao_index, len_ao
-    cdef double[:] electron_position = npc.ndarray(shape=3)
-    cdef int voxel_count_i = voxel_count[0], voxel_count_j = voxel_count[1], voxel_count_k = voxel_count[2]
-
-
-
-    for ao in aos:
-        len_ao = len(ao.exponents)
-        if len_ao > max_length:
-            max_length = len_ao
-
-    cdef double[:] aos_values = npc.ndarray(shape=number_of_aos)
-    cdef double[:, :] orbital_exponents = npc.ndarray(shape=(number_of_aos, max_length), dtype=np.float64)
-    cdef double[:, :] orbital_coefficients = npc.ndarray(shape=(number_of_aos, max_length), dtype=np.float64)
-    cdef double[:, :] orbital_norms = npc.ndarray(shape=(number_of_aos, max_length), dtype=np.float64)
-    cdef int64_t[:] shells_temp = npc.ndarray(shape=number_of_aos, dtype=np.int64)
-    cdef int skip_shells = 0, shell_index = 0
-    cdef int number_of_shells = 0
-
-    # Prepare the data
-    orbital_exponents[:,:] = 0
-    orbital_coefficients[:,:] = 0
-    orbital_norms[:,:] = 0
-    orbital_positions[:,:] = 0
-    orbital_ijks[:,:] = 0
-    electron_position[:] = 0
-    for ao_index, ao in enumerate(aos):
-        for i in range(len(ao.exponents)):
-            orbital_exponents[ao_index, i] = ao.exponents[i]
-            orbital_coefficients[ao_index, i] = ao.coefficients[i]
-            orbital_norms[ao_index, i] = ao.norms[i]
-        for i in range(3):
-            orbital_positions[ao_index, i] = ao.position[i] * ANGSTROM_TO_BOHR
-            orbital_ijks[ao_index, i] = ao.ijk[i]
-        if skip_shells == 0:
-            if sum(ao.ijk) == 0:
-                shells_temp[shell_index] = 0
-            elif sum(ao.ijk) == 1:
-                shells_temp[shell_index] = 1
-                skip_shells = 2
-            elif sum(ao.ijk) == 2:
-                shells_temp[shell_index] = 2
-                skip_shells = 5
-            elif sum(ao.ijk) == 3:
-                shells_temp[shell_index] = 3
-                skip_shells = 9
-            elif sum(ao.ijk) == 4:
-                shells_temp[shell_index] = 4
-                skip_shells = 14
-            shell_index += 1
-            number_of_shells += 1
-        else:
-            skip_shells -= 1
-
-    cdef int64_t[:] shells = npc.ndarray(shape=number_of_shells, dtype=np.int64)
-    shells = shells_temp[:number_of_shells]
-
-    cdef double[3] voxel_size_i = [voxel_size[0, 0],
-                                  voxel_size[0, 1],
-                                  voxel_size[0, 2]]
-    cdef double[3] voxel_size_j = [voxel_size[1, 0],
-                                  voxel_size[1, 1],
-                                  voxel_size[1, 2]]
-    cdef double[3] voxel_size_k = [voxel_size[2, 0],
-                                  voxel_size[2, 1],
-                                  voxel_size[2, 2]]
-
-    # Calculate the grid
-    voxel_grid_loops(
-        electron_position,
-        voxel_grid,
-        voxel_size_i,
-        voxel_size_j,
-        voxel_size_k,
-        voxel_count_i,
-        voxel_count_j,
-        voxel_count_k,
+    cdef double[:, ::1] density = np.ascontiguousarray(density_matrix, dtype=np.float64)
+    if density.shape[0] != number_of_aos or density.shape[1] != number_of_aos:
+        msg = "The density matrix must be a square matrix with the size of the basis set"
+        raise ValueError(msg)
+
+    voxel_grid = np.zeros((voxel_count[0], voxel_count[1], voxel_count[2]), dtype=grid_dtype(dtype))
+    if voxel_grid.size == 0 or number_of_aos == 0:
+        return voxel_grid
+
+    # Factorization of the density matrix, eigenvalues that are negligible compared to the largest one are dropped
+    eigenvalues, eigenvectors = np.linalg.eigh(np.asarray(density))
+    relevant = np.abs(eigenvalues) > 1e-12 * max(np.max(np.abs(eigenvalues)), 1e-300)
+    cdef double[:] weights = np.ascontiguousarray(eigenvalues[relevant])
+    cdef double[:, ::1] factors = np.ascontiguousarray(eigenvectors[:, relevant])
+    cdef int rank = weights.shape[0]
+    if rank == 0:
+        return voxel_grid
+
+    cdef GridEvaluator evaluator = GridEvaluator(
         origin,
-        orbital_positions,
-        orbital_coefficients,
-        orbital_exponents,
-        orbital_norms,
-        shells,
-        mo_coeff,
-        aos_values,
+        voxel_size,
+        voxel_count,
+        aos,
         cut_off_distances,
+        number_of_threads,
+    )
+    # Block of the density matrix or of the factors belonging to the basis functions of a segment and its product with
+    # the ao matrix for each thread. A segment has at most the basis functions of the shells of its block, so the
+    # buffers do not grow with the square of the size of the basis set.
+    cdef int block_functions = evaluator.max_block_functions
+    cdef double[:, :, ::1] density_blocks = np.zeros(
+        (evaluator.number_of_threads, block_functions, block_functions),
+        dtype=np.float64,
     )
+    cdef double[:, :, ::1] segment_factors = np.zeros(
+        (evaluator.number_of_threads, block_functions, rank),
+        dtype=np.float64,
+    )
+    cdef double[:, :, ::1] products = np.zeros(
+        (evaluator.number_of_threads, evaluator.segment_length, max(block_functions, rank)),
+        dtype=np.float64,
+    )
+
+    # Calculate the grid, the GIL is released, so the grid can be calculated in a background thread
+    cdef double[:, :, ::1] voxel_grid_view
+    cdef float[:, :, ::1] single_voxel_grid_view
+    if voxel_grid.dtype == np.float32:
+        single_voxel_grid_view = voxel_grid
+        with nogil:
+            density_grid_loops(
+                evaluator,
+                density,
+                factors,
+                weights,
+                density_blocks,
+                segment_factors,
+                products,
+                single_voxel_grid_view,
+            )
+    else:
+        voxel_grid_view = voxel_grid
+        with nogil:
+            density_grid_loops(
+                evaluator,
+                density,
+                factors,
+                weights,
+                density_blocks,
+                segment_factors,
+                products,
+                voxel_grid_view,
+            )
     return voxel_grid
 
+
+def grid_dtype(dtype):
+    """Check the type of the values of the grids, only single and double precision are supported.
+
+    :param dtype: type of the values of the grids
+    :return: numpy dtype of the grids
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        msg = "The grids must be of type float32 or float64"
+        raise ValueError(msg)
+    return dtype
+
+
+def plane_grid_parameters(double[:, :] voxel_size, int64_t[:] voxel_count):
+    """Return the voxel size and count of the single layer voxel grid, whose rows run along the second axis of a plane.
+
+    The rows of the voxel grids are evaluated in segments along the last axis, which would only contain a single point
+    for a plane stored as a grid with one layer along the last axis. Instead, the plane is stored as the only layer
+    along the first axis, so the segments run along the plane and the shells are screened for blocks of the plane.
+
+    :param voxel_size: A 2D array (2x3) of the vectors spanning a pixel of the plane
+    :param voxel_count: The number of points along both axes of the plane
+    :return: voxel size (3x3) and count (3) of the voxel grid
+    """
+    grid_voxel_size = np.zeros((3, 3), dtype=np.float64)
+    grid_voxel_size[1:] = np.asarray(voxel_size)[:2]
+    return grid_voxel_size, np.array([1, voxel_count[0], voxel_count[1]], dtype=np.int64)
+
+
+cpdef generate_plane_grids(
+        double[:] origin,
+        double[:, :] voxel_size,
+        int64_t[:] voxel_count,
+        aos,
+        mo_coeffs,
+        cut_off_distances,
+        int number_of_threads=1,
+):
+    """
+    Generates a 2D array of values for each of several molecular orbitals on an arbitrarily oriented plane.
+
+    The plane is evaluated like a voxel grid (see generate_voxel_grids), with the same screening of the shells and the
+    rows of the plane distributed over the threads. The resulting grids can be passed to marching_squares directly.
+
+    :param origin: The origin of the plane
+    :param voxel_size: A 2D array (2x3) of the vectors spanning a pixel of the plane
+    :param voxel_count: The number of points along both axes of the plane
+    :param aos: The packed basis set or the list of basis functions of the molecule
+    :param mo_coeffs: The molecular orbital coefficients, one column per orbital (number of aos x number of orbitals)
+    :param cut_off_distances: The cutoff distances for each shell, which must be valid for all orbitals
+    :param number_of_threads: The number of threads used to evaluate the plane
+    :return: A 3D array of values with the orbitals along the first axis
+    """
+    grid_voxel_size, grid_voxel_count = plane_grid_parameters(voxel_size, voxel_count)
+    return generate_voxel_grids(
+        origin,
+        grid_voxel_size,
+        grid_voxel_count,
+        aos,
+        mo_coeffs,
+        cut_off_distances,
+        number_of_threads,
+    )[:, 0]
+
+
+cpdef generate_plane_grid(
+        double[:] origin,
+        double[:, :] voxel_size,
+        int64_t[:] voxel_count,
+        aos,
+        mo_coeff,
+        cut_off_distances,
+        int number_of_threads=1,
+):
+    """
+    Generates a 2D array of the values of a molecular orbital on an arbitrarily oriented plane.
+
+    :param origin: The origin of the plane
+    :param voxel_size: A 2D array (2x3) of the vectors spanning a pixel of the plane
+    :param voxel_count: The number of points along both axes of the plane
+    :param aos: The packed basis set or the list of basis functions of the molecule
+    :param mo_coeff: The molecular orbital coefficients
+    :param cut_off_distances: The cutoff distances for each shell
+    :param number_of_threads: The number of threads used to evaluate the plane
+    :return: A 2D array of values
+    """
+    return generate_plane_grids(
+        origin,
+        voxel_size,
+        voxel_count,
+        aos,
+        np.asarray(mo_coeff, dtype=np.float64).reshape(-1, 1),
+        cut_off_distances,
+        number_of_threads,
+    )[0]
+
+
+cpdef generate_density_plane(
+        double[:] origin,
+        double[:, :] voxel_size,
+        int64_t[:] voxel_count,
+        aos,
+        density_matrix,
+        cut_off_distances,
+        int number_of_threads=1,
+):
+    """
+    Generates a 2D array of the density of a density matrix on an arbitrarily oriented plane.
+
+    The plane is evaluated like a voxel grid (see generate_density_grid).
+
+    :param origin: The origin of the plane
+    :param voxel_size: A 2D array (2x3) of the vectors spanning a pixel of the plane
+    :param voxel_count: The number of points along both axes of the plane
+    :param aos: The packed basis set or the list of basis functions of the molecule
+    :param density_matrix: The symmetric density matrix in the basis of the atomic orbitals
+    :param cut_off_distances: The cutoff distances for each shell
+    :param number_of_threads: The number of threads used to evaluate the plane
+    :return: A 2D array of values
+    """
+    grid_voxel_size, grid_voxel_count = plane_grid_parameters(voxel_size, voxel_count)
+    return generate_density_grid(
+        origin,
+        grid_voxel_size,
+        grid_voxel_count,
+        aos,
+        density_matrix,
+        cut_off_distances,
+        number_of_threads,
+    )[0]
+
+
+@boundscheck(False)
+@wraparound(False)
+cpdef calculate_mo_gradients(
+        double[:, :] positions,
+        aos,
+        mo_coeff,
+        cut_off_distances,
+        int number_of_threads=1,
+):
+    """
+    Calculates the gradients of a molecular orbital at several positions analytically.
+
+    The gradients of the atomic orbitals are calculated from the same primitives as the voxel grids, only the shells
+    within their cutoff distance of a position contribute. The gradients are used as the exact normals of the
+    isosurfaces of the orbital at their vertices.
+
+    :param positions: The positions (angstrom) the gradients are calculated at (number of positions x 3)
+    :param aos: The packed basis set or the list of basis functions of the molecule
+    :param mo_coeff: The molecular orbital coefficients
+    :param cut_off_distances: The cutoff distances for each shell
+    :param number_of_threads: The number of threads used to calculate the gradients
+    :return: The gradients (per bohr) at the positions (number of positions x 3)
+    """
+    cdef int number_of_positions = positions.shape[0]
+    cdef int threads = max(number_of_threads, 1)
+    cdef int point, thread, shell_index, shell, shell_start, function, c
+    cdef double distance_sq
+
+    gradients = np.zeros((number_of_positions, 3), dtype=np.float64)
+    if number_of_positions == 0 or len(aos) == 0:
+        return gradients
+
+    basis_set = pack_basis_set(aos)
+    cdef int64_t[:] types = basis_set.shell_types
+    cdef int64_t[:] offsets = basis_set.shell_offsets
+    cdef int64_t[:] primitives = basis_set.shell_primitives
+    cdef double[:, :] centers = basis_set.shell_positions
+    cdef double[:, :] exponents = basis_set.shell_exponents
+    cdef double[:, :] coefficients = basis_set.shell_coefficients
+    cdef double[:, :] norms = basis_set.shell_norms
+    cdef bint spherical = basis_set.spherical
+    cdef int64_t[:] term_offsets = basis_set.spherical_term_offsets
+    cdef int64_t[:, :] term_exponents = basis_set.spherical_term_exponents
+    cdef double[:] term_coefficients = basis_set.spherical_term_coefficients
+    cdef double[:] cut_offs = np.asarray(cut_off_distances, dtype=np.float64)
+    cdef double[:] mo_coefficients = np.asarray(mo_coeff, dtype=np.float64)
+    cdef double[:, :] electron_positions = np.asarray(positions, dtype=np.float64) * ANGSTROM_TO_BOHR_
+    cdef double[:, :, ::1] ao_gradients = np.zeros((threads, 15, 3), dtype=np.float64)
+    cdef double[:, ::1] gradients_view = gradients
+
+    # The GIL is released, so the gradients can be calculated in a background thread
+    with nogil:
+        for point in prange(number_of_positions, schedule="static", num_threads=threads):
+            thread = threadid()
+            for shell_index in range(types.shape[0]):
+                distance_sq = 0.0
+                for c in range(3):
+                    distance_sq = distance_sq + (electron_positions[point, c] - centers[shell_index, c]) ** 2
+                if distance_sq >= cut_offs[shell_index] ** 2:
+                    continue
+                shell = types[shell_index]
+                shell_start = offsets[shell_index]
+                if spherical and shell > 1:
+                    calculate_spherical_ao_gradients(
+                        electron_positions[point],
+                        centers[shell_index],
+                        exponents[shell_index],
+                        coefficients[shell_index],
+                        norms[shell_index],
+                        primitives[shell_index],
+                        shell,
+                        term_offsets,
+                        term_exponents,
+                        term_coefficients,
+                        ao_gradients[thread],
+                    )
+                else:
+                    calculate_ao_gradients(
+                        electron_positions[point],
+                        centers[shell_index],
+                        exponents[shell_index],
+                        coefficients[shell_index],
+                        norms[shell_index],
+                        primitives[shell_index],
+                        shell,
+                        ao_gradients[thread],
+                    )
+                for function in range(offsets[shell_index + 1] - shell_start):
+                    for c in range(3):
+                        gradients_view[point, c] += mo_coefficients[shell_start + function] * ao_gradients[
+                            thread,
+                            function,
+                            c,
+                        ]
+    return gradients
+
+
 @exceptval(check=False)
 @boundscheck(False)
 @wraparound(False)
 cdef inline void voxel_grid_loops(
-        double[:] electron_position,
-        double[:, :, :] voxel_grid,
-        double[:] voxel_size_i,
-        double[:] voxel_size_j,
-        double[:] voxel_size_k,
-        int voxel_count_i,
-        int voxel_count_j,
-        int voxel_count_k,
-        double[:] origin,
-        double[:,:] orbital_positions,
-        double[:,:] orbital_coefficients,
-        double[:,:] orbital_exponents,
-        double[:,:] orbital_norms,
-        int64_t[:] shells,
-        double[:] mo_coeff,
-        double[:] aos_values,
-        double[:] cut_off_distances) nogil:
-
-    cdef int i, j, k
-    cdef double[3] electron_position_i, electron_position_j, electron_position_k
-
-    for i in range(voxel_count_i):
-        electron_position_i[0] = voxel_size_i[0] * i
-        electron_position_i[1] = voxel_size_i[1] * i
-        electron_position_i[2] = voxel_size_i[2] * i
-        for j in range(voxel_count_j):
-            electron_position_j[0] = voxel_size_j[0] * j
-            electron_position_j[1] = voxel_size_j[1] * j
-            electron_position_j[2] = voxel_size_j[2] * j
-            for k in range(voxel_count_k):
-                electron_position_k[0] = voxel_size_k[0] * k
-                electron_position_k[1] = voxel_size_k[1] * k
-                electron_position_k[2] = voxel_size_k[2] * k
-                electron_position[0] = (electron_position_i[0] + electron_position_j[0] + electron_position_k[0])
-                electron_position[1] = (electron_position_i[1] + electron_position_j[1] + electron_position_k[1])
-                electron_position[2] = (electron_position_i[2] + electron_position_j[2] + electron_position_k[2])
-                electron_position[0] = (electron_position[0] + origin[0]) * ANGSTROM_TO_BOHR_
-                electron_position[1] = (electron_position[1] + origin[1]) * ANGSTROM_TO_BOHR_
-                electron_position[2] = (electron_position[2] + origin[2]) * ANGSTROM_TO_BOHR_
-
-                voxel_grid[i, j, k] = calculate_mo_cartesian(
-                    electron_position,
-                    orbital_positions,
-                    orbital_coefficients,
-                    orbital_exponents,
-                    orbital_norms,
-                    shells,
-                    mo_coeff,
-                    aos_values,
-                    cut_off_distances,
-                )
+        GridEvaluator evaluator,
+        double[:, ::1] mo_coefficients,
+        double[:, :, ::1] segment_coefficients,
+        double[:, :, ::1] segment_values,
+        unsigned char[:, :, ::1] mask,
+        bint use_mask,
+        floating[:, :, :, ::1] voxel_grids) noexcept nogil:
+
+    cdef int row, i, j, block_k, thread
+
+    # The rows along the last axis are scheduled dynamically, because the number of contributing shells varies strongly
+    # across the grid. Distributing rows instead of slabs along the first axis keeps all threads busy for planes, which
+    # only have a single slab.
+    for row in prange(
+        evaluator.voxel_count_i * evaluator.voxel_count_j,
+        schedule="dynamic",
+        num_threads=evaluator.number_of_threads,
+    ):
+        thread = threadid()
+        i = row // evaluator.voxel_count_j
+        j = row - i * evaluator.voxel_count_j
+        for block_k in range(evaluator.blocks_k):
+            voxel_grid_segment(
+                i,
+                j,
+                block_k,
+                thread,
+                evaluator,
+                mo_coefficients,
+                segment_coefficients[thread],
+                segment_values[thread],
+                mask,
+                use_mask,
+                voxel_grids,
+            )
+
+
+@exceptval(check=False)
+@boundscheck(False)
+@wraparound(False)
+cdef inline void voxel_grid_segment(
+        int i,
+        int j,
+        int block_k,
+        int thread,
+        GridEvaluator evaluator,
+        double[:, ::1] mo_coefficients,
+        double[:, ::1] segment_coefficients,
+        double[:, ::1] segment_values,
+        unsigned char[:, :, ::1] mask,
+        bint use_mask,
+        floating[:, :, :, ::1] voxel_grids) noexcept nogil:
+    """Evaluate one segment of a row of the voxel grids along the last axis.
+
+    With a mask, only the range between the first and the last masked point of the segment is evaluated and the
+    unmasked points within this range are reset to zero afterwards. The values of single precision grids are
+    calculated in segment_values (orbitals x points) and rounded, when they are stored.
+    """
+    cdef int k, c, o, number_of_columns
+    cdef int number_of_orbitals = mo_coefficients.shape[1]
+    cdef int first_k = block_k * evaluator.segment_length
+    cdef int number_of_points = min(evaluator.segment_length, evaluator.voxel_count_k - first_k)
+    cdef int last_k = first_k + number_of_points - 1
+    cdef double[:, ::1] ao_matrix = evaluator.ao_matrices[thread]
+    cdef int64_t[:] segment_functions = evaluator.segment_functions[thread]
+    cdef char trans = b"T"
+    cdef int m, n, lda, ldb, ldc
+    cdef double alpha = 1.0, beta = 0.0
+    cdef double* values
+
+    if use_mask:
+        while first_k <= last_k and not mask[i, j, first_k]:
+            first_k = first_k + 1
+        while last_k >= first_k and not mask[i, j, last_k]:
+            last_k = last_k - 1
+        if first_k > last_k:
+            return
+        number_of_points = last_k - first_k + 1
+
+    number_of_columns = evaluator.evaluate_segment(i, j, block_k, first_k, number_of_points, thread)
+    if number_of_columns == 0:
+        for o in range(number_of_orbitals):
+            for k in range(first_k, first_k + number_of_points):
+                voxel_grids[o, i, j, k] = 0.0
+        return
+
+    for c in range(number_of_columns):
+        for o in range(number_of_orbitals):
+            segment_coefficients[c, o] = mo_coefficients[segment_functions[c], o]
+
+    # mo values of the segment = ao matrix (points x columns) times the coefficients (columns x orbitals). BLAS
+    # expects column major matrices, so both row major inputs are passed transposed and the result is written as a
+    # points x orbitals matrix whose columns are the segments of the individual orbital grids
+    m = number_of_points
+    n = number_of_orbitals
+    k = number_of_columns
+    lda = ao_matrix.shape[1]
+    ldb = segment_coefficients.shape[1]
+    if floating is double:
+        values = &voxel_grids[0, i, j, first_k]
+        ldc = voxel_grids.strides[0] // sizeof(double)
+    else:
+        values = &segment_values[0, 0]
+        ldc = segment_values.shape[1]
+    dgemm(
+        &trans,
+        &trans,
+        &m,
+        &n,
+        &k,
+        &alpha,
+        &ao_matrix[0, 0],
+        &lda,
+        &segment_coefficients[0, 0],
+        &ldb,
+        &beta,
+        values,
+        &ldc,
+    )
+    if floating is float:
+        for o in range(number_of_orbitals):
+            for k in range(number_of_points):
+                voxel_grids[o, i, j, first_k + k] = <float>segment_values[o, k]
+    if use_mask:
+        for k in range(first_k, last_k + 1):
+            if not mask[i, j, k]:
+                for o in range(number_of_orbitals):
+                    voxel_grids[o, i, j, k] = 0.0
+
+
+@exceptval(check=False)
+@boundscheck(False)
+@wraparound(False)
+cdef inline void density_grid_loops(
+        GridEvaluator evaluator,
+        double[:, ::1] density,
+        double[:, ::1] factors,
+        double[:] weights,
+        double[:, :, ::1] density_blocks,
+        double[:, :, ::1] segment_factors,
+        double[:, :, ::1] products,
+        floating[:, :, ::1] voxel_grid) noexcept nogil:
+
+    cdef int row, i, j, block_k, thread
+
+    for row in prange(
+        evaluator.voxel_count_i * evaluator.voxel_count_j,
+        schedule="dynamic",
+        num_threads=evaluator.number_of_threads,
+    ):
+        thread = threadid()
+        i = row // evaluator.voxel_count_j
+        j = row - i * evaluator.voxel_count_j
+        for block_k in range(evaluator.blocks_k):
+            density_grid_segment(
+                i,
+                j,
+                block_k,
+                thread,
+                evaluator,
+                density,
+                factors,
+                weights,
+                density_blocks[thread],
+                segment_factors[thread],
+                products[thread],
+                voxel_grid,
+            )
+
+
+@exceptval(check=False)
+@boundscheck(False)
+@wraparound(False)
+cdef inline void density_grid_segment(
+        int i,
+        int j,
+        int block_k,
+        int thread,
+        GridEvaluator evaluator,
+        double[:, ::1] density,
+        double[:, ::1] factors,
+        double[:] weights,
+        double[:, ::1] density_block,
+        double[:, ::1] segment_factor,
+        double[:, ::1] product,
+        floating[:, :, ::1] voxel_grid) noexcept nogil:
+    """Evaluate one segment of a row of the density grid along the last axis."""
+    cdef int k, c, d, p
+    cdef int rank = weights.shape[0]
+    cdef int first_k = block_k * evaluator.segment_length
+    cdef int number_of_points = min(evaluator.segment_length, evaluator.voxel_count_k - first_k)
+    cdef int number_of_columns = evaluator.evaluate_segment(i, j, block_k, first_k, number_of_points, thread)
+    cdef double[:, ::1] ao_matrix = evaluator.ao_matrices[thread]
+    cdef int64_t[:] segment_functions = evaluator.segment_functions[thread]
+    cdef char no_trans = b"N"
+    cdef int m, n, lda, ldb, ldc, inc = 1
+    cdef double alpha = 1.0, beta = 0.0, value
+
+    if number_of_columns == 0:
+        for k in range(first_k, first_k + number_of_points):
+            voxel_grid[i, j, k] = 0.0
+        return
+
+    n = number_of_points
+    k = number_of_columns
+    ldb = ao_matrix.shape[1]
+    ldc = product.shape[1]
+
+    if rank < number_of_columns:
+        # product = ao matrix (points x columns) times the factors (columns x rank). In the column major convention
+        # of BLAS, this is the transposed factors times the transposed ao matrix
+        for c in range(number_of_columns):
+            for p in range(rank):
+                segment_factor[c, p] = factors[segment_functions[c], p]
+        m = rank
+        lda = segment_factor.shape[1]
+        dgemm(
+            &no_trans,
+            &no_trans,
+            &m,
+            &n,
+            &k,
+            &alpha,
+            &segment_factor[0, 0],
+            &lda,
+            &ao_matrix[0, 0],
+            &ldb,
+            &beta,
+            &product[0, 0],
+            &ldc,
+        )
+        for k in range(number_of_points):
+            value = 0.0
+            for p in range(rank):
+                value = value + weights[p] * product[k, p] * product[k, p]
+            voxel_grid[i, j, first_k + k] = value
+        return
+
+    # product = ao matrix (points x columns) times the density block (columns x columns). In the column major
+    # convention of BLAS, this is the (symmetric) density block times the transposed ao matrix
+    for c in range(number_of_columns):
+        for d in range(number_of_columns):
+            density_block[c, d] = density[segment_functions[c], segment_functions[d]]
+    m = number_of_columns
+    lda = density_block.shape[1]
+    dgemm(
+        &no_trans,
+        &no_trans,
+        &m,
+        &n,
+        &k,
+        &alpha,
+        &density_block[0, 0],
+        &lda,
+        &ao_matrix[0, 0],
+        &ldb,
+        &beta,
+        &product[0, 0],
+        &ldc,
+    )
+    for k in range(number_of_points):
+        voxel_grid[i, j, first_k + k] = ddot(&m, &ao_matrix[k, 0], &inc, &product[k, 0], &inc)
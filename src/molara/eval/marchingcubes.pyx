@@ -3,18 +3,28 @@
 from __future__ import annotations
 
 import numpy as np
-from libc.stdint cimport int64_t
+from libc.stdint cimport int64_t, uint32_t
 from libc.math cimport sqrt
 from cython import boundscheck, exceptval, cdivision
+from cython cimport floating
+from cython.parallel cimport prange, threadid
+
+# The voxels are summarized in blocks of block_size x block_size x block_size voxels, so the blocks without isosurfaces
+# can be skipped
+cdef int block_size = 8
+
+# Index of the vertex of an edge, which has not been calculated yet. The vertex indices are stored as uint32, so the
+# largest value is never a valid index.
+cdef uint32_t no_vertex = 0xFFFFFFFF
 
 @exceptval(check=False)
 @boundscheck(False)
 @cdivision(True)
 cpdef int marching_cubes(
-    double[:, :, :] grid,
+    floating[:, :, :] grid,
     double isovalue,
     double[:] origin,
-    double[:] voxel_size,
+    double[:, :] voxel_size,
     int64_t[:] voxel_number,
     float[:] vertices_1,
     float[:] vertices_2,
@@ -24,7 +34,7 @@ cpdef int marching_cubes(
     :param grid: 3D numpy array containing the values of the voxels
     :param isovalue: value of the isosurface
     :param origin: origin of the voxel grids (position of the 0, 0, 0 entry)
-    :param voxel_size: size of the voxels in each direction
+    :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
     :param voxel_number: number of voxels in each direction
     :param vertices_1: vertices of the isosurface to be returned. The last entry is the number of vertices
     :param vertices_2: vertices of the isosurface of the other phase to be returned. The number of vertices is saved
@@ -37,6 +47,7 @@ cpdef int marching_cubes(
     cdef float[:] p11, p12, p21, p22, p31, p32, vertex1, vertex2, vertex3, n1, n2, n3, n_corner_1, n_corner_2
     cdef float v11, v12, v21, v22, v31, v32, t1, t2, t3
     cdef int64_t[:, :] edges_1_2, voxel_indices
+    cdef double[:, :] inverse_voxel_size = np.linalg.inv(voxel_size)
 
     x_voxels = voxel_number[0]
     y_voxels = voxel_number[1]
@@ -66,187 +77,1048 @@ cpdef int marching_cubes(
     vertices_count_1 = 0
     vertices_count_2 = 0
 
-    for i in range(x_voxels - 1):
-        # Calculate the 8 indices of the current voxel
-        voxel_indices[0, 0] = i
-        voxel_indices[1, 0] = i
-        voxel_indices[2, 0] = i + 1
-        voxel_indices[3, 0] = i + 1
-        voxel_indices[4, 0] = i
-        voxel_indices[5, 0] = i
-        voxel_indices[6, 0] = i + 1
-        voxel_indices[7, 0] = i + 1
-
-        for j in range(y_voxels - 1):
+    # The GIL is released, so the surfaces can be calculated in a background thread
+    with nogil:
+        for i in range(x_voxels - 1):
             # Calculate the 8 indices of the current voxel
-            voxel_indices[0, 1] = j
-            voxel_indices[1, 1] = j
-            voxel_indices[2, 1] = j
-            voxel_indices[3, 1] = j
-            voxel_indices[4, 1] = j + 1
-            voxel_indices[5, 1] = j + 1
-            voxel_indices[6, 1] = j + 1
-            voxel_indices[7, 1] = j + 1
-
-            for k in range(z_voxels - 1):
-                # Calculate the 8 indices of the current voxel
-                voxel_indices[0, 2] = k + 1
-                voxel_indices[1, 2] = k
-                voxel_indices[2, 2] = k
-                voxel_indices[3, 2] = k + 1
-                voxel_indices[4, 2] = k + 1
-                voxel_indices[5, 2] = k
-                voxel_indices[6, 2] = k
-                voxel_indices[7, 2] = k + 1
+            voxel_indices[0, 0] = i
+            voxel_indices[1, 0] = i
+            voxel_indices[2, 0] = i + 1
+            voxel_indices[3, 0] = i + 1
+            voxel_indices[4, 0] = i
+            voxel_indices[5, 0] = i
+            voxel_indices[6, 0] = i + 1
+            voxel_indices[7, 0] = i + 1
 
+            for j in range(y_voxels - 1):
                 # Calculate the 8 indices of the current voxel
-                voxel_values[0] = grid[i, j, k + 1]
-                voxel_values[1] = grid[i, j, k]
-                voxel_values[2] = grid[i + 1, j, k]
-                voxel_values[3] = grid[i + 1, j, k + 1]
-                voxel_values[4] = grid[i, j + 1, k + 1]
-                voxel_values[5] = grid[i, j + 1, k]
-                voxel_values[6] = grid[i + 1, j + 1, k]
-                voxel_values[7] = grid[i + 1, j + 1, k + 1]
-                get_edges(edges_1_2, isovalue, voxel_values)
-                for phase in range(2):
-                    prefactor = 1 if phase == 0 else -1
-                    for ei in range(5):
-                        if edges_1_2[phase, ei * 3] == -1:
-                            break
-                        c11 = edge_vertex_indices[edges_1_2[phase][ei * 3], 0]
-                        c12 = edge_vertex_indices[edges_1_2[phase][ei * 3], 1]
-                        c21 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 1], 0]
-                        c22 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 1], 1]
-                        c31 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 2], 0]
-                        c32 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 2], 1]
-
-                        # unrolling loop: calulcation of the 3D coordinates of the vertices
-                        p11[0] = origin[0] + voxel_size[0] * voxel_indices[c11, 0]
-                        p11[1] = origin[1] + voxel_size[1] * voxel_indices[c11, 1]
-                        p11[2] = origin[2] + voxel_size[2] * voxel_indices[c11, 2]
-                        p12[0] = origin[0] + voxel_size[0] * voxel_indices[c12, 0]
-                        p12[1] = origin[1] + voxel_size[1] * voxel_indices[c12, 1]
-                        p12[2] = origin[2] + voxel_size[2] * voxel_indices[c12, 2]
-                        p21[0] = origin[0] + voxel_size[0] * voxel_indices[c21, 0]
-                        p21[1] = origin[1] + voxel_size[1] * voxel_indices[c21, 1]
-                        p21[2] = origin[2] + voxel_size[2] * voxel_indices[c21, 2]
-                        p22[0] = origin[0] + voxel_size[0] * voxel_indices[c22, 0]
-                        p22[1] = origin[1] + voxel_size[1] * voxel_indices[c22, 1]
-                        p22[2] = origin[2] + voxel_size[2] * voxel_indices[c22, 2]
-                        p31[0] = origin[0] + voxel_size[0] * voxel_indices[c31, 0]
-                        p31[1] = origin[1] + voxel_size[1] * voxel_indices[c31, 1]
-                        p31[2] = origin[2] + voxel_size[2] * voxel_indices[c31, 2]
-                        p32[0] = origin[0] + voxel_size[0] * voxel_indices[c32, 0]
-                        p32[1] = origin[1] + voxel_size[1] * voxel_indices[c32, 1]
-                        p32[2] = origin[2] + voxel_size[2] * voxel_indices[c32, 2]
-
-                        v11 = voxel_values[c11]
-                        v12 = voxel_values[c12]
-                        v21 = voxel_values[c21]
-                        v22 = voxel_values[c22]
-                        v31 = voxel_values[c31]
-                        v32 = voxel_values[c32]
-
-                        t1 = calculate_interpolation_value(
-                            isovalue * prefactor,
-                            v11,
-                            v12,
-                        )
-                        t2 = calculate_interpolation_value(
-                            isovalue * prefactor,
-                            v21,
-                            v22,
-                        )
-                        t3 = calculate_interpolation_value(
-                            isovalue * prefactor,
-                            v31,
-                            v32,
-                        )
-
-                        # Get normals
-                        calculate_normal_vertex(
-                            n1,
-                            n_corner_1,
-                            n_corner_2,
-                            grid,
-                            voxel_indices[c11, :],
-                            voxel_indices[c12, :],
-                            t1,
+                voxel_indices[0, 1] = j
+                voxel_indices[1, 1] = j
+                voxel_indices[2, 1] = j
+                voxel_indices[3, 1] = j
+                voxel_indices[4, 1] = j + 1
+                voxel_indices[5, 1] = j + 1
+                voxel_indices[6, 1] = j + 1
+                voxel_indices[7, 1] = j + 1
+
+                for k in range(z_voxels - 1):
+                    # Calculate the 8 indices of the current voxel
+                    voxel_indices[0, 2] = k + 1
+                    voxel_indices[1, 2] = k
+                    voxel_indices[2, 2] = k
+                    voxel_indices[3, 2] = k + 1
+                    voxel_indices[4, 2] = k + 1
+                    voxel_indices[5, 2] = k
+                    voxel_indices[6, 2] = k
+                    voxel_indices[7, 2] = k + 1
+
+                    # Calculate the 8 indices of the current voxel
+                    voxel_values[0] = grid[i, j, k + 1]
+                    voxel_values[1] = grid[i, j, k]
+                    voxel_values[2] = grid[i + 1, j, k]
+                    voxel_values[3] = grid[i + 1, j, k + 1]
+                    voxel_values[4] = grid[i, j + 1, k + 1]
+                    voxel_values[5] = grid[i, j + 1, k]
+                    voxel_values[6] = grid[i + 1, j + 1, k]
+                    voxel_values[7] = grid[i + 1, j + 1, k + 1]
+                    get_edges(edges_1_2, isovalue, voxel_values)
+                    for phase in range(2):
+                        prefactor = 1 if phase == 0 else -1
+                        for ei in range(5):
+                            if edges_1_2[phase, ei * 3] == -1:
+                                break
+                            c11 = edge_vertex_indices[edges_1_2[phase][ei * 3], 0]
+                            c12 = edge_vertex_indices[edges_1_2[phase][ei * 3], 1]
+                            c21 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 1], 0]
+                            c22 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 1], 1]
+                            c31 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 2], 0]
+                            c32 = edge_vertex_indices[edges_1_2[phase][ei * 3 + 2], 1]
+
+                            # 3D coordinates of the grid points at the ends of the edges
+                            lattice_position(p11, origin, voxel_size, voxel_indices[c11, :])
+                            lattice_position(p12, origin, voxel_size, voxel_indices[c12, :])
+                            lattice_position(p21, origin, voxel_size, voxel_indices[c21, :])
+                            lattice_position(p22, origin, voxel_size, voxel_indices[c22, :])
+                            lattice_position(p31, origin, voxel_size, voxel_indices[c31, :])
+                            lattice_position(p32, origin, voxel_size, voxel_indices[c32, :])
+
+                            v11 = voxel_values[c11]
+                            v12 = voxel_values[c12]
+                            v21 = voxel_values[c21]
+                            v22 = voxel_values[c22]
+                            v31 = voxel_values[c31]
+                            v32 = voxel_values[c32]
+
+                            t1 = calculate_interpolation_value(
+                                isovalue * prefactor,
+                                v11,
+                                v12,
                             )
-                        calculate_normal_vertex(
-                            n2,
-                            n_corner_1,
-                            n_corner_2,
-                            grid,
-                            voxel_indices[c21, :],
-                            voxel_indices[c22, :],
-                            t2,
+                            t2 = calculate_interpolation_value(
+                                isovalue * prefactor,
+                                v21,
+                                v22,
                             )
-                        calculate_normal_vertex(
-                            n3,
-                            n_corner_1,
-                            n_corner_2,
-                            grid,
-                            voxel_indices[c31, :],
-                            voxel_indices[c32, :],
-                            t3,
+                            t3 = calculate_interpolation_value(
+                                isovalue * prefactor,
+                                v31,
+                                v32,
                             )
 
-                        # Get vertices (unrolled loop)
-                        vertex1[0] = p11[0] + t1 * (p12[0] - p11[0])
-                        vertex1[1] = p11[1] + t1 * (p12[1] - p11[1])
-                        vertex1[2] = p11[2] + t1 * (p12[2] - p11[2])
-                        vertex2[0] = p21[0] + t2 * (p22[0] - p21[0])
-                        vertex2[1] = p21[1] + t2 * (p22[1] - p21[1])
-                        vertex2[2] = p21[2] + t2 * (p22[2] - p21[2])
-                        vertex3[0] = p31[0] + t3 * (p32[0] - p31[0])
-                        vertex3[1] = p31[1] + t3 * (p32[1] - p31[1])
-                        vertex3[2] = p31[2] + t3 * (p32[2] - p31[2])
-
-                        # get the normals (unrolled loop)
-                        n1[0] = -prefactor * n1[0]
-                        n1[1] = -prefactor * n1[1]
-                        n1[2] = -prefactor * n1[2]
-                        n2[0] = -prefactor * n2[0]
-                        n2[1] = -prefactor * n2[1]
-                        n2[2] = -prefactor * n2[2]
-                        n3[0] = -prefactor * n3[0]
-                        n3[1] = -prefactor * n3[1]
-                        n3[2] = -prefactor * n3[2]
-
-                        if phase == 0:
-                            vertices_1[vertices_count_1:vertices_count_1 + 3] = vertex1
-                            vertices_count_1 += 3
-                            vertices_1[vertices_count_1:vertices_count_1 + 3] = n1
-                            vertices_count_1 += 3
-                            vertices_1[vertices_count_1:vertices_count_1 + 3] = vertex2
-                            vertices_count_1 += 3
-                            vertices_1[vertices_count_1:vertices_count_1 + 3] = n2
-                            vertices_count_1 += 3
-                            vertices_1[vertices_count_1:vertices_count_1 + 3] = vertex3
-                            vertices_count_1 += 3
-                            vertices_1[vertices_count_1:vertices_count_1 + 3] = n3
-                            vertices_count_1 += 3
-                        else:
-                            vertices_2[vertices_count_2:vertices_count_2 + 3] = vertex1
-                            vertices_count_2 += 3
-                            vertices_2[vertices_count_2:vertices_count_2 + 3] = n1
-                            vertices_count_2 += 3
-                            vertices_2[vertices_count_2:vertices_count_2 + 3] = vertex2
-                            vertices_count_2 += 3
-                            vertices_2[vertices_count_2:vertices_count_2 + 3] = n2
-                            vertices_count_2 += 3
-                            vertices_2[vertices_count_2:vertices_count_2 + 3] = vertex3
-                            vertices_count_2 += 3
-                            vertices_2[vertices_count_2:vertices_count_2 + 3] = n3
-                            vertices_count_2 += 3
+                            # Get normals
+                            calculate_normal_vertex(
+                                n1,
+                                n_corner_1,
+                                n_corner_2,
+                                grid,
+                                voxel_indices[c11, :],
+                                voxel_indices[c12, :],
+                                t1,
+                                inverse_voxel_size,
+                                )
+                            calculate_normal_vertex(
+                                n2,
+                                n_corner_1,
+                                n_corner_2,
+                                grid,
+                                voxel_indices[c21, :],
+                                voxel_indices[c22, :],
+                                t2,
+                                inverse_voxel_size,
+                                )
+                            calculate_normal_vertex(
+                                n3,
+                                n_corner_1,
+                                n_corner_2,
+                                grid,
+                                voxel_indices[c31, :],
+                                voxel_indices[c32, :],
+                                t3,
+                                inverse_voxel_size,
+                                )
+
+                            # Get vertices (unrolled loop)
+                            vertex1[0] = p11[0] + t1 * (p12[0] - p11[0])
+                            vertex1[1] = p11[1] + t1 * (p12[1] - p11[1])
+                            vertex1[2] = p11[2] + t1 * (p12[2] - p11[2])
+                            vertex2[0] = p21[0] + t2 * (p22[0] - p21[0])
+                            vertex2[1] = p21[1] + t2 * (p22[1] - p21[1])
+                            vertex2[2] = p21[2] + t2 * (p22[2] - p21[2])
+                            vertex3[0] = p31[0] + t3 * (p32[0] - p31[0])
+                            vertex3[1] = p31[1] + t3 * (p32[1] - p31[1])
+                            vertex3[2] = p31[2] + t3 * (p32[2] - p31[2])
+
+                            # get the normals (unrolled loop)
+                            n1[0] = -prefactor * n1[0]
+                            n1[1] = -prefactor * n1[1]
+                            n1[2] = -prefactor * n1[2]
+                            n2[0] = -prefactor * n2[0]
+                            n2[1] = -prefactor * n2[1]
+                            n2[2] = -prefactor * n2[2]
+                            n3[0] = -prefactor * n3[0]
+                            n3[1] = -prefactor * n3[1]
+                            n3[2] = -prefactor * n3[2]
+
+                            if phase == 0:
+                                vertices_1[vertices_count_1:vertices_count_1 + 3] = vertex1
+                                vertices_count_1 += 3
+                                vertices_1[vertices_count_1:vertices_count_1 + 3] = n1
+                                vertices_count_1 += 3
+                                vertices_1[vertices_count_1:vertices_count_1 + 3] = vertex2
+                                vertices_count_1 += 3
+                                vertices_1[vertices_count_1:vertices_count_1 + 3] = n2
+                                vertices_count_1 += 3
+                                vertices_1[vertices_count_1:vertices_count_1 + 3] = vertex3
+                                vertices_count_1 += 3
+                                vertices_1[vertices_count_1:vertices_count_1 + 3] = n3
+                                vertices_count_1 += 3
+                            else:
+                                vertices_2[vertices_count_2:vertices_count_2 + 3] = vertex1
+                                vertices_count_2 += 3
+                                vertices_2[vertices_count_2:vertices_count_2 + 3] = n1
+                                vertices_count_2 += 3
+                                vertices_2[vertices_count_2:vertices_count_2 + 3] = vertex2
+                                vertices_count_2 += 3
+                                vertices_2[vertices_count_2:vertices_count_2 + 3] = n2
+                                vertices_count_2 += 3
+                                vertices_2[vertices_count_2:vertices_count_2 + 3] = vertex3
+                                vertices_count_2 += 3
+                                vertices_2[vertices_count_2:vertices_count_2 + 3] = n3
+                                vertices_count_2 += 3
 
     vertices_1[-1] = <float>vertices_count_1
     vertices_2[-1] = <float>vertices_count_2
 
     return 0
 
+cdef class SlabMarcher:
+    """Extract the indexed isosurfaces at +isovalue and -isovalue of several isovalues from slabs of voxel layers.
+
+    Every vertex lies on an edge of the grid and is shared by all triangles of the slab touching this edge. The vertices
+    of the edges of the two layers of the grid enclosing the current layer of voxels are cached, so each vertex is
+    calculated and stored only once per slab. Each thread has its own caches, so the slabs can be extracted in
+    parallel, where the vertices on the planes of grid points between two slabs are stored by both of them.
+
+    The values of each voxel are read once for all isovalues, the isovalues whose surfaces do not pass through the voxel
+    are skipped. The surfaces of each isovalue are written to their own segments of the vertex and index arrays, with
+    the vertices indexed relative to the start of the segment.
+
+    Grids of single and double precision are marched without conversion. Attributes of extension types cannot be
+    fused, so the grid is kept in the view of its precision.
+    """
+
+    cdef double[:, :, :] grid
+    cdef float[:, :, :] single_grid
+    cdef bint single_precision
+    cdef double[:] sorted_isovalues
+    cdef int64_t[:] level_order
+    cdef double[:] origin
+    cdef double[:, :] voxel_size, inverse_voxel_size
+    cdef int64_t y_voxels, z_voxels, number_of_levels
+    cdef unsigned char[:, :, :] active_blocks
+    cdef float[:] vertices_1, vertices_2
+    cdef uint32_t[:] indices_1, indices_2
+    cdef int64_t[:, :] level_starts
+    cdef double[:, :] voxel_values
+    cdef float[:, :] normal, n_corner_1, n_corner_2
+    cdef int64_t[:, :, :] edges_1_2, voxel_indices
+    cdef uint32_t[:, :, :, :, :] x_edges
+    cdef uint32_t[:, :, :, :, :, :, :] layer_edges
+
+    def __init__(
+        self,
+        grid,
+        double[:] isovalues,
+        double[:] origin,
+        double[:, :] voxel_size,
+        int64_t[:] voxel_number,
+        float[:] vertices_1,
+        uint32_t[:] indices_1,
+        float[:] vertices_2,
+        uint32_t[:] indices_2,
+        int64_t[:, :] level_starts,
+        unsigned char[:, :, :] active_blocks,
+        int number_of_slabs=1,
+    ):
+        """Initialize the marcher and the caches of the threads.
+
+        :param grid: 3D numpy array containing the values of the voxels (float32 or float64)
+        :param isovalues: values of the isosurfaces
+        :param origin: origin of the voxel grids (position of the 0, 0, 0 entry)
+        :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
+        :param voxel_number: number of voxels in each direction
+        :param vertices_1: positions and normals (x, y, z, nx, ny, nz) of the vertices of the isosurfaces at +isovalue
+        :param indices_1: indices of the vertices of the triangles of the isosurfaces at +isovalue
+        :param vertices_2: positions and normals of the vertices of the isosurfaces at -isovalue
+        :param indices_2: indices of the vertices of the triangles of the isosurfaces at -isovalue
+        :param level_starts: first entry of the segment of each isovalue in vertices_1 and vertices_2
+        :param active_blocks: flags of the blocks of voxels, which may contain parts of the isosurfaces
+        :param number_of_slabs: number of slabs extracted at the same time, each by its own thread with its own caches
+        """
+        number_of_slabs = max(number_of_slabs, 1)
+        self.single_precision = np.asarray(grid).dtype == np.float32
+        if self.single_precision:
+            self.single_grid = grid
+        else:
+            self.grid = grid
+        self.level_order = np.argsort(isovalues, kind="stable")
+        self.sorted_isovalues = np.asarray(isovalues)[self.level_order]
+        self.number_of_levels = isovalues.shape[0]
+        self.origin = origin
+        self.voxel_size = voxel_size
+        self.inverse_voxel_size = np.linalg.inv(voxel_size)
+        self.y_voxels = voxel_number[1]
+        self.z_voxels = voxel_number[2]
+        self.active_blocks = active_blocks
+        self.vertices_1 = vertices_1
+        self.indices_1 = indices_1
+        self.vertices_2 = vertices_2
+        self.indices_2 = indices_2
+        self.level_starts = level_starts
+
+        self.normal = np.zeros((number_of_slabs, 3), dtype=np.float32)
+        self.n_corner_1 = np.zeros((number_of_slabs, 3), dtype=np.float32)
+        self.n_corner_2 = np.zeros((number_of_slabs, 3), dtype=np.float32)
+        self.voxel_indices = np.zeros((number_of_slabs, 8, 3), dtype=np.int64)
+        self.voxel_values = np.zeros((number_of_slabs, 8), dtype=np.float64)
+        self.edges_1_2 = np.zeros((number_of_slabs, 2, 16), dtype=np.int64)
+
+        # Index of the vertex on each edge (no_vertex if not calculated yet) for each isovalue and both phases. The
+        # edges along x are cached for the current layer of voxels, the edges along y and z for the two layers of grid
+        # points enclosing it (x parity).
+        self.x_edges = np.full(
+            (number_of_slabs, self.number_of_levels, 2, self.y_voxels, self.z_voxels),
+            no_vertex,
+            dtype=np.uint32,
+        )
+        self.layer_edges = np.full(
+            (number_of_slabs, self.number_of_levels, 2, 2, 2, self.y_voxels, self.z_voxels),
+            no_vertex,
+            dtype=np.uint32,
+        )
+
+    cdef void march_slab(self, int64_t i_start, int64_t i_end, int thread, int64_t[:, :] cursors) noexcept nogil:
+        """Extract the isosurfaces of the layers of voxels i_start to i_end - 1.
+
+        :param i_start: first layer of voxels of the slab
+        :param i_end: layer of voxels after the last one of the slab
+        :param thread: index of the thread extracting the slab
+        :param cursors: first free entry of vertices_1, indices_1, vertices_2 and indices_2 for each isovalue, which
+            are updated
+        """
+        if self.single_precision:
+            self.march_grid_slab(self.single_grid, i_start, i_end, thread, cursors)
+        else:
+            self.march_grid_slab(self.grid, i_start, i_end, thread, cursors)
+
+    @boundscheck(False)
+    @cdivision(True)
+    cdef void reset_edges(
+        self,
+        uint32_t[:, :, :, :] x_edges,
+        uint32_t[:, :, :, :, :, :] layer_edges,
+        int64_t i,
+        int64_t parity,
+        bint reset_x_edges,
+    ) noexcept nogil:
+        """Reset the cached edges of the grid points of the active blocks of the layer of voxels i.
+
+        :param x_edges: cached edges along x of a thread
+        :param layer_edges: cached edges along y and z of a thread
+        :param i: layer of voxels, whose active blocks are reset
+        :param parity: x parity of the plane of grid points, whose edges along y and z are reset
+        :param reset_x_edges: whether the edges along x are reset as well
+        """
+        cdef int64_t level, phase, l, m, block_j, block_k
+
+        for block_j in range((self.y_voxels - 1 + block_size - 1) // block_size):
+            for block_k in range((self.z_voxels - 1 + block_size - 1) // block_size):
+                if not self.active_blocks[i // block_size, block_j, block_k]:
+                    continue
+                # The voxels of the block touch the grid points up to the first ones of the next block
+                for level in range(self.number_of_levels):
+                    for phase in range(2):
+                        for l in range(block_j * block_size, min((block_j + 1) * block_size, self.y_voxels - 1) + 1):
+                            for m in range(
+                                block_k * block_size, min((block_k + 1) * block_size, self.z_voxels - 1) + 1
+                            ):
+                                if reset_x_edges:
+                                    x_edges[level, phase, l, m] = no_vertex
+                                layer_edges[level, phase, 0, parity, l, m] = no_vertex
+                                layer_edges[level, phase, 1, parity, l, m] = no_vertex
+
+    @boundscheck(False)
+    @cdivision(True)
+    cdef void march_grid_slab(
+        self,
+        floating[:, :, :] grid,
+        int64_t i_start,
+        int64_t i_end,
+        int thread,
+        int64_t[:, :] cursors,
+    ) noexcept nogil:
+        """Extract the isosurfaces of the layers of voxels i_start to i_end - 1 of a grid of the given precision.
+
+        :param grid: 3D numpy array containing the values of the voxels
+        :param i_start: first layer of voxels of the slab
+        :param i_end: layer of voxels after the last one of the slab
+        :param thread: index of the thread extracting the slab
+        :param cursors: first free entry of vertices_1, indices_1, vertices_2 and indices_2 for each isovalue, which
+            are updated
+        """
+        cdef int64_t level, phase, ei, edge, axis, vertex_index, c1, c2, x, y, z, i, block_k, p, first, last
+        cdef int j, k
+        cdef double isovalue, minimum, maximum
+        cdef double[:] voxel_values = self.voxel_values[thread]
+        cdef float[:] normal = self.normal[thread]
+        cdef float[:] n_corner_1 = self.n_corner_1[thread]
+        cdef float[:] n_corner_2 = self.n_corner_2[thread]
+        cdef int64_t[:, :] edges_1_2 = self.edges_1_2[thread]
+        cdef int64_t[:, :] voxel_indices = self.voxel_indices[thread]
+        cdef uint32_t[:, :, :, :] x_edges = self.x_edges[thread]
+        cdef uint32_t[:, :, :, :, :, :] layer_edges = self.layer_edges[thread]
+
+        # The cached edges of the grid points below the slab belong to another slab
+        layer_edges[:, :, :, :, :, :] = no_vertex
+
+        for i in range(i_start, i_end):
+            # Reset the cached edges, which do not belong to the current layer of voxels. Only the edges read by the
+            # active blocks are reset. The plane of grid points on top of the layer is read by the next layer as well,
+            # so it is also reset for the active blocks of the next layer, if they differ.
+            self.reset_edges(x_edges, layer_edges, i, (i + 1) % 2, True)
+            if i + 1 < i_end and (i + 1) // block_size != i // block_size:
+                self.reset_edges(x_edges, layer_edges, i + 1, (i + 1) % 2, False)
+
+            # Calculate the 8 indices of the current voxel
+            voxel_indices[0, 0] = i
+            voxel_indices[1, 0] = i
+            voxel_indices[2, 0] = i + 1
+            voxel_indices[3, 0] = i + 1
+            voxel_indices[4, 0] = i
+            voxel_indices[5, 0] = i
+            voxel_indices[6, 0] = i + 1
+            voxel_indices[7, 0] = i + 1
+
+            for j in range(self.y_voxels - 1):
+                # Calculate the 8 indices of the current voxel
+                voxel_indices[0, 1] = j
+                voxel_indices[1, 1] = j
+                voxel_indices[2, 1] = j
+                voxel_indices[3, 1] = j
+                voxel_indices[4, 1] = j + 1
+                voxel_indices[5, 1] = j + 1
+                voxel_indices[6, 1] = j + 1
+                voxel_indices[7, 1] = j + 1
+
+                # The blocks without isosurfaces are skipped
+                for block_k in range((self.z_voxels - 1 + block_size - 1) // block_size):
+                    if not self.active_blocks[i // block_size, j // block_size, block_k]:
+                        continue
+                    for k in range(block_k * block_size, min((block_k + 1) * block_size, self.z_voxels - 1)):
+                        # Calculate the 8 indices of the current voxel
+                        voxel_indices[0, 2] = k + 1
+                        voxel_indices[1, 2] = k
+                        voxel_indices[2, 2] = k
+                        voxel_indices[3, 2] = k + 1
+                        voxel_indices[4, 2] = k + 1
+                        voxel_indices[5, 2] = k
+                        voxel_indices[6, 2] = k
+                        voxel_indices[7, 2] = k + 1
+
+                        load_voxel(voxel_values, grid, i, j, k)
+                        minimum = voxel_values[0]
+                        maximum = voxel_values[0]
+                        for c1 in range(1, 8):
+                            minimum = min(minimum, voxel_values[c1])
+                            maximum = max(maximum, voxel_values[c1])
+
+                        active_levels(self.sorted_isovalues, minimum, maximum, &first, &last)
+                        for p in range(first, last):
+                            level = self.level_order[p]
+                            isovalue = self.sorted_isovalues[p]
+                            # The surfaces at +isovalue and -isovalue separate the points above +isovalue and below
+                            # -isovalue, respectively
+                            if not (minimum <= isovalue < maximum or minimum < -isovalue <= maximum):
+                                continue
+                            get_edges(edges_1_2, isovalue, voxel_values)
+                            for phase in range(2):
+                                for ei in range(15):
+                                    edge = edges_1_2[phase, ei]
+                                    if edge == -1:
+                                        break
+
+                                    # The first corner of each edge is the one with the lower grid index
+                                    c1 = edge_vertex_indices[edge, 0]
+                                    c2 = edge_vertex_indices[edge, 1]
+                                    axis = edge_axes[edge]
+                                    x = voxel_indices[c1, 0]
+                                    y = voxel_indices[c1, 1]
+                                    z = voxel_indices[c1, 2]
+                                    if axis == 0:
+                                        vertex_index = x_edges[level, phase, y, z]
+                                    else:
+                                        vertex_index = layer_edges[level, phase, axis - 1, x % 2, y, z]
+
+                                    if vertex_index == no_vertex:
+                                        # The vertices are indexed from the start of the segment of the isovalue
+                                        vertex_index = cursors[level, 2 * phase] - self.level_starts[level, phase]
+                                        vertex_index //= 6
+                                        if phase == 0:
+                                            calculate_edge_vertex(
+                                                self.vertices_1[cursors[level, 0]:cursors[level, 0] + 6],
+                                                normal,
+                                                n_corner_1,
+                                                n_corner_2,
+                                                grid,
+                                                isovalue,
+                                                1,
+                                                self.origin,
+                                                self.voxel_size,
+                                                self.inverse_voxel_size,
+                                                voxel_indices[c1, :],
+                                                voxel_indices[c2, :],
+                                                voxel_values[c1],
+                                                voxel_values[c2],
+                                            )
+                                        else:
+                                            calculate_edge_vertex(
+                                                self.vertices_2[cursors[level, 2]:cursors[level, 2] + 6],
+                                                normal,
+                                                n_corner_1,
+                                                n_corner_2,
+                                                grid,
+                                                -isovalue,
+                                                -1,
+                                                self.origin,
+                                                self.voxel_size,
+                                                self.inverse_voxel_size,
+                                                voxel_indices[c1, :],
+                                                voxel_indices[c2, :],
+                                                voxel_values[c1],
+                                                voxel_values[c2],
+                                            )
+                                        cursors[level, 2 * phase] += 6
+                                        if axis == 0:
+                                            x_edges[level, phase, y, z] = <uint32_t>vertex_index
+                                        else:
+                                            layer_edges[level, phase, axis - 1, x % 2, y, z] = <uint32_t>vertex_index
+
+                                    if phase == 0:
+                                        self.indices_1[cursors[level, 1]] = <uint32_t>vertex_index
+                                    else:
+                                        self.indices_2[cursors[level, 3]] = <uint32_t>vertex_index
+                                    cursors[level, 2 * phase + 1] += 1
+
+
+@boundscheck(False)
+cpdef tuple marching_cubes_indexed(
+    floating[:, :, :] grid,
+    double isovalue,
+    double[:] origin,
+    double[:, :] voxel_size,
+    int64_t[:] voxel_number,
+    float[:] vertices_1,
+    uint32_t[:] indices_1,
+    float[:] vertices_2,
+    uint32_t[:] indices_2,
+    block_ranges=None,
+):
+    """Calculate the isosurfaces at +isovalue and -isovalue for a given voxel grid as indexed triangle meshes.
+
+    Every vertex lies on an edge of the grid and is shared by all triangles touching this edge, so each vertex is
+    calculated and stored only once. The triangles are the same as the ones of marching_cubes.
+
+    The exact sizes of the vertex and index arrays are given by count_marching_cubes. At most, each grid point has three
+    edges with one vertex each, so the vertex arrays need 18 entries per grid point, and each voxel has five triangles,
+    so the index arrays need 15 entries per voxel.
+
+    :param grid: 3D numpy array containing the values of the voxels
+    :param isovalue: value of the isosurface
+    :param origin: origin of the voxel grids (position of the 0, 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
+    :param voxel_number: number of voxels in each direction
+    :param vertices_1: positions and normals (x, y, z, nx, ny, nz) of the vertices of the isosurface at +isovalue
+    :param indices_1: indices of the vertices of the triangles of the isosurface at +isovalue
+    :param vertices_2: positions and normals of the vertices of the isosurface at -isovalue
+    :param indices_2: indices of the vertices of the triangles of the isosurface at -isovalue
+    :param block_ranges: minima and maxima of the blocks of voxels (see calculate_block_ranges), the blocks whose
+        ranges do not contain the isovalues are skipped
+    :return: number of entries written to vertices_1, indices_1, vertices_2 and indices_2
+    """
+    cdef SlabMarcher marcher = SlabMarcher(
+        grid,
+        np.array([isovalue], dtype=np.float64),
+        origin,
+        voxel_size,
+        voxel_number,
+        vertices_1,
+        indices_1,
+        vertices_2,
+        indices_2,
+        np.zeros((1, 2), dtype=np.int64),
+        active_block_flags([isovalue], voxel_number, block_ranges),
+    )
+    cdef int64_t[:, :] cursors = np.zeros((1, 4), dtype=np.int64)
+
+    # The GIL is released, so the surfaces can be calculated in a background thread
+    with nogil:
+        marcher.march_slab(0, max(voxel_number[0] - 1, 0), 0, cursors)
+
+    return cursors[0, 0], cursors[0, 1], cursors[0, 2], cursors[0, 3]
+
+
+def extract_isosurfaces(
+    grid,
+    double isovalue,
+    double[:] origin,
+    double[:, :] voxel_size,
+    int64_t[:] voxel_number,
+    int number_of_threads=1,
+    block_ranges=None,
+):
+    """Calculate the isosurfaces at +isovalue and -isovalue for a given voxel grid as exactly sized indexed meshes.
+
+    See extract_isosurface_levels, which extracts the isosurfaces of several isovalues at once.
+
+    :param grid: 3D numpy array containing the values of the voxels
+    :param isovalue: value of the isosurface
+    :param origin: origin of the voxel grids (position of the 0, 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
+    :param voxel_number: number of voxels in each direction
+    :param number_of_threads: number of threads extracting the surfaces
+    :param block_ranges: minima and maxima of the blocks of voxels (see calculate_block_ranges)
+    :return: vertices (x, y, z, nx, ny, nz) and indices of the triangles of the isosurfaces at +isovalue and -isovalue
+    """
+    surfaces = extract_isosurface_levels(
+        grid,
+        np.array([isovalue], dtype=np.float64),
+        origin,
+        voxel_size,
+        voxel_number,
+        number_of_threads,
+        block_ranges,
+    )
+    return tuple((vertices, indices) for vertices, indices, _, _ in surfaces)
+
+
+@boundscheck(False)
+def extract_isosurface_levels(
+    floating[:, :, :] grid,
+    double[:] isovalues,
+    double[:] origin,
+    double[:, :] voxel_size,
+    int64_t[:] voxel_number,
+    int number_of_threads=1,
+    block_ranges=None,
+):
+    """Calculate the isosurfaces at +isovalue and -isovalue of several isovalues as exactly sized indexed meshes.
+
+    The vertices and triangles are counted first. The layers of voxels are then split into one slab per thread along
+    the first axis, with about the same number of voxels and vertices each. The slabs are extracted in parallel, each
+    of them writing its vertices and triangles directly to its own part of the result arrays, whose offsets are the
+    prefix sums of the counts of the slabs. The vertices on the planes of grid points between two slabs are stored by
+    both slabs. With the minima and maxima of the blocks of voxels, only the blocks whose ranges contain one of the
+    isovalues are visited.
+
+    Each voxel is visited once for all isovalues. The isosurfaces of each isovalue are stored in one segment of the
+    result arrays, with the vertex indices counted from the start of the vertex segment, so the segments are meshes on
+    their own.
+
+    :param grid: 3D numpy array containing the values of the voxels, of single or double precision
+    :param isovalues: values of the isosurfaces
+    :param origin: origin of the voxel grids (position of the 0, 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
+    :param voxel_number: number of voxels in each direction
+    :param number_of_threads: number of threads extracting the surfaces
+    :param block_ranges: minima and maxima of the blocks of voxels (see calculate_block_ranges)
+    :return: vertices (x, y, z, nx, ny, nz), triangle indices and the offsets of the segments of the isovalues in both
+        arrays (number of isovalues + 1 entries) of the isosurfaces at +isovalue and -isovalue
+    """
+    cdef int64_t layers = max(voxel_number[0] - 1, 0)
+    cdef int64_t levels = isovalues.shape[0]
+    cdef int number_of_slabs, s, thread
+
+    active_blocks = active_block_flags(isovalues, voxel_number, block_ranges)
+    counts = count_marching_cubes(grid, isovalues, voxel_number, number_of_threads, block_ranges)
+
+    # Balance the slabs by the number of visited voxels and vertices of their layers, all slabs contain at least one
+    # layer
+    plane_vertices = counts[:, :, :, 0]
+    active_voxels = block_size * block_size * np.sum(active_blocks, axis=(1, 2))
+    work = np.repeat(active_voxels, block_size)[:layers] + 4 * np.sum(counts[:, :, :layers, :2], axis=(0, 1, 3))
+    cumulative_work = np.cumsum(work)
+    number_of_slabs = max(min(number_of_threads, layers), 1)
+    boundaries = np.searchsorted(
+        cumulative_work,
+        cumulative_work[-1] * np.arange(1, number_of_slabs) / number_of_slabs if layers > 0 else [],
+    )
+    boundaries = np.unique(np.concatenate(([0], boundaries, [layers]))).astype(np.int64)
+    number_of_slabs = max(boundaries.shape[0] - 1, 1) if layers > 0 else 0
+
+    # Entries of each isovalue and slab in vertices_1, indices_1, vertices_2 and indices_2. Each slab stores the
+    # vertices of the grid points of its layers and the plane of grid points on top of them. The entries are ordered by
+    # isovalue first, so the segment of each isovalue is contiguous.
+    slab_entries = np.zeros((levels, number_of_slabs, 4), dtype=np.int64)
+    for s in range(number_of_slabs):
+        for phase in range(2):
+            slab_counts = counts[phase, :, boundaries[s] : boundaries[s + 1]]
+            slab_entries[:, s, 2 * phase] = 6 * (
+                np.sum(slab_counts[:, :, :2], axis=(1, 2)) + plane_vertices[phase, :, boundaries[s + 1]]
+            )
+            slab_entries[:, s, 2 * phase + 1] = np.sum(slab_counts[:, :, 2], axis=1)
+    flat_entries = slab_entries.reshape(-1, 4)
+    starts = (np.cumsum(flat_entries, axis=0) - flat_entries).reshape(slab_entries.shape)
+    offsets = np.zeros((levels + 1, 4), dtype=np.int64)
+    offsets[1:] = np.cumsum(np.sum(slab_entries, axis=1), axis=0)
+    cdef int64_t[:, :, :] cursors = np.ascontiguousarray(starts.transpose(1, 0, 2), dtype=np.int64)
+    cdef int64_t[:] slab_boundaries = boundaries
+
+    vertices_1 = np.empty(offsets[-1, 0], dtype=np.float32)
+    indices_1 = np.empty(offsets[-1, 1], dtype=np.uint32)
+    vertices_2 = np.empty(offsets[-1, 2], dtype=np.float32)
+    indices_2 = np.empty(offsets[-1, 3], dtype=np.uint32)
+    surfaces = (
+        (vertices_1, indices_1, offsets[:, 0].copy(), offsets[:, 1].copy()),
+        (vertices_2, indices_2, offsets[:, 2].copy(), offsets[:, 3].copy()),
+    )
+    if number_of_slabs == 0:
+        return surfaces
+
+    cdef SlabMarcher marcher = SlabMarcher(
+        grid,
+        isovalues,
+        origin,
+        voxel_size,
+        voxel_number,
+        vertices_1,
+        indices_1,
+        vertices_2,
+        indices_2,
+        np.ascontiguousarray(offsets[:-1, ::2]),
+        active_blocks,
+        number_of_slabs,
+    )
+
+    # The GIL is released, so the surfaces can be calculated in a background thread
+    with nogil:
+        for s in prange(number_of_slabs, schedule="static", num_threads=number_of_slabs):
+            thread = threadid()
+            marcher.march_slab(slab_boundaries[s], slab_boundaries[s + 1], thread, cursors[s])
+
+    return surfaces
+
+
+@boundscheck(False)
+@cdivision(True)
+cpdef count_marching_cubes(
+    floating[:, :, :] grid,
+    double[:] isovalues,
+    int64_t[:] voxel_number,
+    int number_of_threads=1,
+    block_ranges=None,
+):
+    """Count the vertices and triangle indices of the isosurfaces at +isovalue and -isovalue for each layer of voxels.
+
+    The counts allow to allocate exactly sized arrays for marching_cubes_indexed. A vertex lies on each edge of the grid
+    whose grid points lie on different sides of the isosurface. The vertices on the edges along y and z of a plane of
+    grid points and the vertices on the edges along x starting in this plane are counted for the plane. The values of
+    each grid point and voxel are read once for all isovalues.
+
+    :param grid: 3D numpy array containing the values of the voxels
+    :param isovalues: values of the isosurfaces
+    :param voxel_number: number of voxels in each direction
+    :param number_of_threads: number of threads counting the planes
+    :param block_ranges: minima and maxima of the blocks of voxels (see calculate_block_ranges), the blocks whose
+        ranges do not contain the isovalues are skipped
+    :return: array of shape (2, number of isovalues, number of planes along x, 3) containing for each isosurface and
+        each plane of grid points the number of vertices on the edges along y and z, the number of vertices on the
+        edges along x and the number of triangle indices of the layer of voxels starting at the plane
+    """
+    cdef int64_t x_voxels, y_voxels, z_voxels, block_i, block_j, block_k, blocks_i, blocks_j, blocks_k, last_k
+    cdef int64_t level, corner, p, first, last, levels = isovalues.shape[0]
+    cdef int i, j, k, thread
+    cdef int threads = max(number_of_threads, 1)
+    cdef bint above, below, has_voxel
+    cdef double value, value_x, value_y, value_z, isovalue, minimum, maximum
+    cdef unsigned char[:, :, :] active_blocks
+    cdef double[:, :] corner_values = np.zeros((threads, 8), dtype=np.float64)
+    cdef int64_t[:] level_order = np.argsort(isovalues, kind="stable")
+    cdef double[:] sorted_isovalues = np.asarray(isovalues)[level_order]
+
+    x_voxels = voxel_number[0]
+    y_voxels = voxel_number[1]
+    z_voxels = voxel_number[2]
+
+    counts = np.zeros((2, levels, x_voxels, 3), dtype=np.int64)
+    cdef int64_t[:, :, :, :] counts_view = counts
+    # Without voxels, there are no triangles and no vertices
+    if x_voxels < 2 or y_voxels < 2 or z_voxels < 2:
+        return counts
+
+    active_blocks = active_block_flags(isovalues, voxel_number, block_ranges)
+    blocks_i = active_blocks.shape[0]
+    blocks_j = active_blocks.shape[1]
+    blocks_k = active_blocks.shape[2]
+
+    # The planes are counted independently of each other. The edges starting at a grid point lie in the block of
+    # voxels starting at the grid point, the grid points of the last plane belong to the last block.
+    with nogil:
+        for i in prange(x_voxels, schedule="static", num_threads=threads):
+            thread = threadid()
+            block_i = min(i // block_size, blocks_i - 1)
+            for j in range(y_voxels):
+                block_j = min(j // block_size, blocks_j - 1)
+                for block_k in range(blocks_k):
+                    if not active_blocks[block_i, block_j, block_k]:
+                        continue
+                    last_k = z_voxels if block_k == blocks_k - 1 else (block_k + 1) * block_size
+                    for k in range(block_k * block_size, last_k):
+                        value = grid[i, j, k]
+                        # The neighbours outside of the grid get the value of the grid point, so they add no vertices
+                        value_x = grid[i + 1, j, k] if i + 1 < x_voxels else value
+                        value_y = grid[i, j + 1, k] if j + 1 < y_voxels else value
+                        value_z = grid[i, j, k + 1] if k + 1 < z_voxels else value
+                        has_voxel = i + 1 < x_voxels and j + 1 < y_voxels and k + 1 < z_voxels
+                        minimum = min(value, value_x, value_y, value_z)
+                        maximum = max(value, value_x, value_y, value_z)
+                        if has_voxel:
+                            load_voxel(corner_values[thread], grid, i, j, k)
+                            for corner in range(8):
+                                minimum = min(minimum, corner_values[thread, corner])
+                                maximum = max(maximum, corner_values[thread, corner])
+                        # Only the isovalues between the values of the edges and the voxel are counted
+                        active_levels(sorted_isovalues, minimum, maximum, &first, &last)
+                        for p in range(first, last):
+                            level = level_order[p]
+                            isovalue = sorted_isovalues[p]
+                            above = value > isovalue
+                            below = value < -isovalue
+                            counts_view[0, level, i, 0] += (
+                                (above != (value_y > isovalue)) + (above != (value_z > isovalue))
+                            )
+                            counts_view[1, level, i, 0] += (
+                                (below != (value_y < -isovalue)) + (below != (value_z < -isovalue))
+                            )
+                            counts_view[0, level, i, 1] += above != (value_x > isovalue)
+                            counts_view[1, level, i, 1] += below != (value_x < -isovalue)
+                            if not has_voxel:
+                                continue
+                            if minimum <= isovalue < maximum:
+                                counts_view[0, level, i, 2] += triangle_table_lengths[
+                                    voxel_case(corner_values[thread], isovalue, 1.0)
+                                ]
+                            if minimum < -isovalue <= maximum:
+                                counts_view[1, level, i, 2] += triangle_table_lengths[
+                                    voxel_case(corner_values[thread], isovalue, -1.0)
+                                ]
+
+    return counts
+
+
+@boundscheck(False)
+@cdivision(True)
+cpdef tuple calculate_block_ranges(floating[:, :, :] grid):
+    """Calculate the minima and maxima of the values of the blocks of voxels of a grid.
+
+    Each block contains block_size x block_size x block_size voxels, the blocks at the end of the axes may be smaller.
+    Neighbouring blocks share the grid points on their common faces.
+
+    :param grid: 3D numpy array containing the values of the voxels
+    :return: minima and maxima of the blocks (number of blocks along x, y and z)
+    """
+    cdef int64_t[3] blocks
+    cdef int64_t axis, block_i, block_j, block_k, i, j, k
+    cdef double value, minimum, maximum
+
+    for axis in range(3):
+        blocks[axis] = max((grid.shape[axis] - 2) // block_size + 1, 1)
+    minima = np.zeros((blocks[0], blocks[1], blocks[2]), dtype=np.float64)
+    maxima = np.zeros((blocks[0], blocks[1], blocks[2]), dtype=np.float64)
+    if grid.shape[0] == 0 or grid.shape[1] == 0 or grid.shape[2] == 0:
+        return minima, maxima
+    cdef double[:, :, :] minima_view = minima
+    cdef double[:, :, :] maxima_view = maxima
+
+    # The GIL is released, so the ranges can be calculated in a background thread
+    with nogil:
+        for block_i in range(blocks[0]):
+            for block_j in range(blocks[1]):
+                for block_k in range(blocks[2]):
+                    minimum = grid[block_i * block_size, block_j * block_size, block_k * block_size]
+                    maximum = minimum
+                    for i in range(block_i * block_size, min((block_i + 1) * block_size + 1, grid.shape[0])):
+                        for j in range(block_j * block_size, min((block_j + 1) * block_size + 1, grid.shape[1])):
+                            for k in range(block_k * block_size, min((block_k + 1) * block_size + 1, grid.shape[2])):
+                                value = grid[i, j, k]
+                                if value < minimum:
+                                    minimum = value
+                                elif value > maximum:
+                                    maximum = value
+                    minima_view[block_i, block_j, block_k] = minimum
+                    maxima_view[block_i, block_j, block_k] = maximum
+
+    return minima, maxima
+
+
+def active_block_flags(isovalues, int64_t[:] voxel_number, block_ranges):
+    """Flag the blocks of voxels whose ranges of values contain +isovalue or -isovalue of one of the isovalues.
+
+    Only these blocks contain parts of the isosurfaces, without block ranges all blocks are flagged.
+
+    :param isovalues: values of the isosurfaces
+    :param voxel_number: number of voxels in each direction
+    :param block_ranges: minima and maxima of the blocks of voxels or None
+    :return: flags of the blocks (number of blocks along x, y and z)
+    """
+    shape = tuple(max((voxel_number[axis] - 2) // block_size + 1, 1) for axis in range(3))
+    if block_ranges is None:
+        return np.ones(shape, dtype=np.uint8)
+    minima, maxima = block_ranges
+    if np.shape(minima) != shape or np.shape(maxima) != shape:
+        msg = "The block ranges do not match the voxel grid"
+        raise ValueError(msg)
+    flags = np.zeros(shape, dtype=bool)
+    # The surfaces at +isovalue and -isovalue separate the points above +isovalue and below -isovalue, respectively
+    for isovalue in np.asarray(isovalues, dtype=np.float64):
+        flags |= ((maxima > isovalue) & (minima <= isovalue)) | ((minima < -isovalue) & (maxima >= -isovalue))
+    return np.ascontiguousarray(flags, dtype=np.uint8)
+
+
+@boundscheck(False)
+cdef inline int64_t lower_bound(double[:] values, double value) noexcept nogil:
+    """Find the first of the sorted values, which is not smaller than value.
+
+    :param values: sorted values
+    :param value: value to be searched
+    :return: index of the first value not smaller than value (number of values if there is none)
+    """
+    cdef int64_t first = 0
+    cdef int64_t last = values.shape[0]
+    cdef int64_t middle
+    while first < last:
+        middle = (first + last) // 2
+        if values[middle] < value:
+            first = middle + 1
+        else:
+            last = middle
+    return first
+
+
+@boundscheck(False)
+cdef inline void active_levels(
+    double[:] sorted_isovalues,
+    double minimum,
+    double maximum,
+    int64_t* first,
+    int64_t* last,
+) noexcept nogil:
+    """Find the range of the sorted isovalues whose isosurfaces may pass between the values minimum and maximum.
+
+    The isosurface at +isovalue passes if minimum <= isovalue < maximum and the isosurface at -isovalue passes if
+    -maximum <= isovalue < -minimum. The range covers both intervals of isovalues, so some isovalues between them may
+    not be active.
+
+    :param sorted_isovalues: values of the isosurfaces in ascending order
+    :param minimum: smallest value of the grid points
+    :param maximum: largest value of the grid points
+    :param first: first index of the range to be returned
+    :param last: index after the last one of the range to be returned
+    """
+    cdef int64_t first_1 = lower_bound(sorted_isovalues, minimum)
+    cdef int64_t last_1 = lower_bound(sorted_isovalues, maximum)
+    cdef int64_t first_2 = lower_bound(sorted_isovalues, -maximum)
+    cdef int64_t last_2 = lower_bound(sorted_isovalues, -minimum)
+    if first_1 == last_1:
+        first[0] = first_2
+        last[0] = last_2
+    elif first_2 == last_2:
+        first[0] = first_1
+        last[0] = last_1
+    else:
+        first[0] = min(first_1, first_2)
+        last[0] = max(last_1, last_2)
+
+
+@boundscheck(False)
+cdef inline void load_voxel(
+    double[:] voxel_values,
+    floating[:, :, :] grid,
+    int64_t i,
+    int64_t j,
+    int64_t k,
+) noexcept nogil:
+    """Load the values of the 8 corners of a voxel, with the same corner order as in marching_cubes.
+
+    :param voxel_values: values of the corners to be returned
+    :param grid: 3D numpy array containing the values of the voxels
+    :param i: first index of the voxel
+    :param j: second index of the voxel
+    :param k: third index of the voxel
+    """
+    voxel_values[0] = grid[i, j, k + 1]
+    voxel_values[1] = grid[i, j, k]
+    voxel_values[2] = grid[i + 1, j, k]
+    voxel_values[3] = grid[i + 1, j, k + 1]
+    voxel_values[4] = grid[i, j + 1, k + 1]
+    voxel_values[5] = grid[i, j + 1, k]
+    voxel_values[6] = grid[i + 1, j + 1, k]
+    voxel_values[7] = grid[i + 1, j + 1, k + 1]
+
+
+@boundscheck(False)
+cdef inline int64_t voxel_case(double[:] voxel_values, double isovalue, double sign) noexcept nogil:
+    """Calculate the MC case of a voxel from the values of its corners.
+
+    :param voxel_values: values of the corners of the voxel, with the same corner order as in marching_cubes
+    :param isovalue: value of the isosurface
+    :param sign: 1 for the isosurface at +isovalue and -1 for the isosurface at -isovalue
+    :return: index of the case in the triangle table
+    """
+    cdef int64_t case = 0
+    cdef int corner
+    for corner in range(8):
+        if sign * voxel_values[corner] > isovalue:
+            case |= 1 << corner
+    return case
+
+
+@boundscheck(False)
+cdef inline void lattice_position(
+    float[:] position,
+    double[:] origin,
+    double[:, :] voxel_size,
+    int64_t[:] index,
+) noexcept nogil:
+    """Calculate the position of a grid point.
+
+    :param position: position of the grid point to be returned
+    :param origin: origin of the voxel grid
+    :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
+    :param index: index of the grid point
+    """
+    cdef int d
+
+    for d in range(3):
+        position[d] = origin[d] + index[0] * voxel_size[0, d] + index[1] * voxel_size[1, d] + index[2] * voxel_size[2, d]
+
+
+@boundscheck(False)
+@cdivision(True)
+cdef void calculate_edge_vertex(
+    float[:] vertex,
+    float[:] n,
+    float[:] n1,
+    float[:] n2,
+    floating[:, :, :] grid,
+    double isovalue,
+    int64_t prefactor,
+    double[:] origin,
+    double[:, :] voxel_size,
+    double[:, :] inverse_voxel_size,
+    int64_t[:] corner_index_a,
+    int64_t[:] corner_index_b,
+    float value_a,
+    float value_b,
+) noexcept nogil:
+    """Calculate the position and normal of the vertex of an isosurface on the edge between two grid points.
+
+    :param vertex: position and normal (x, y, z, nx, ny, nz) of the vertex to be returned
+    :param n: normal of the vertex already initialized for speed up
+    :param n1: normal of the first corner already initialized for speed up
+    :param n2: normal of the second corner already initialized for speed up
+    :param grid: 3D numpy array containing the values of the voxels
+    :param isovalue: value of the isosurface
+    :param prefactor: 1 for the isosurface at +isovalue and -1 for the isosurface at -isovalue
+    :param origin: origin of the voxel grid
+    :param voxel_size: vectors spanning a voxel (3x3), which may be non-orthogonal
+    :param inverse_voxel_size: inverse of voxel_size, which transforms gradients along the axes of the grid to
+        cartesian gradients
+    :param corner_index_a: index of the first grid point
+    :param corner_index_b: index of the second grid point
+    :param value_a: value at the first grid point
+    :param value_b: value at the second grid point
+    """
+    cdef float t, p1, p2
+    cdef int d
+
+    t = calculate_interpolation_value(isovalue, value_a, value_b)
+    calculate_normal_vertex(n, n1, n2, grid, corner_index_a, corner_index_b, t, inverse_voxel_size)
+    for d in range(3):
+        p1 = (
+            origin[d]
+            + corner_index_a[0] * voxel_size[0, d]
+            + corner_index_a[1] * voxel_size[1, d]
+            + corner_index_a[2] * voxel_size[2, d]
+        )
+        p2 = (
+            origin[d]
+            + corner_index_b[0] * voxel_size[0, d]
+            + corner_index_b[1] * voxel_size[1, d]
+            + corner_index_b[2] * voxel_size[2, d]
+        )
+        vertex[d] = p1 + t * (p2 - p1)
+        vertex[3 + d] = -prefactor * n[d]
+
 @exceptval(check=False)
 @boundscheck(False)
 @cdivision(True)
@@ -254,7 +1126,7 @@ cpdef inline double calculate_interpolation_value(
     double iso,
     float v1,
     float v2,
-):
+) noexcept nogil:
     """Calculate the interpolation factor between two corner points.
 
     :param iso: isovalue
@@ -264,20 +1136,28 @@ cpdef inline double calculate_interpolation_value(
     return (iso - v1) / (v2 - v1)
 
 
+@boundscheck(False)
+@cdivision(True)
 cpdef inline void calculate_normal_corner(
     float[:] n,
-    double[:, :, :]grid,
+    floating[:, :, :] grid,
     int64_t[:] corner_index,
-):
+    double[:, :] inverse_voxel_size,
+) noexcept nogil:
     """Calculate the normal of a corner of a voxel.
 
+    The differences of the grid values along the axes of the grid are transformed to a cartesian gradient, so the
+    normals are also correct for non-orthogonal voxels or voxels of different lengths along the axes.
+
     :param n: normal of the corner to be returned
     :param grid: 3D numpy array containing the values of the voxels
     :param corner_index: index of the corner
+    :param inverse_voxel_size: inverse of the vectors spanning a voxel, which transforms gradients along the axes of
+        the grid to cartesian gradients
     :return: normal of the corner
     """
     cdef int64_t x, y, z, max_x, max_y, max_z, x_minus, x_plus, y_minus, y_plus, z_minus, z_plus
-    cdef float dx, dy, dz, norm_of_result
+    cdef float dx, dy, dz, gx, gy, gz, norm_of_result
 
 
     x = corner_index[0]
@@ -295,21 +1175,27 @@ cpdef inline void calculate_normal_corner(
     dx = grid[x_plus, y, z] - grid[x_minus, y, z]
     dy = grid[x, y_plus, z] - grid[x, y_minus, z]
     dz = grid[x, y, z_plus] - grid[x, y, z_minus]
-    norm_of_result = sqrt(dx * dx + dy * dy + dz * dz)
-    n[0] = dx / norm_of_result
-    n[1] = dy / norm_of_result
-    n[2] = dz / norm_of_result
+    gx = inverse_voxel_size[0, 0] * dx + inverse_voxel_size[0, 1] * dy + inverse_voxel_size[0, 2] * dz
+    gy = inverse_voxel_size[1, 0] * dx + inverse_voxel_size[1, 1] * dy + inverse_voxel_size[1, 2] * dz
+    gz = inverse_voxel_size[2, 0] * dx + inverse_voxel_size[2, 1] * dy + inverse_voxel_size[2, 2] * dz
+    norm_of_result = sqrt(gx * gx + gy * gy + gz * gz)
+    n[0] = gx / norm_of_result
+    n[1] = gy / norm_of_result
+    n[2] = gz / norm_of_result
 
 
+@boundscheck(False)
+@cdivision(True)
 cpdef void calculate_normal_vertex(
     float[:] n,
     float[:] n1,
     float[:] n2,
-    double[:, :, :] grid,
+    floating[:, :, :] grid,
     int64_t[:] corner_index_a,
     int64_t[:] corner_index_b,
     double t1,
-):
+    double[:, :] inverse_voxel_size,
+) noexcept nogil:
     """Calculate the normal of a vertex. And means it to smooth shade.
 
     :param n: normal of the vertex to be returned
@@ -319,12 +1205,13 @@ cpdef void calculate_normal_vertex(
     :param corner_index_a: index of the first corner
     :param corner_index_b: index of the second corner
     :param t1: interpolation factor
+    :param inverse_voxel_size: inverse of the vectors spanning a voxel
     :return: normal of the vertex
     """
     cdef float norm_of_n
 
-    calculate_normal_corner(n1, grid, corner_index_a)
-    calculate_normal_corner(n2, grid, corner_index_b)
+    calculate_normal_corner(n1, grid, corner_index_a, inverse_voxel_size)
+    calculate_normal_corner(n2, grid, corner_index_b, inverse_voxel_size)
     n[0] = n1[0] + t1 * (n2[0] - n1[0])
     n[1] = n1[1] + t1 * (n2[1] - n1[1])
     n[2] = n1[2] + t1 * (n2[2] - n1[2])
@@ -334,11 +1221,12 @@ cpdef void calculate_normal_vertex(
     n[2] /= norm_of_n
 
 
+@boundscheck(False)
 cpdef void get_edges(
     int64_t[:, :] edges_result,
     double isovalue,
     double[:] voxel_values,
-):
+) noexcept nogil:
     """Get the edges for the voxels if the lie above the surface.
 
     :param edges_result: edges of the isosurface to be returned
@@ -417,6 +1305,9 @@ cdef int64_t[:, :]  edge_vertex_indices = np.array(
     ], dtype=np.int64
 )
 
+# Axis of the grid along which each edge of the cube runs
+cdef int64_t[:] edge_axes = np.array([2, 0, 2, 0, 2, 0, 2, 0, 1, 1, 1, 1], dtype=np.int64)
+
 # For each MC case, a list of triangles, specified as triples of edge indices, terminated by -1
 cdef int64_t[:, :] triangle_table = np.array([
     [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
@@ -676,3 +1567,6 @@ cdef int64_t[:, :] triangle_table = np.array([
     [0, 3, 8, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
     [-1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
 ], dtype=np.int64)
+
+# Number of triangle indices (three per triangle) of each MC case
+cdef int64_t[:] triangle_table_lengths = np.argmax(np.asarray(triangle_table) == -1, axis=1).astype(np.int64)
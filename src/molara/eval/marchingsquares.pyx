@@ -123,6 +123,310 @@ cpdef void marching_squares(double[:, :] grid,
     lines_1[-1, -1] = <float>(vertex_count_1)
     lines_2[-1, -1] = <float>(vertex_count_2)
 
+@boundscheck(False)
+@cdivision(True)
+cpdef tuple marching_squares_levels(double[:, :] grid,
+                                    double[:] iso_values,
+                                    double[:] origin,
+                                    double[:, :] voxel_size,
+                                    int64_t[:] voxel_number,
+                                    ):
+    """Perform the marching squares algorithm on a 2D grid for several isovalues at once.
+
+    The corners of each square are read once for all isovalues, the isovalues whose lines do not pass through the
+    square are skipped. The lines are counted first, so they are written to exactly sized arrays, in which the lines
+    of each isovalue form one segment.
+
+    :param grid: 2D array representing the grid
+    :param iso_values: The isoline values
+    :param origin: origin of the grid (position of the 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel
+    :param voxel_number: number of voxels in each direction
+    :return: lines (start and end point) and the offsets of the segments of the isovalues (number of isovalues + 1
+        entries) of the isolines at +iso_value and -iso_value
+    """
+    lines_1, lines_2, _, _, offsets = march_squares_levels(grid, iso_values, origin, voxel_size, voxel_number)
+    return (lines_1, offsets[:, 0].copy()), (lines_2, offsets[:, 1].copy())
+
+
+cpdef tuple marching_squares_polylines(double[:, :] grid,
+                                       double[:] iso_values,
+                                       double[:] origin,
+                                       double[:, :] voxel_size,
+                                       int64_t[:] voxel_number,
+                                       ):
+    """Perform the marching squares algorithm for several isovalues and join the lines to polylines.
+
+    The lines of marching squares meet at the edges of the grid, where the lines of two neighboring squares share an
+    end point. Looking up the lines at both end points by the ids of their edges, the lines of each isovalue are
+    joined into open polylines, which start and end at the border of the grid, and closed polylines.
+
+    :param grid: 2D array representing the grid
+    :param iso_values: The isoline values
+    :param origin: origin of the grid (position of the 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel
+    :param voxel_number: number of voxels in each direction
+    :return: points of the polylines, offsets of the polylines in the points (number of polylines + 1 entries), flags
+        of the closed polylines, whose last point connects to the first one, and offsets of the isovalues in the
+        polylines (number of isovalues + 1 entries) of the isolines at +iso_value and -iso_value
+    """
+    cdef int64_t number_of_edges = 2 * voxel_number[0] * voxel_number[1]
+    lines_1, lines_2, edge_ids_1, edge_ids_2, offsets = march_squares_levels(
+        grid,
+        iso_values,
+        origin,
+        voxel_size,
+        voxel_number,
+    )
+    # Lines at both end points of each edge, which are reset after each isovalue
+    edge_lines = np.full((number_of_edges, 2), -1, dtype=np.int64)
+    return (
+        stitch_lines(lines_1, edge_ids_1, offsets[:, 0].copy(), edge_lines),
+        stitch_lines(lines_2, edge_ids_2, offsets[:, 1].copy(), edge_lines),
+    )
+
+
+def march_squares_levels(double[:, :] grid,
+                         double[:] iso_values,
+                         double[:] origin,
+                         double[:, :] voxel_size,
+                         int64_t[:] voxel_number,
+                         ):
+    """Count and store the lines of several isovalues in exactly sized arrays.
+
+    :param grid: 2D array representing the grid
+    :param iso_values: The isoline values
+    :param origin: origin of the grid (position of the 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel
+    :param voxel_number: number of voxels in each direction
+    :return: lines and edge ids of their end points of the isolines at +iso_value and -iso_value and the offsets of
+        the isovalues in both (number of isovalues + 1 entries)
+    """
+    cdef int64_t levels = iso_values.shape[0]
+    cdef int64_t[:, :] cursors = np.zeros((levels, 2), dtype=np.int64)
+
+    lines_1 = np.zeros((0, 2, 3), dtype=np.float32)
+    lines_2 = np.zeros((0, 2, 3), dtype=np.float32)
+    edge_ids_1 = np.zeros((0, 2), dtype=np.int64)
+    edge_ids_2 = np.zeros((0, 2), dtype=np.int64)
+    march_squares(
+        grid, iso_values, origin, voxel_size, voxel_number, lines_1, lines_2, edge_ids_1, edge_ids_2, cursors, False,
+    )
+
+    offsets = np.zeros((levels + 1, 2), dtype=np.int64)
+    offsets[1:] = np.cumsum(cursors, axis=0)
+    cursors = offsets[:-1].copy()
+    lines_1 = np.zeros((offsets[-1, 0], 2, 3), dtype=np.float32)
+    lines_2 = np.zeros((offsets[-1, 1], 2, 3), dtype=np.float32)
+    edge_ids_1 = np.zeros((offsets[-1, 0], 2), dtype=np.int64)
+    edge_ids_2 = np.zeros((offsets[-1, 1], 2), dtype=np.int64)
+    march_squares(
+        grid, iso_values, origin, voxel_size, voxel_number, lines_1, lines_2, edge_ids_1, edge_ids_2, cursors, True,
+    )
+    return lines_1, lines_2, edge_ids_1, edge_ids_2, offsets
+
+
+@boundscheck(False)
+cdef tuple stitch_lines(float[:, :, :] lines, int64_t[:, :] edge_ids, int64_t[:] offsets, int64_t[:, :] edge_lines):
+    """Join the lines of each isovalue to polylines.
+
+    The end points of the lines are referred to as 2 * line + end, so the other end point of a line is entry ^ 1.
+
+    :param lines: lines (start and end point) of the isolines
+    :param edge_ids: ids of the edges of the end points of the lines
+    :param offsets: offsets of the isovalues in the lines
+    :param edge_lines: end points of the lines on each edge, all -1
+    :return: points, offsets of the polylines in the points, flags of the closed polylines and offsets of the isovalues
+        in the polylines
+    """
+    cdef int64_t number_of_lines = lines.shape[0]
+    cdef int64_t level, line, end, edge, first, entry, neighbor, step, d
+    cdef int64_t number_of_polylines = 0, number_of_points = 0
+    cdef bint closed
+    cdef unsigned char[:] visited = np.zeros(number_of_lines, dtype=np.uint8)
+    # Each line adds its first point and each open polyline the last point of its last line
+    points_array = np.zeros((2 * number_of_lines, 3), dtype=np.float32)
+    polyline_offsets_array = np.zeros(number_of_lines + 1, dtype=np.int64)
+    closed_array = np.zeros(number_of_lines, dtype=np.uint8)
+    level_offsets_array = np.zeros(offsets.shape[0], dtype=np.int64)
+    cdef float[:, :] points = points_array
+    cdef int64_t[:] polyline_offsets = polyline_offsets_array
+    cdef unsigned char[:] closed_flags = closed_array
+    cdef int64_t[:] level_offsets = level_offsets_array
+
+    for level in range(offsets.shape[0] - 1):
+        level_offsets[level] = number_of_polylines
+        for line in range(offsets[level], offsets[level + 1]):
+            for end in range(2):
+                edge = edge_ids[line, end]
+                if edge_lines[edge, 0] == -1:
+                    edge_lines[edge, 0] = 2 * line + end
+                else:
+                    edge_lines[edge, 1] = 2 * line + end
+
+        for first in range(offsets[level], offsets[level + 1]):
+            if visited[first]:
+                continue
+            # Walk backwards to the first end point of the polyline, unless the walk returns to the first line
+            entry = 2 * first
+            closed = False
+            for step in range(offsets[level + 1] - offsets[level]):
+                neighbor = other_end(edge_lines, edge_ids, entry)
+                if neighbor == -1:
+                    break
+                if neighbor // 2 == first:
+                    closed = True
+                    entry = 2 * first
+                    break
+                entry = neighbor ^ 1
+
+            # Walk forwards and store the first point of each line and the last point of an open polyline
+            polyline_offsets[number_of_polylines] = number_of_points
+            while True:
+                line = entry // 2
+                visited[line] = True
+                for d in range(3):
+                    points[number_of_points, d] = lines[line, entry & 1, d]
+                number_of_points += 1
+                neighbor = other_end(edge_lines, edge_ids, entry ^ 1)
+                if neighbor == -1 or visited[neighbor // 2]:
+                    if not closed:
+                        for d in range(3):
+                            points[number_of_points, d] = lines[line, (entry ^ 1) & 1, d]
+                        number_of_points += 1
+                    break
+                entry = neighbor
+            closed_flags[number_of_polylines] = closed
+            number_of_polylines += 1
+
+        for line in range(offsets[level], offsets[level + 1]):
+            for end in range(2):
+                edge_lines[edge_ids[line, end], 0] = -1
+                edge_lines[edge_ids[line, end], 1] = -1
+    level_offsets[offsets.shape[0] - 1] = number_of_polylines
+    polyline_offsets[number_of_polylines] = number_of_points
+
+    return (
+        points_array[:number_of_points],
+        polyline_offsets_array[: number_of_polylines + 1],
+        closed_array[:number_of_polylines].astype(np.bool_),
+        level_offsets_array,
+    )
+
+
+@boundscheck(False)
+cdef inline int64_t other_end(int64_t[:, :] edge_lines, int64_t[:, :] edge_ids, int64_t entry) noexcept:
+    """Return the end point of the other line on the edge of an end point or -1, if there is none.
+
+    :param edge_lines: end points of the lines on each edge
+    :param edge_ids: ids of the edges of the end points of the lines
+    :param entry: end point (2 * line + end)
+    :return: end point of the other line
+    """
+    cdef int64_t edge = edge_ids[entry // 2, entry & 1]
+    if edge_lines[edge, 0] == entry:
+        return edge_lines[edge, 1]
+    return edge_lines[edge, 0]
+
+
+@boundscheck(False)
+@cdivision(True)
+cdef void march_squares(double[:, :] grid,
+                        double[:] iso_values,
+                        double[:] origin,
+                        double[:, :] voxel_size,
+                        int64_t[:] voxel_number,
+                        float[:, :, :] lines_1,
+                        float[:, :, :] lines_2,
+                        int64_t[:, :] edge_ids_1,
+                        int64_t[:, :] edge_ids_2,
+                        int64_t[:, :] cursors,
+                        bint store,
+                        ):
+    """Count or store the isolines of several isovalues.
+
+    Together with the lines, the edges of the grid their end points lie on are stored. The edge between the grid points
+    (i, j) and (i + 1, j) has the id 2 * (i * voxel_number[1] + j), the edge between (i, j) and (i, j + 1) the id
+    2 * (i * voxel_number[1] + j) + 1.
+
+    :param grid: 2D array representing the grid
+    :param iso_values: The isoline values
+    :param origin: origin of the grid (position of the 0, 0 entry)
+    :param voxel_size: vectors spanning a voxel
+    :param voxel_number: number of voxels in each direction
+    :param lines_1: lines of the isolines at +iso_value to be returned
+    :param lines_2: lines of the isolines at -iso_value to be returned
+    :param edge_ids_1: ids of the edges of the end points of lines_1 to be returned
+    :param edge_ids_2: ids of the edges of the end points of lines_2 to be returned
+    :param cursors: next line of each isovalue in lines_1 and lines_2, which are updated
+    :param store: whether the lines are stored or only counted
+    """
+    cdef int64_t i, j, level, phase, ei, corner, edge, c1, c2, d
+    cdef double iso_value, minimum, maximum, t
+    cdef double[:] corners = np.zeros(4, dtype=np.float64)
+    cdef int64_t[:, :] voxel_indices = np.zeros((4, 2), dtype=np.int64)
+    cdef int64_t[:, :] edges_1_2 = np.zeros((2, 4), dtype=np.int64)
+    cdef float[:, :, :] lines
+    cdef int64_t[:, :] edge_ids
+
+    for i in range(voxel_number[0] - 1):
+        voxel_indices[0, 0] = i
+        voxel_indices[1, 0] = i + 1
+        voxel_indices[2, 0] = i + 1
+        voxel_indices[3, 0] = i
+        for j in range(voxel_number[1] - 1):
+            voxel_indices[0, 1] = j
+            voxel_indices[1, 1] = j
+            voxel_indices[2, 1] = j + 1
+            voxel_indices[3, 1] = j + 1
+            # The 4 corners of the voxel
+            corners[0] = grid[i, j]
+            corners[1] = grid[i + 1, j]
+            corners[2] = grid[i + 1, j + 1]
+            corners[3] = grid[i, j + 1]
+            minimum = min(corners[0], corners[1], corners[2], corners[3])
+            maximum = max(corners[0], corners[1], corners[2], corners[3])
+
+            for level in range(iso_values.shape[0]):
+                iso_value = iso_values[level]
+                # The lines at +iso_value and -iso_value separate the corners above +iso_value and below -iso_value
+                if not (minimum <= iso_value < maximum or minimum < -iso_value <= maximum):
+                    continue
+                get_edges(edges_1_2, iso_value, corners)
+                for phase in range(2):
+                    lines = lines_1 if phase == 0 else lines_2
+                    edge_ids = edge_ids_1 if phase == 0 else edge_ids_2
+                    for ei in range(2):
+                        if edges_1_2[phase, ei * 2] == -1:
+                            break
+                        if store:
+                            for corner in range(2):
+                                edge = edges_1_2[phase, ei * 2 + corner]
+                                c1 = edge_vertex_indices[edge, 0]
+                                c2 = edge_vertex_indices[edge, 1]
+                                t = calculate_interpolation_value(
+                                    iso_value if phase == 0 else -iso_value,
+                                    corners[c1],
+                                    corners[c2],
+                                )
+                                for d in range(3):
+                                    lines[cursors[level, phase], corner, d] = (
+                                        origin[d]
+                                        + (voxel_indices[c1, 0] + t * (voxel_indices[c2, 0] - voxel_indices[c1, 0]))
+                                        * voxel_size[0, d]
+                                        + (voxel_indices[c1, 1] + t * (voxel_indices[c2, 1] - voxel_indices[c1, 1]))
+                                        * voxel_size[1, d]
+                                    )
+                                edge_ids[cursors[level, phase], corner] = (
+                                    2 * (
+                                        min(voxel_indices[c1, 0], voxel_indices[c2, 0]) * voxel_number[1]
+                                        + min(voxel_indices[c1, 1], voxel_indices[c2, 1])
+                                    )
+                                    + (voxel_indices[c1, 0] == voxel_indices[c2, 0])
+                                )
+                        cursors[level, phase] += 1
+
+
 @exceptval(check=False)
 @boundscheck(False)
 @cdivision(True)
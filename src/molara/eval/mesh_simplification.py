@@ -0,0 +1,92 @@
+"""Simplification of isosurface meshes by vertex clustering on the voxel lattice, giving coarser levels of detail."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from numpy.typing import NDArray
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+def cluster_vertices(
+    vertices: NDArray,
+    indices: NDArray,
+    origin: NDArray,
+    voxel_size: NDArray,
+    clustering_factor: int,
+) -> tuple[NDArray, NDArray]:
+    """Simplify an indexed triangle mesh by merging all vertices within the same cell of a coarsened voxel lattice.
+
+    The cells are clustering_factor x clustering_factor x clustering_factor voxels of the grid the mesh was extracted
+    from. The vertices of a cell are replaced by one vertex at their mean position, whose normal is the normalized sum
+    of their normals. The triangles with two or three corners in the same cell collapse and are removed.
+
+    :param vertices: positions and normals (x, y, z, nx, ny, nz) of the vertices of the mesh
+    :param indices: indices of the vertices of the triangles
+    :param origin: origin of the voxel grid
+    :param voxel_size: 2D array (3x3) defining the size of the voxels in each direction
+    :param clustering_factor: number of voxels along each axis merged into one cell
+    :return: vertices and indices of the simplified mesh
+    """
+    if clustering_factor < 1:
+        msg = "The clustering factor must be a positive integer"
+        raise ValueError(msg)
+    rows = np.asarray(vertices, dtype=np.float32).reshape(-1, 6)
+    if rows.shape[0] == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.uint32)
+
+    # Fractional lattice coordinates of the vertices, the voxel sizes are the rows of voxel_size
+    fractional = np.linalg.solve(
+        np.asarray(voxel_size, dtype=np.float64).T,
+        (rows[:, :3] - np.asarray(origin, dtype=np.float64)).T,
+    ).T
+    cells = np.floor(fractional / clustering_factor).astype(np.int64)
+    cells -= np.min(cells, axis=0)
+    extent = np.max(cells, axis=0) + 1
+    keys = (cells[:, 0] * extent[1] + cells[:, 1]) * extent[2] + cells[:, 2]
+    _, clusters = np.unique(keys, return_inverse=True)
+    number_of_clusters = int(np.max(clusters)) + 1
+
+    counts = np.bincount(clusters, minlength=number_of_clusters)
+    cluster_rows = np.zeros((number_of_clusters, 6), dtype=np.float64)
+    for column in range(6):
+        cluster_rows[:, column] = np.bincount(clusters, weights=rows[:, column], minlength=number_of_clusters)
+    cluster_rows[:, :3] /= counts[:, np.newaxis]
+    lengths = np.linalg.norm(cluster_rows[:, 3:], axis=1)
+    cluster_rows[lengths > 0.0, 3:] /= lengths[lengths > 0.0, np.newaxis]
+
+    triangles = clusters[np.asarray(indices, dtype=np.int64).reshape(-1, 3)]
+    collapsed = (
+        (triangles[:, 0] == triangles[:, 1])
+        | (triangles[:, 1] == triangles[:, 2])
+        | (triangles[:, 0] == triangles[:, 2])
+    )
+    return (
+        cluster_rows.astype(np.float32).reshape(-1),
+        triangles[~collapsed].astype(np.uint32).reshape(-1),
+    )
+
+
+def calculate_levels_of_detail(
+    vertices: NDArray,
+    indices: NDArray,
+    origin: NDArray,
+    voxel_size: NDArray,
+    clustering_factors: Sequence[int] = (2, 4),
+) -> list[tuple[NDArray, NDArray]]:
+    """Calculate coarser levels of detail of an isosurface mesh by clustering its vertices on the voxel lattice.
+
+    :param vertices: positions and normals (x, y, z, nx, ny, nz) of the vertices of the mesh
+    :param indices: indices of the vertices of the triangles
+    :param origin: origin of the voxel grid the mesh was extracted from
+    :param voxel_size: 2D array (3x3) defining the size of the voxels in each direction
+    :param clustering_factors: numbers of voxels along each axis merged into one vertex for each level of detail
+    :return: vertices and indices of the levels of detail, ordered from fine to coarse
+    """
+    return [cluster_vertices(vertices, indices, origin, voxel_size, factor) for factor in clustering_factors]
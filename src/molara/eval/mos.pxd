@@ -7,7 +7,8 @@ cpdef double calculate_mo_cartesian(
         double[:,:],
         double[:,:],
         int64_t[:],
+        int64_t[:],
         double[:],
         double[:],
         double[:],
-) nogil
+) noexcept nogil
@@ -21,36 +21,51 @@ cpdef double calculate_mo_cartesian(
         double[:,:] orbital_exponents,
         double[:,:] orbital_norms,
         int64_t[:] shells,
+        int64_t[:] shell_offsets,
         double[:] mo_coefficients,
         double[:] aos_values,
         double[:] cut_off_distances,
-) nogil:
+) noexcept nogil:
+    """Calculate the value of a molecular orbital from the shells of a packed basis set.
+
+    The positions (bohr), coefficients, exponents and norms are stored once per shell (see PackedBasisSet).
+
+    :param electron_position: position of the electron (bohr)
+    :param orbital_position: positions of the shells
+    :param orbital_coefficients: contraction coefficients of the first basis function of each shell
+    :param orbital_exponents: exponents of the primitives of each shell
+    :param orbital_norms: norms of the primitives of the first basis function of each shell
+    :param shells: angular momenta of the shells
+    :param shell_offsets: index of the first basis function of each shell
+    :param mo_coefficients: coefficients of the molecular orbital
+    :param aos_values: buffer for the values of the atomic orbitals
+    :param cut_off_distances: cutoff distances of the shells
+    :return: value of the molecular orbital
+    """
 
     cdef double mo_value = 0.0, distance_sq
-    cdef int i, shell_index, shell_start, shell_end, shell
+    cdef int i, shell_index, shell_start, shell_end, shell, number_of_shells
 
     number_of_shells = shells.shape[0]
-    shell_start = 0
-    shell_end = 0
     aos_values[:] = 0.0
     for shell_index in range(number_of_shells):
         shell = shells[shell_index]
-        distance_sq = ((electron_position[0] - orbital_position[shell_start, 0]) ** 2 +
-                        (electron_position[1] - orbital_position[shell_start, 1]) ** 2 +
-                        (electron_position[2] - orbital_position[shell_start, 2]) ** 2)
+        shell_start = shell_offsets[shell_index]
+        distance_sq = ((electron_position[0] - orbital_position[shell_index, 0]) ** 2 +
+                        (electron_position[1] - orbital_position[shell_index, 1]) ** 2 +
+                        (electron_position[2] - orbital_position[shell_index, 2]) ** 2)
         shell_end = shell_start + number_of_basis_functions[shell]
         if distance_sq < cut_off_distances[shell_index] ** 2:
             _ = calculate_aos(
                 electron_position,
-                orbital_position[shell_start, :],
-                orbital_exponents[shell_start, :],
-                orbital_coefficients[shell_start, :],
-                orbital_norms[shell_start, :],
+                orbital_position[shell_index, :],
+                orbital_exponents[shell_index, :],
+                orbital_coefficients[shell_index, :],
+                orbital_norms[shell_index, :],
                 shell,
                 aos_values[shell_start:shell_end],
             )
             for i in range(shell_start, shell_end):
                 mo_value += mo_coefficients[i] * aos_values[i]
-        shell_start = shell_end
 
     return mo_value
@@ -0,0 +1,198 @@
+"""Calculates the overlap integrals of cartesian gaussian basis functions shell pair by shell pair."""
+
+import numpy as np
+from cython import boundscheck, cdivision, wraparound
+from libc.math cimport exp, log, pi, sqrt
+from libc.stdint cimport int64_t
+
+from molara.structure.basisset import generate_ijks, pack_basis_set
+
+__copyright__ = "Copyright 2024, Molara"
+
+# Exponents of x, y and z of the cartesian basis functions of the shells, in the same order as the basis functions.
+# The functions of a shell with angular momentum l start at angular_offsets[l].
+cdef int64_t[:] angular_offsets = np.array([0, 1, 4, 10, 20, 35], dtype=np.int64)
+cdef int64_t[:, :] angular_exponents = np.array(
+    [ijk for shell in "spdfg" for ijk in generate_ijks(shell)],
+    dtype=np.int64,
+)
+
+# Only the primitives of the first function of a shell are stored, the norms of the other functions of the shell
+# differ by sqrt((2l - 1)!! / ((2i - 1)!! (2j - 1)!! (2k - 1)!!)), as in calculate_aos
+cdef double[:] angular_factors = np.array(
+    [
+        sqrt(
+            np.prod(np.arange(2 * sum(ijk) - 1, 0, -2, dtype=np.float64))
+            / np.prod([np.prod(np.arange(2 * e - 1, 0, -2, dtype=np.float64)) for e in ijk])
+        )
+        for shell in "spdfg"
+        for ijk in generate_ijks(shell)
+    ],
+    dtype=np.float64,
+)
+
+
+@boundscheck(False)
+@wraparound(False)
+cpdef calculate_overlap_matrix(basis_functions, double screening_threshold=1.0e-14):
+    """Calculate the overlap matrix of the cartesian basis functions.
+
+    The integrals are calculated for whole shell pairs at once. For each pair of primitives, the one dimensional
+    overlaps of all powers of x, y and z are tabulated with the Obara-Saika recurrences, from which the integrals of
+    all pairs of functions of the two shells are assembled. Pairs of primitives, whose Gaussian product prefactor
+    exp(-a b / (a + b) |A - B|^2) is below the screening threshold, are skipped, and so are shell pairs, if this holds
+    for their most diffuse primitives.
+
+    :param basis_functions: packed basis set or list of all basis functions of the molecule
+    :param screening_threshold: threshold for the Gaussian product prefactor of the skipped pairs of primitives
+    :return: overlap matrix (number of basis functions x number of basis functions)
+    """
+    basis_set = pack_basis_set(basis_functions)
+    cdef int number_of_functions = len(basis_set)
+    overlap = np.zeros((number_of_functions, number_of_functions), dtype=np.float64)
+    if number_of_functions == 0:
+        return overlap
+
+    cdef int64_t[:] shell_types = basis_set.shell_types
+    cdef int64_t[:] shell_offsets = basis_set.shell_offsets
+    cdef int64_t[:] shell_primitives = basis_set.shell_primitives
+    cdef double[:, :] shell_positions = basis_set.shell_positions
+    cdef double[:, :] shell_exponents = basis_set.shell_exponents
+    # The contraction coefficients and the norms only occur as products
+    cdef double[:, :] shell_prefactors = basis_set.shell_coefficients * basis_set.shell_norms
+    cdef double[:] min_exponents = np.array(
+        [
+            np.min(basis_set.shell_exponents[shell, : basis_set.shell_primitives[shell]], initial=np.inf)
+            for shell in range(basis_set.number_of_shells)
+        ],
+        dtype=np.float64,
+    )
+    cdef double[:, ::1] overlap_view = overlap
+    cdef double[:, ::1] block = np.zeros((15, 15), dtype=np.float64)
+    cdef double max_exponent = -log(screening_threshold)
+    cdef int shell_a, shell_b, la, lb, fa, fb, first_a, first_b, c
+    cdef double distance_sq, a, b
+
+    with nogil:
+        for shell_a in range(shell_types.shape[0]):
+            for shell_b in range(shell_a + 1):
+                distance_sq = 0.0
+                for c in range(3):
+                    distance_sq = distance_sq + (shell_positions[shell_a, c] - shell_positions[shell_b, c]) ** 2
+                a = min_exponents[shell_a]
+                b = min_exponents[shell_b]
+                if a * b / (a + b) * distance_sq > max_exponent:
+                    continue
+
+                la = shell_types[shell_a]
+                lb = shell_types[shell_b]
+                shell_pair_overlap(
+                    shell_positions[shell_a],
+                    shell_exponents[shell_a],
+                    shell_prefactors[shell_a],
+                    shell_primitives[shell_a],
+                    la,
+                    shell_positions[shell_b],
+                    shell_exponents[shell_b],
+                    shell_prefactors[shell_b],
+                    shell_primitives[shell_b],
+                    lb,
+                    max_exponent,
+                    block,
+                )
+                first_a = shell_offsets[shell_a]
+                first_b = shell_offsets[shell_b]
+                for fa in range((la + 1) * (la + 2) // 2):
+                    for fb in range((lb + 1) * (lb + 2) // 2):
+                        overlap_view[first_a + fa, first_b + fb] = block[fa, fb]
+                        overlap_view[first_b + fb, first_a + fa] = block[fa, fb]
+    return overlap
+
+
+@boundscheck(False)
+@wraparound(False)
+@cdivision(True)
+cdef void shell_pair_overlap(
+        double[:] position_a,
+        double[:] exponents_a,
+        double[:] prefactors_a,
+        int64_t primitives_a,
+        int la,
+        double[:] position_b,
+        double[:] exponents_b,
+        double[:] prefactors_b,
+        int64_t primitives_b,
+        int lb,
+        double max_exponent,
+        double[:, ::1] block,
+) noexcept nogil:
+    """Calculate the overlap integrals of all pairs of functions of two shells.
+
+    The one dimensional overlaps S(i, 0) are built up to i = la + lb with the vertical recurrence
+    S(i + 1, 0) = PA S(i, 0) + i / (2p) S(i - 1, 0) and transferred to the second center with the horizontal
+    recurrence S(i, j + 1) = S(i + 1, j) + AB S(i, j), starting from S(0, 0) = 1.
+
+    :param position_a: position of the first shell (bohr)
+    :param exponents_a: exponents of the primitives of the first shell
+    :param prefactors_a: contraction coefficients times norms of the first function of the first shell
+    :param primitives_a: number of primitives of the first shell
+    :param la: angular momentum of the first shell
+    :param position_b: position of the second shell (bohr)
+    :param exponents_b: exponents of the primitives of the second shell
+    :param prefactors_b: contraction coefficients times norms of the first function of the second shell
+    :param primitives_b: number of primitives of the second shell
+    :param lb: angular momentum of the second shell
+    :param max_exponent: pairs of primitives with a larger exponent of the Gaussian product prefactor are skipped
+    :param block: overlap integrals of the functions of the first (rows) and the second shell (columns)
+    """
+    cdef double table[3][9][5]
+    cdef double ab[3]
+    cdef double pa[3]
+    cdef double distance_sq = 0.0, a, b, p, mu, prefactor
+    cdef int pa_index, pb_index, c, i, j, fa, fb
+    cdef int functions_a = (la + 1) * (la + 2) // 2
+    cdef int functions_b = (lb + 1) * (lb + 2) // 2
+    cdef int offset_a = angular_offsets[la]
+    cdef int offset_b = angular_offsets[lb]
+
+    for c in range(3):
+        ab[c] = position_a[c] - position_b[c]
+        distance_sq += ab[c] * ab[c]
+    for fa in range(functions_a):
+        for fb in range(functions_b):
+            block[fa, fb] = 0.0
+
+    for pa_index in range(primitives_a):
+        a = exponents_a[pa_index]
+        for pb_index in range(primitives_b):
+            b = exponents_b[pb_index]
+            p = a + b
+            mu = a * b / p
+            if mu * distance_sq > max_exponent:
+                continue
+            prefactor = prefactors_a[pa_index] * prefactors_b[pb_index] * exp(-mu * distance_sq) * (pi / p) ** 1.5
+
+            for c in range(3):
+                # P - A = -b / p (A - B)
+                pa[c] = -b / p * ab[c]
+                table[c][0][0] = 1.0
+                if la + lb > 0:
+                    table[c][1][0] = pa[c]
+                for i in range(1, la + lb):
+                    table[c][i + 1][0] = pa[c] * table[c][i][0] + i / (2.0 * p) * table[c][i - 1][0]
+                for j in range(lb):
+                    for i in range(la + lb - j):
+                        table[c][i][j + 1] = table[c][i + 1][j] + ab[c] * table[c][i][j]
+
+            for fa in range(functions_a):
+                for fb in range(functions_b):
+                    block[fa, fb] += (
+                        prefactor
+                        * table[0][angular_exponents[offset_a + fa, 0]][angular_exponents[offset_b + fb, 0]]
+                        * table[1][angular_exponents[offset_a + fa, 1]][angular_exponents[offset_b + fb, 1]]
+                        * table[2][angular_exponents[offset_a + fa, 2]][angular_exponents[offset_b + fb, 2]]
+                    )
+
+    for fa in range(functions_a):
+        for fb in range(functions_b):
+            block[fa, fb] *= angular_factors[offset_a + fa] * angular_factors[offset_b + fb]
@@ -6,8 +6,7 @@ from typing import TYPE_CHECKING
 
 import numpy as np
 
-from molara.structure.basisset import contracted_overlap
-from molara.util.constants import ANGSTROM_TO_BOHR
+from molara.eval.overlap import calculate_overlap_matrix
 
 if TYPE_CHECKING:
     from numpy.typing import NDArray
@@ -26,25 +25,16 @@ class PopulationAnalysis:
         self.mo_type = molecule.mos.basis_type
         self.molecule = molecule
         self.basis_functions_labels = molecule.mos.basis_functions
-        self.basis_functions = []
-        self.basis_functions_positions = []
+        self.basis_set = molecule.get_packed_basis_set()
         self.mo_coefficients = molecule.mos.coefficients
 
-        # get the basis functions and positions
-        for atom in molecule.atoms:
-            for orbital in atom.basis_set.basis_functions.values():
-                self.basis_functions.append(orbital)
-                self.basis_functions_positions.append(atom.position * ANGSTROM_TO_BOHR)
-
         # Get the occupations and number of electrons
         self.number_of_electrons = sum(molecule.mos.occupations)
         self.occ_vector = np.array(molecule.mos.occupations)
         self.occ_matrix = np.diag(self.occ_vector)
 
         # calculate the overlap matrix for cartesian basis functions
-        self.overlap_matrix_ao = np.zeros(
-            (len(self.basis_functions), len(self.basis_functions)),
-        )
+        self.overlap_matrix_ao = np.zeros((len(self.basis_set), len(self.basis_set)))
         self.calculate_ao_overlap_cartesian()
 
         # initialize the overlap matrix for spherical basis functions
@@ -61,11 +51,7 @@ class PopulationAnalysis:
             self.population_matrix = self.d_matrix * self.overlap_matrix_ao
         else:
             self.mo_coefficients_spherical = molecule.mos.coefficients_spherical
-            self.transformation_matrix = self.molecule.mos.transformation_matrix_spherical_cartesian
-            self.overlap_matrix_ao_spherical = np.dot(
-                self.transformation_matrix,
-                np.dot(self.overlap_matrix_ao, self.transformation_matrix.T),
-            )
+            self.overlap_matrix_ao_spherical = molecule.mos.project_to_spherical(self.overlap_matrix_ao)
             self.d_matrix = np.dot(
                 self.mo_coefficients_spherical[:, :],
                 np.dot(self.occ_matrix, self.mo_coefficients_spherical[:, :].T),
@@ -74,15 +60,107 @@ class PopulationAnalysis:
 
         self.calculated_number_of_electrons = np.sum(self.population_matrix)
 
+        # Index of the atom of each basis function in the basis of the population matrix. The functions of an atom are
+        # consecutive, so the blocks of the atoms start at the atom offsets.
+        self.number_of_atoms = len(molecule.atoms)
+        cartesian_function_atoms = np.repeat(
+            np.arange(self.number_of_atoms),
+            [len(atom.basis_set.basis_functions) for atom in molecule.atoms],
+        )
+        if self.mo_type == "Cartesian":
+            self.function_atoms = cartesian_function_atoms
+        else:
+            # Each spherical function is a combination of the cartesian functions of one shell
+            mos = molecule.mos
+            self.function_atoms = np.repeat(
+                cartesian_function_atoms[mos.shell_cartesian_offsets[:-1]],
+                np.diff(mos.shell_spherical_offsets),
+            )
+        self.atom_offsets = np.searchsorted(self.function_atoms, np.arange(self.number_of_atoms))
+
     def calculate_ao_overlap_cartesian(self) -> None:
         """Calculate the overlap matrix using cartesian basis functions."""
-        for i, basis_function_i in enumerate(self.basis_functions):
-            for j in range(i, len(self.basis_functions)):
-                basis_function_j = self.basis_functions[j]
-                self.overlap_matrix_ao[i, j] = contracted_overlap(
-                    basis_function_j,
-                    basis_function_i,
-                    self.basis_functions_positions[j],
-                    self.basis_functions_positions[i],
-                )
-                self.overlap_matrix_ao[j, i] = self.overlap_matrix_ao[i, j]
+        self.overlap_matrix_ao = calculate_overlap_matrix(self.basis_set)
+
+    def sum_over_atoms(self, values: NDArray, axis: int = 0) -> NDArray:
+        """Sum the entries of the basis functions of each atom along an axis.
+
+        :param values: array with one entry per basis function along the axis
+        :param axis: axis of the basis functions
+        :return: array with one entry per atom along the axis, which is zero for atoms without basis functions
+        """
+        has_functions = np.bincount(self.function_atoms, minlength=self.number_of_atoms) > 0
+        shape = list(values.shape)
+        shape[axis] = self.number_of_atoms
+        sums = np.zeros(shape, dtype=np.float64)
+        index: list[slice | NDArray] = [slice(None)] * values.ndim
+        index[axis] = has_functions
+        sums[tuple(index)] = np.add.reduceat(values, self.atom_offsets[has_functions], axis=axis)
+        return sums
+
+    def calculate_mulliken_charges(self) -> NDArray:
+        """Calculate the Mulliken charges of the atoms.
+
+        The gross population of an atom is the sum of the rows of its basis functions of the population matrix. The
+        charges refer to the atomic numbers, so they do not account for electrons replaced by effective core
+        potentials.
+
+        :return: charge of each atom
+        """
+        return self.molecule.atomic_numbers - self.sum_over_atoms(np.sum(self.population_matrix, axis=1))
+
+    def calculate_lowdin_charges(self) -> NDArray:
+        """Calculate the Loewdin charges of the atoms.
+
+        The populations are the diagonal of S^1/2 D S^1/2, which is the density matrix in the symmetrically
+        orthogonalized basis.
+
+        :return: charge of each atom
+        """
+        overlap_sqrt = self.calculate_overlap_sqrt()
+        populations = np.einsum("ij,jk,ki->i", overlap_sqrt, self.d_matrix, overlap_sqrt)
+        return self.molecule.atomic_numbers - self.sum_over_atoms(populations)
+
+    def calculate_mayer_bond_orders(self) -> NDArray:
+        """Calculate the Mayer bond orders of all pairs of atoms.
+
+        The bond order of the atoms A and B is 2 sum_sigma sum_mu in A sum_nu in B (P^sigma S)_mu,nu (P^sigma S)_nu,mu
+        with the alpha and beta density matrices P^sigma, which reduces to the sum of (DS)_mu,nu (DS)_nu,mu for
+        restricted orbitals.
+
+        :return: bond orders (number of atoms x number of atoms), the diagonal is zero
+        """
+        overlap = self.overlap_matrix_ao if self.mo_type == "Cartesian" else self.overlap_matrix_ao_spherical
+        products = np.zeros_like(overlap)
+        for spin_density_matrix in self.calculate_spin_density_matrices():
+            density_overlap = np.dot(spin_density_matrix, overlap)
+            products += 2 * density_overlap * density_overlap.T
+        bond_orders = self.sum_over_atoms(self.sum_over_atoms(products, axis=0), axis=1)
+        np.fill_diagonal(bond_orders, 0.0)
+        return bond_orders
+
+    def calculate_spin_density_matrices(self) -> tuple[NDArray, NDArray]:
+        """Calculate the alpha and beta density matrices in the basis of the population matrix.
+
+        For restricted orbitals, both are half of the density matrix.
+
+        :return: alpha and beta density matrices
+        """
+        spins = np.array(self.molecule.mos.spins)
+        if -1 not in spins:
+            return self.d_matrix / 2, self.d_matrix / 2
+        coefficients = self.mo_coefficients if self.mo_type == "Cartesian" else self.mo_coefficients_spherical
+        spin_density_matrices = []
+        for spin in (1, -1):
+            occupations = np.where(spins == spin, self.occ_vector, 0.0)
+            spin_density_matrices.append(np.dot(coefficients * occupations, coefficients.T))
+        return spin_density_matrices[0], spin_density_matrices[1]
+
+    def calculate_overlap_sqrt(self) -> NDArray:
+        """Calculate the square root of the overlap matrix in the basis of the population matrix.
+
+        :return: S^1/2
+        """
+        overlap = self.overlap_matrix_ao if self.mo_type == "Cartesian" else self.overlap_matrix_ao_spherical
+        eigenvalues, eigenvectors = np.linalg.eigh(overlap)
+        return np.dot(eigenvectors * np.sqrt(np.maximum(eigenvalues, 0.0)), eigenvectors.T)
@@ -13,6 +13,8 @@ Example Usage:
 import numpy as np
 from numpy.typing import NDArray
 
+from molara.eval.marchingcubes import calculate_block_ranges
+
 
 class VoxelGrid:
     """Class for voxel grid storage and manipulation.
@@ -35,11 +37,26 @@ class VoxelGrid:
             - voxel_size as empty 1D array of length 3
             - voxel_number as empty 1D array of length 3
         """
-        self.grid = np.array([])
+        self._grid = np.array([])
         self.origin = np.array([])
         self.voxel_size = np.array([])
         self.voxel_number = np.array([])
         self.is_initialized = False
+        self._block_ranges: tuple[NDArray, NDArray] | None = None
+
+    @property
+    def grid(self) -> NDArray:
+        """Return the array containing the voxel data values."""
+        return self._grid
+
+    @grid.setter
+    def grid(self, grid: NDArray) -> None:
+        """Set the array containing the voxel data values, which invalidates the summaries of the values.
+
+        :param grid: array containing the voxel data values
+        """
+        self._grid = grid
+        self._block_ranges = None
 
     def set_grid(self, grid: NDArray, origin: NDArray, voxel_size: NDArray) -> None:
         """Set the grid, origin, and voxel size.
@@ -89,6 +106,22 @@ class VoxelGrid3D(VoxelGrid):
             raise ValueError(msg)
         super().set_grid(grid, origin, voxel_size)
 
+    def block_ranges(self) -> tuple[NDArray, NDArray]:
+        """Return the minima and maxima of the values of the blocks of 8 x 8 x 8 voxels.
+
+        The ranges are calculated on the first call and kept until another grid is set, so marching cubes can skip the
+        blocks without isosurfaces for every iso value. Changes of the values of the grid in place are not detected.
+        Grids of single precision are summarized without converting them.
+
+        :return: minima and maxima of the blocks (number of blocks along x, y and z)
+        """
+        if self._block_ranges is None:
+            grid = np.asarray(self.grid)
+            if grid.dtype != np.float32:
+                grid = grid.astype(np.float64, copy=False)
+            self._block_ranges = calculate_block_ranges(grid)
+        return self._block_ranges
+
 
 class VoxelGrid2D(VoxelGrid):
     """Class for voxel grid storage and manipulation.
@@ -2,31 +2,288 @@
 
 from __future__ import annotations
 
+import copy
+from functools import partial
 from typing import TYPE_CHECKING
 
 import numpy as np
 from pyrr.matrix33 import create_from_axis_rotation
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QButtonGroup, QHeaderView, QMainWindow, QTableWidgetItem
-
-from molara.eval.generate_voxel_grid import generate_voxel_grid
-from molara.eval.marchingsquares import marching_squares
-from molara.eval.voxel_grid import VoxelGrid2D
+from PySide6.QtCore import QEventLoop, Qt
+from PySide6.QtWidgets import QApplication, QButtonGroup, QHeaderView, QMainWindow, QTableWidgetItem
+
+from molara.eval.adaptive_grid import (
+    coarse_grid_parameters,
+    generate_voxel_grids_in_chunks,
+    refine_voxel_grids,
+)
+from molara.eval.generate_voxel_grid import calculate_mo_gradients, generate_plane_grid
+from molara.eval.marchingsquares import marching_squares_polylines
+from molara.eval.voxel_grid import VoxelGrid2D, VoxelGrid3D
 from molara.gui.layouts.ui_mos_dialog import Ui_MOs_dialog
-from molara.gui.surface_3d import Surface3DDialog
+from molara.gui.surface_3d import Surface3DDialog, add_levels_of_detail, calculate_surfaces
+from molara.util.cache import LRUCache
 from molara.util.constants import ANGSTROM_TO_BOHR
 
 if TYPE_CHECKING:
-    from numpy.typing import NDArray
+    from numpy.typing import DTypeLike, NDArray
     from PySide6.QtGui import QCloseEvent
 
+    from molara.gui.surface_3d import SurfacesWithLevelsOfDetail
+    from molara.gui.worker import Worker
     from molara.structure.atom import Atom
-    from molara.structure.basisset import BasisFunction
+    from molara.structure.basisset import PackedBasisSet
     from molara.structure.molecularorbitals import MolecularOrbitals
 
 __copyright__ = "Copyright 2024, Molara"
 
 
+def set_orbital_normals(
+    surfaces: tuple[tuple[NDArray, NDArray], tuple[NDArray, NDArray]],
+    aos: PackedBasisSet,
+    mo_coefficients: NDArray,
+    cut_off_distances: NDArray,
+    number_of_threads: int = 1,
+) -> tuple[tuple[NDArray, NDArray], tuple[NDArray, NDArray]]:
+    """Replace the normals of the isosurfaces of an orbital by the normalized analytic gradients at the vertices.
+
+    The normals interpolated from the finite differences of the grid get noisy on coarse grids, while the gradients
+    are exact, so the surfaces of coarse grids still shade smoothly. The vertices are changed in place, the vertices
+    with a vanishing gradient keep their normals.
+
+    :param surfaces: vertices (positions and normals) and indices of the surfaces at +iso_value and -iso_value
+    :param aos: packed basis set of the molecule
+    :param mo_coefficients: coefficients of the orbital
+    :param cut_off_distances: cutoff distances of the shells, which must be valid for the orbital
+    :param number_of_threads: number of threads used to calculate the gradients
+    :return: surfaces with the analytic normals
+    """
+    # The normals point from the values beyond the iso value to the other side of the surfaces
+    for (vertices, _), sign in zip(surfaces, (-1.0, 1.0), strict=True):
+        vertex_rows = vertices.reshape(-1, 6)
+        gradients = calculate_mo_gradients(
+            vertex_rows[:, :3].astype(np.float64),
+            aos,
+            mo_coefficients,
+            cut_off_distances,
+            number_of_threads,
+        )
+        lengths = np.linalg.norm(gradients, axis=1)
+        valid = lengths > 0.0
+        vertex_rows[valid, 3:] = sign * gradients[valid] / lengths[valid, np.newaxis]
+    return surfaces
+
+
+def calculate_orbital_surfaces(
+    voxel_grid: VoxelGrid3D,
+    iso_value: float,
+    number_of_threads: int = 1,
+    orbital: tuple[PackedBasisSet, NDArray, NDArray] | None = None,
+) -> tuple[tuple[NDArray, NDArray], tuple[NDArray, NDArray]]:
+    """Calculate the isosurfaces of the grid of an orbital, with analytic normals if the orbital is given.
+
+    :param voxel_grid: voxel grid of the orbital
+    :param iso_value: iso value of the surfaces
+    :param number_of_threads: number of threads used to calculate the surfaces
+    :param orbital: basis functions, coefficients of the orbital and cutoff distances of the shells, or None to keep
+        the normals of the grid
+    :return: vertices and indices of the triangles of the surfaces at +iso_value and -iso_value
+    """
+    surfaces = calculate_surfaces(voxel_grid, iso_value, number_of_threads)
+    if orbital is None:
+        return surfaces
+    return set_orbital_normals(surfaces, *orbital, number_of_threads)
+
+
+def calculate_orbital_surfaces_task(  # noqa: PLR0913
+    worker: Worker,
+    voxel_grid: VoxelGrid3D,
+    iso_value: float,
+    number_of_threads: int = 1,
+    orbital: tuple[PackedBasisSet, NDArray, NDArray] | None = None,
+    moving_index_budget: int | None = None,
+) -> SurfacesWithLevelsOfDetail:
+    """Calculate the isosurfaces of the grid of an orbital and their levels of detail in a worker.
+
+    :param worker: worker running the calculation
+    :param voxel_grid: voxel grid of the orbital
+    :param iso_value: iso value of the surfaces
+    :param number_of_threads: number of threads used to calculate the surfaces
+    :param orbital: basis functions, coefficients of the orbital and cutoff distances of the shells, or None
+    :param moving_index_budget: number of indices drawn in full while the camera moves (see add_levels_of_detail)
+    :return: vertices, indices and levels of detail of the surfaces at +iso_value and -iso_value
+    """
+    worker.report_progress(0, "Calculating the surfaces")
+    surfaces = calculate_orbital_surfaces(voxel_grid, iso_value, number_of_threads, orbital)
+    worker.report_progress(80, "Simplifying the surfaces")
+    return add_levels_of_detail(surfaces, voxel_grid, moving_index_budget)
+
+
+def calculate_orbital_grids_task(  # noqa: PLR0913
+    worker: Worker,
+    voxel_grid: VoxelGrid3D,
+    aos: PackedBasisSet,
+    mo_coefficients: NDArray,
+    cut_off_distances: NDArray,
+    selected_index: int,
+    iso_value: float,
+    coarsening_factor: int,
+    number_of_threads: int,
+    analytic_normals: bool = False,
+    dtype: DTypeLike = np.float64,
+    moving_index_budget: int | None = None,
+) -> tuple[NDArray, NDArray | None, NDArray | None, SurfacesWithLevelsOfDetail]:
+    """Calculate the grids of several orbitals and the surfaces of one of them in a worker.
+
+    With a coarsening factor larger than one, the grids are calculated on a coarse grid first, whose surfaces are
+    reported as a partial result, and are then refined around the isosurfaces. The coarse grids and the mask of the
+    refined points are returned, so the grids can be refined for other iso values later (see
+    refine_orbital_grid_task).
+
+    :param worker: worker running the calculation
+    :param voxel_grid: voxel grid defining the origin, voxel size and voxel number of the grids
+    :param aos: packed basis set of the molecule
+    :param mo_coefficients: coefficients of the orbitals, one column per orbital
+    :param cut_off_distances: cutoff distances of the shells, which must be valid for all orbitals
+    :param selected_index: index of the orbital (column) the surfaces are calculated for
+    :param iso_value: iso value of the surfaces
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :param number_of_threads: number of threads used to evaluate the grids
+    :param analytic_normals: whether the normals of the surfaces are the analytic gradients of the orbital
+    :param dtype: type of the values of the grids, float64 or float32
+    :param moving_index_budget: number of indices drawn in full while the camera moves (see add_levels_of_detail)
+    :return: grids of the orbitals, their coarse grids and the mask of the refined points (both None without
+        coarsening) and surfaces of the selected orbital with their levels of detail
+    """
+    orbital = (aos, mo_coefficients[:, selected_index], cut_off_distances) if analytic_normals else None
+    coarse_grids = None
+    refined_points = None
+    if coarsening_factor > 1:
+        worker.report_progress(0, "Calculating the coarse orbital grids")
+        coarse_voxel_size, coarse_voxel_number = coarse_grid_parameters(
+            voxel_grid.voxel_size,
+            voxel_grid.voxel_number,
+            coarsening_factor,
+        )
+        coarse_voxel_grid = VoxelGrid3D()
+        coarse_voxel_grid.origin = voxel_grid.origin
+        coarse_voxel_grid.voxel_size = coarse_voxel_size
+        coarse_voxel_grid.voxel_number = coarse_voxel_number
+        coarse_grids = generate_voxel_grids_in_chunks(
+            voxel_grid.origin,
+            coarse_voxel_size,
+            coarse_voxel_number,
+            aos,
+            mo_coefficients,
+            cut_off_distances,
+            number_of_threads,
+            dtype=dtype,
+            check_cancelled=worker.check_cancelled,
+        )
+        coarse_voxel_grid.grid = coarse_grids[selected_index]
+        coarse_surfaces = calculate_orbital_surfaces(coarse_voxel_grid, iso_value, number_of_threads, orbital)
+        worker.report_partial_result(add_levels_of_detail(coarse_surfaces, coarse_voxel_grid, moving_index_budget))
+
+        worker.report_progress(20, "Refining the orbital grids")
+        grids, refined_points = refine_voxel_grids(
+            coarse_grids,
+            voxel_grid.origin,
+            voxel_grid.voxel_size,
+            voxel_grid.voxel_number,
+            aos,
+            mo_coefficients,
+            cut_off_distances,
+            iso_value,
+            coarsening_factor,
+            number_of_threads,
+            dtype,
+            check_cancelled=worker.check_cancelled,
+        )
+    else:
+        worker.report_progress(0, "Calculating the orbital grids")
+        grids = generate_voxel_grids_in_chunks(
+            voxel_grid.origin,
+            voxel_grid.voxel_size,
+            voxel_grid.voxel_number,
+            aos,
+            mo_coefficients,
+            cut_off_distances,
+            number_of_threads,
+            dtype=dtype,
+            check_cancelled=worker.check_cancelled,
+        )
+
+    worker.report_progress(90, "Calculating the surfaces")
+    selected_voxel_grid = VoxelGrid3D()
+    selected_voxel_grid.grid = grids[selected_index]
+    selected_voxel_grid.origin = voxel_grid.origin
+    selected_voxel_grid.voxel_size = voxel_grid.voxel_size
+    selected_voxel_grid.voxel_number = voxel_grid.voxel_number
+    surfaces = calculate_orbital_surfaces(selected_voxel_grid, iso_value, number_of_threads, orbital)
+    worker.report_progress(95, "Simplifying the surfaces")
+    return grids, coarse_grids, refined_points, add_levels_of_detail(surfaces, voxel_grid, moving_index_budget)
+
+
+def refine_orbital_grid_task(  # noqa: PLR0913
+    worker: Worker,
+    voxel_grid: VoxelGrid3D,
+    coarse_grid: NDArray,
+    refined_points: NDArray,
+    aos: PackedBasisSet,
+    mo_coefficients: NDArray,
+    cut_off_distances: NDArray,
+    iso_value: float,
+    coarsening_factor: int,
+    number_of_threads: int,
+    analytic_normals: bool = False,
+    moving_index_budget: int | None = None,
+) -> tuple[NDArray, NDArray, SurfacesWithLevelsOfDetail]:
+    """Refine the grid of an orbital for another iso value and calculate its surfaces in a worker.
+
+    Only the points around the new isosurfaces, which were interpolated so far, are evaluated, so changing the iso
+    value does not recalculate the whole grid.
+
+    :param worker: worker running the calculation
+    :param voxel_grid: voxel grid of the orbital, which was refined for other iso values
+    :param coarse_grid: grid of the orbital on the coarse grid
+    :param refined_points: mask of the points of the grid which are evaluated exactly
+    :param aos: packed basis set of the molecule
+    :param mo_coefficients: coefficients of the orbital
+    :param cut_off_distances: cutoff distances of the shells, which must be valid for the orbital
+    :param iso_value: iso value of the surfaces
+    :param coarsening_factor: ratio of the voxel sizes of the coarse and the fine grid
+    :param number_of_threads: number of threads used to evaluate the grid
+    :param analytic_normals: whether the normals of the surfaces are the analytic gradients of the orbital
+    :param moving_index_budget: number of indices drawn in full while the camera moves (see add_levels_of_detail)
+    :return: refined grid, mask of the refined points and surfaces of the orbital with their levels of detail
+    """
+    worker.report_progress(0, "Refining the orbital grid")
+    grids, new_refined_points = refine_voxel_grids(
+        coarse_grid[np.newaxis],
+        voxel_grid.origin,
+        voxel_grid.voxel_size,
+        voxel_grid.voxel_number,
+        aos,
+        mo_coefficients[:, np.newaxis],
+        cut_off_distances,
+        iso_value,
+        coarsening_factor,
+        number_of_threads,
+        grids=voxel_grid.grid[np.newaxis],
+        refined_points=refined_points,
+        check_cancelled=worker.check_cancelled,
+    )
+    if new_refined_points is not refined_points:
+        # The grid of the dialog is not changed in place, it is replaced, when the calculation has finished
+        voxel_grid = copy.copy(voxel_grid)
+        voxel_grid.grid = grids[0]
+
+    worker.report_progress(90, "Calculating the surfaces")
+    orbital = (aos, mo_coefficients, cut_off_distances) if analytic_normals else None
+    surfaces = calculate_orbital_surfaces(voxel_grid, iso_value, number_of_threads, orbital)
+    worker.report_progress(95, "Simplifying the surfaces")
+    return voxel_grid.grid, new_refined_points, add_levels_of_detail(surfaces, voxel_grid, moving_index_budget)
+
+
 class MOsDialog(Surface3DDialog):
     """Dialog for displaying MOs."""
 
@@ -40,7 +297,7 @@ class MOsDialog(Surface3DDialog):
             parent,
         )
         self.mos: None | MolecularOrbitals = None
-        self.aos: None | list[BasisFunction] = None
+        self.aos: None | PackedBasisSet = None
         self.atoms: None | list[Atom] = None
 
         # Voxel grid parameters
@@ -49,6 +306,30 @@ class MOsDialog(Surface3DDialog):
         self.origin = np.zeros(3, dtype=np.float64)
         self.voxel_grid_parameters_changed = True
 
+        # Grids of the orbitals around the selected one, which are evaluated together in a single pass
+        self.number_of_neighbouring_orbitals = 5
+
+        # The calculated grids and surfaces are kept in a cache, so revisiting an orbital or an iso value does not
+        # recalculate them. The byte budget of the cache can be changed through grid_cache.byte_budget.
+        self.grid_cache = LRUCache(byte_budget=512 * 1024**2)
+        self.voxel_grid_key: tuple = ()
+
+        # In the progressive mode, the grids are evaluated on a coarse grid first, whose surfaces are shown as a
+        # preview, and only refined to the full resolution around the isosurfaces. The coarse grid and the mask of the
+        # refined points are kept with each grid, so another iso value only refines the points around its surfaces.
+        self.progressive_grid = True
+        self.coarsening_factor = 4
+        self.orbital_grids_pending = False
+        self.coarse_grid: NDArray | None = None
+        self.refined_points: NDArray | None = None
+
+        # The normals of the surfaces are the analytic gradients of the orbital at the vertices, instead of the finite
+        # differences of the grid, so coarse grids still shade smoothly
+        self.analytic_normals = True
+
+        # The grids of the orbitals may be stored in single precision, so twice as many grids fit into the cache
+        self.grid_dtype = np.float64
+
         # Display box for voxel grid parameters
         self.box_center = np.zeros(3, dtype=np.float64)
         self.minimum_box_size = np.zeros(3, dtype=np.float64)
@@ -120,8 +401,14 @@ class MOsDialog(Surface3DDialog):
         self.isoline_radius = 0.006
         self.isoline_voxel_grid = VoxelGrid2D()
         self.isoline_grid_parameters_changed = True
+        self.isoline_subdivisions = 10
+        # Points of the polylines of the isolines, with the offsets of the polylines and flags of the closed ones
         self.isolines_1: NDArray = np.array([])
         self.isolines_2: NDArray = np.array([])
+        self.isoline_offsets_1: NDArray = np.array([], dtype=np.int64)
+        self.isoline_offsets_2: NDArray = np.array([], dtype=np.int64)
+        self.isoline_closed_1: NDArray = np.array([], dtype=np.bool_)
+        self.isoline_closed_2: NDArray = np.array([], dtype=np.bool_)
         self.isoline_border_origin: NDArray = np.array([])
         self.isoline_border_size: NDArray = np.array([4, 4])
         self.isoline_border_scale = [1, 1]
@@ -178,13 +465,16 @@ class MOsDialog(Surface3DDialog):
         if self.parent().structure_widget.structures[0].mos.coefficients.size == 0:
             return
         # Set all molecule related variables
+        if self.parent().structure_widget.structures[0] is not self.molecule:
+            self.grid_cache.clear()
         self.set_molecule(self.parent().structure_widget.structures[0])
         if self.molecule is None:
             msg = "No molecule loaded"
             raise ValueError(msg)
 
         self.mos = self.molecule.mos
-        self.aos = self.molecule.basis_set
+        # Orbitals given for spherical harmonics are evaluated in their own basis
+        self.aos = self.molecule.get_packed_basis_set(spherical=self.mos.has_spherical_coefficients)
         self.atoms = self.molecule.atoms
 
         # Set the labels and buttons
@@ -475,7 +765,6 @@ class MOsDialog(Surface3DDialog):
             raise ValueError(msg)
 
         self.voxel_grid.voxel_size = np.eye(3, dtype=np.float64) * self.voxel_size_value()
-        mo_coefficients = self.mos.coefficients[:, self.selected_orbital]
 
         self.voxel_grid.origin = self.origin
         direction = self.direction
@@ -490,23 +779,246 @@ class MOsDialog(Surface3DDialog):
         )
         self.voxel_grid.voxel_size = direction * voxel_size
 
-        shells_cut_off = self.calculate_cutoffs()
+        # The grids are cached for each orbital with the parameters they were calculated with. The orbital index also
+        # distinguishes the alpha and beta orbitals. The progressive grids are cached with their coarse grids and the
+        # masks of their refined points, which are None for the grids evaluated at the full resolution.
+        orbital_grids_parameters = (
+            id(self.molecule),
+            id(self.mos),
+            id(self.aos),
+            self.voxel_grid.origin.tobytes(),
+            self.voxel_grid.voxel_size.tobytes(),
+            self.voxel_grid.voxel_number.tobytes(),
+            self.ui.cutoffSpinBox.value(),
+            self.coarsening_factor if self.progressive_grid else 1,
+            np.dtype(self.grid_dtype).str,
+        )
+        cached_grid = self.grid_cache.get((orbital_grids_parameters, self.selected_orbital))
+        if cached_grid is None:
+            self.calculate_orbital_grids(orbital_grids_parameters)
+            return
+
+        self.voxel_grid.grid, self.coarse_grid, self.refined_points = cached_grid
+        self.voxel_grid_key = (orbital_grids_parameters, self.selected_orbital)
+        self.voxel_grid_parameters_changed = False
+        self.voxel_grid_changed = True
+
+    def neighbouring_orbitals(self) -> list[int]:
+        """Return the indices of the selected orbital and its neighbours of the same spin."""
+        first_orbital = 0
+        last_orbital = self.number_of_orbitals
+        if self.display_spin == 1:
+            last_orbital = self.number_of_alpha_orbitals
+        elif self.display_spin == -1:
+            first_orbital = self.number_of_alpha_orbitals
+        first_orbital = max(first_orbital, self.selected_orbital - self.number_of_neighbouring_orbitals)
+        last_orbital = min(last_orbital, self.selected_orbital + self.number_of_neighbouring_orbitals + 1)
+        return list(range(first_orbital, max(last_orbital, self.selected_orbital + 1)))
+
+    def calculate_orbital_grids(self, orbital_grids_parameters: tuple) -> None:
+        """Start the calculation of the voxel grids of the selected orbital and its neighbours in a single pass.
 
-        self.voxel_grid.grid = np.array(
-            generate_voxel_grid(
-                self.voxel_grid.origin,
-                self.voxel_grid.voxel_size,
-                self.voxel_grid.voxel_number,
+        The grids and the surfaces of the selected orbital are calculated by a worker and displayed, when the
+        calculation has finished. In the progressive mode, the surfaces of the coarse grid are displayed before.
+
+        :param orbital_grids_parameters: parameters of the grids, which are part of the keys of the cached grids
+        """
+        if self.aos is None:
+            msg = "No basis functions loaded"
+            raise ValueError(msg)
+        if self.mos is None:
+            msg = "No molecular orbitals loaded"
+            raise ValueError(msg)
+
+        orbitals = self.neighbouring_orbitals()
+        shells_cut_off = self.calculate_cutoffs(orbitals)
+        iso_value = self.ui.isoValueSpinBox.value()
+
+        # The worker gets its own copy of the grid parameters, which may be changed during the calculation
+        voxel_grid = VoxelGrid3D()
+        voxel_grid.origin = np.array(self.voxel_grid.origin, dtype=np.float64)
+        voxel_grid.voxel_size = np.array(self.voxel_grid.voxel_size, dtype=np.float64)
+        voxel_grid.voxel_number = np.array(self.voxel_grid.voxel_number, dtype=np.int64)
+
+        self.cancel_calculation()
+        self.voxel_grid_parameters_changed = False
+        self.voxel_grid_changed = True
+        self.orbital_grids_pending = True
+        self.start_calculation(
+            calculate_orbital_grids_task,
+            (
+                voxel_grid,
                 self.aos,
-                mo_coefficients,
+                self.mos.get_coefficients(self.aos)[:, orbitals],
                 shells_cut_off,
+                orbitals.index(self.selected_orbital),
+                iso_value,
+                self.coarsening_factor if self.progressive_grid else 1,
+                self.number_of_threads,
+                self.analytic_normals,
+                self.grid_dtype,
+                self.moving_index_budget(),
             ),
+            partial(self.set_orbital_grids, orbital_grids_parameters, orbitals, self.selected_orbital, iso_value),
+            self.set_preview_surfaces,
         )
-        self.voxel_grid_parameters_changed = False
-        self.voxel_grid_changed = True
 
-    def calculate_cutoffs(self) -> NDArray:
-        """Calculate the cutoffs for the shells."""
+    def set_orbital_grids(
+        self,
+        orbital_grids_parameters: tuple,
+        orbitals: list[int],
+        selected_orbital: int,
+        iso_value: float,
+        result: tuple[NDArray, NDArray | None, NDArray | None, SurfacesWithLevelsOfDetail],
+    ) -> None:
+        """Set the orbital grids calculated by the worker and display the surfaces of the selected orbital.
+
+        :param orbital_grids_parameters: parameters of the grids
+        :param orbitals: indices of the orbitals of the grids
+        :param selected_orbital: index of the orbital the surfaces were calculated for
+        :param iso_value: iso value the surfaces were calculated for
+        :param result: grids of the orbitals, their coarse grids, mask of the refined points and surfaces of the
+            selected orbital
+        """
+        grids, coarse_grids, refined_points, surfaces = result
+        self.orbital_grids_pending = False
+        for index, orbital in enumerate(orbitals):
+            # The grids are copied, so each of them can be released on its own, when it is evicted from the cache. The
+            # mask of the refined points is shared, as it is replaced instead of changed, when a grid is refined.
+            coarse_grid = None if coarse_grids is None else coarse_grids[index].copy()
+            self.grid_cache.put((orbital_grids_parameters, orbital), (grids[index].copy(), coarse_grid, refined_points))
+        selected_index = orbitals.index(selected_orbital)
+        self.voxel_grid.grid = grids[selected_index]
+        self.coarse_grid = None if coarse_grids is None else coarse_grids[selected_index]
+        self.refined_points = refined_points
+        self.voxel_grid_key = (orbital_grids_parameters, selected_orbital)
+        self.grid_cache.put((self.voxel_grid_key, iso_value, self.analytic_normals), surfaces)
+        if iso_value == self.ui.isoValueSpinBox.value():
+            self.set_surfaces(surfaces)
+        else:
+            self.change_iso_value()
+
+    def visualize_surfaces(self) -> None:
+        """Visualize the surfaces of the current voxel grid, which are taken from the cache, if possible."""
+        surfaces_key = (self.voxel_grid_key, self.iso_value, self.analytic_normals)
+        surfaces = self.grid_cache.get(surfaces_key)
+        if surfaces is not None:
+            self.cancel_calculation()
+            self.set_surfaces(surfaces)
+            return
+
+        # The worker gets its own voxel grid, as the grid of the dialog is replaced when another orbital is selected.
+        grid_orbital = self.voxel_grid_key[1] if self.voxel_grid_key else self.selected_orbital
+        mo_coefficients = self.mos.get_coefficients(self.aos)[:, grid_orbital]
+        shells_cut_off = self.calculate_cutoffs([grid_orbital])
+        if self.coarse_grid is not None and self.refined_points is not None:
+            # The progressive grid is refined around the surfaces of the new iso value first
+            self.start_calculation(
+                refine_orbital_grid_task,
+                (
+                    copy.copy(self.voxel_grid),
+                    self.coarse_grid,
+                    self.refined_points,
+                    self.aos,
+                    mo_coefficients,
+                    shells_cut_off,
+                    self.iso_value,
+                    self.coarsening_factor,
+                    self.number_of_threads,
+                    self.analytic_normals,
+                    self.moving_index_budget(),
+                ),
+                partial(self.set_refined_grid, self.voxel_grid_key, surfaces_key),
+            )
+            return
+
+        # The copy shares the block ranges of the grid, which are thus only calculated once for all iso values.
+        self.voxel_grid.block_ranges()
+        voxel_grid = copy.copy(self.voxel_grid)
+        orbital = (self.aos, mo_coefficients, shells_cut_off) if self.analytic_normals else None
+        self.start_calculation(
+            calculate_orbital_surfaces_task,
+            (voxel_grid, self.iso_value, self.number_of_threads, orbital, self.moving_index_budget()),
+            partial(self.set_cached_surfaces, surfaces_key),
+        )
+
+    def set_refined_grid(
+        self,
+        voxel_grid_key: tuple,
+        surfaces_key: tuple,
+        result: tuple[NDArray, NDArray, SurfacesWithLevelsOfDetail],
+    ) -> None:
+        """Replace the progressive grid by the grid refined for another iso value and display its surfaces.
+
+        :param voxel_grid_key: key of the grid in the cache
+        :param surfaces_key: key of the surfaces in the cache
+        :param result: refined grid, mask of its refined points and surfaces of the grid
+        """
+        grid, refined_points, surfaces = result
+        if refined_points is not self.refined_points and voxel_grid_key == self.voxel_grid_key:
+            self.voxel_grid.grid = grid
+            self.refined_points = refined_points
+            self.grid_cache.put(voxel_grid_key, (grid, self.coarse_grid, refined_points))
+        self.set_cached_surfaces(surfaces_key, surfaces)
+
+    def set_cached_surfaces(
+        self,
+        surfaces_key: tuple,
+        surfaces: SurfacesWithLevelsOfDetail,
+    ) -> None:
+        """Add the calculated surfaces to the cache and display them.
+
+        :param surfaces_key: key of the surfaces in the cache
+        :param surfaces: vertices (positions and normals), indices and levels of detail of the surfaces at +iso_value
+            and -iso_value
+        """
+        self.grid_cache.put(surfaces_key, surfaces)
+        self.set_surfaces(surfaces)
+
+    def set_preview_surfaces(self, surfaces: SurfacesWithLevelsOfDetail) -> None:
+        """Display the surfaces of the coarse grid, while the orbital grids are refined.
+
+        :param surfaces: vertices, indices and levels of detail of the surfaces of the selected orbital on the coarse
+            grid
+        """
+        if not self.surfaces_are_visible:
+            return
+        (
+            (self.vertices_1, self.indices_1, self.levels_of_detail_1),
+            (self.vertices_2, self.indices_2, self.levels_of_detail_2),
+        ) = surfaces
+        self.draw_surfaces()
+        self.update_wire_frame_surfaces()
+        if not self.background_calculation:
+            # Only repaint, the user input is handled after the calculation has finished
+            QApplication.processEvents(QEventLoop.ProcessEventsFlag.ExcludeUserInputEvents)
+
+    def display_surfaces(self) -> None:
+        """Display the surfaces, unless the orbital grids are being calculated, which displays them when finished."""
+        if self.orbital_grids_pending:
+            return
+        super().display_surfaces()
+
+    def cancel_calculation(self) -> None:
+        """Cancel the running calculation, cancelled orbital grids are recalculated when they are needed."""
+        # The calculation of new orbital grids is only started after the running one has been cancelled
+        if self.calculation is not None and self.orbital_grids_pending:
+            self.orbital_grids_pending = False
+            self.set_recalculate_voxel_grid()
+        super().cancel_calculation()
+
+    def on_calculation_failed(self, worker: Worker, message: str) -> None:
+        """Show the error of the running calculation in the status bar."""
+        if worker is self.calculation and self.orbital_grids_pending:
+            self.orbital_grids_pending = False
+            self.set_recalculate_voxel_grid()
+        super().on_calculation_failed(worker, message)
+
+    def calculate_cutoffs(self, orbitals: list[int] | None = None) -> NDArray:
+        """Calculate the cutoffs for the shells.
+
+        :param orbitals: indices of the orbitals the cutoffs have to be valid for, defaults to the selected orbital
+        """
         if self.aos is None:
             msg = "No basis functions loaded"
             raise ValueError(msg)
@@ -520,7 +1032,7 @@ class MOsDialog(Surface3DDialog):
 
         return self.mos.calculate_cut_offs(
             self.aos,
-            self.selected_orbital,
+            self.selected_orbital if orbitals is None else orbitals,
             threshold=threshold,
             max_distance=max_distance,
             max_points_number=max_number,
@@ -529,7 +1041,11 @@ class MOsDialog(Surface3DDialog):
     def change_iso_value(self) -> None:
         """Change the iso value."""
         self.set_iso_value(self.ui.isoValueSpinBox.value())
-        if not self.voxel_grid_parameters_changed:
+        if self.voxel_grid_parameters_changed:
+            return
+        if not self.orbital_grids_pending:
+            # Pending grids are displayed with the current iso value, when they are finished. Progressive grids are
+            # only refined around the surfaces of the new iso value, instead of being recalculated.
             self.visualize_surfaces()
 
     def set_surfaces_hidden(self) -> None:
@@ -675,13 +1191,12 @@ class MOsDialog(Surface3DDialog):
 
         voxel_size = self.isoline_border_direction * self.isoline_voxel_size_value()
 
-        mo_coefficients = self.mos.coefficients[:, self.selected_orbital]
+        mo_coefficients = self.mos.get_coefficients(self.aos)[:, self.selected_orbital]
 
         voxel_number = np.array(
             [
                 int(size[0] / self.isoline_voxel_size_value()) + 1,
                 int(size[1] / self.isoline_voxel_size_value()) + 1,
-                1,
             ],
             dtype=np.int64,
         )
@@ -689,16 +1204,16 @@ class MOsDialog(Surface3DDialog):
         # Calculate the cutoffs for the shells
         shells_cut_off = self.calculate_cutoffs()
 
-        grid = np.array(
-            generate_voxel_grid(
-                origin,
-                voxel_size,
-                voxel_number,
-                self.aos,
-                mo_coefficients,
-                shells_cut_off,
-            ),
-        )[:, :, 0]
+        # The plane is sampled directly, which is fast enough to follow the transformations of the border
+        grid = generate_plane_grid(
+            origin,
+            voxel_size[:2],
+            voxel_number,
+            self.aos,
+            mo_coefficients,
+            shells_cut_off,
+            self.number_of_threads,
+        )
         self.isoline_voxel_grid.set_grid(grid, origin, voxel_size[:2])
 
     def set_isolines_hidden(self) -> None:
@@ -749,29 +1264,16 @@ class MOsDialog(Surface3DDialog):
             log_grid_min = np.log(3e-3)  # np.log(max(np.min(np.abs(grid)), 5e-3))
             iso_values = np.exp(np.linspace(log_grid_min, log_grid_max, number_of_iso_values))
 
-            total_lines_1 = np.empty((0, 2, 3))
-            total_lines_2 = np.empty((0, 2, 3))
-            for iso in iso_values:
-                lines_1 = np.zeros(((voxel_number[0] - 1) * (voxel_number[1] - 1) * 4 + 1, 3), dtype=np.float32)
-                lines_2 = np.zeros(((voxel_number[0] - 1) * (voxel_number[1] - 1) * 4 + 1, 3), dtype=np.float32)
-                _ = marching_squares(grid, iso, origin, voxel_size, voxel_number, lines_1, lines_2)
-                number_of_lines_entries_1 = int(lines_1[-1, -1])
-                number_of_lines_entries_2 = int(lines_2[-1, -1])
-
-                if number_of_lines_entries_1 != 0:
-                    lines_1 = lines_1[:number_of_lines_entries_1]
-                    total_lines_1 = np.concatenate(
-                        [total_lines_1, lines_1.reshape((number_of_lines_entries_1 // 2, 2, 3))],
-                        axis=0,
-                    )
-                if number_of_lines_entries_2 != 0:
-                    lines_2 = lines_2[:number_of_lines_entries_2]
-                    total_lines_2 = np.concatenate(
-                        [total_lines_2, lines_2.reshape((number_of_lines_entries_2 // 2, 2, 3))],
-                        axis=0,
-                    )
-            self.isolines_1 = total_lines_1
-            self.isolines_2 = total_lines_2
+            # The isolines of all isovalues are calculated in one pass over the grid and joined to polylines
+            polylines_1, polylines_2 = marching_squares_polylines(
+                grid,
+                iso_values,
+                origin,
+                voxel_size,
+                voxel_number,
+            )
+            self.isolines_1, self.isoline_offsets_1, self.isoline_closed_1, _ = polylines_1
+            self.isolines_2, self.isoline_offsets_2, self.isoline_closed_2, _ = polylines_2
             self.draw_isolines()
             self.isolines_are_visible = True
 
@@ -779,26 +1281,26 @@ class MOsDialog(Surface3DDialog):
         """Draw the isolines."""
         self.parent().structure_widget.makeCurrent()
         self.remove_isolines()
-        radii_1 = np.array([self.isoline_radius] * self.isolines_1.shape[0], dtype=np.float32)
-        colors_1 = np.array(list(self.color_surface_1 / 255) * self.isolines_1.shape[0], dtype=np.float32)
-        radii_2 = np.array([self.isoline_radius] * self.isolines_2.shape[0], dtype=np.float32)
-        colors_2 = np.array(list(self.color_surface_2 / 255) * self.isolines_2.shape[0], dtype=np.float32)
-        if self.isolines_1.size != 0:
-            self.parent().structure_widget.renderer.draw_cylinders_from_to(
-                "Isolines_1",
-                self.isolines_1,
-                radii_1,
-                colors_1,
-                10,
-            )
-        if self.isolines_2.size != 0:
-            self.parent().structure_widget.renderer.draw_cylinders_from_to(
-                "Isolines_2",
-                self.isolines_2,
-                radii_2,
-                colors_2,
-                10,
-            )
+        voxel_size = self.isoline_voxel_grid.voxel_size
+        normal = np.cross(voxel_size[0], voxel_size[1])
+        normal /= np.linalg.norm(normal)
+        isolines = [
+            (self.isolines_1, self.isoline_offsets_1, self.isoline_closed_1, self.color_surface_1),
+            (self.isolines_2, self.isoline_offsets_2, self.isoline_closed_2, self.color_surface_2),
+        ]
+        # The polylines of each phase are drawn as one tube mesh
+        for i, (points, offsets, closed, color) in enumerate(isolines):
+            if points.size != 0:
+                self.parent().structure_widget.renderer.draw_tubes(
+                    f"Isolines_{i + 1}",
+                    points,
+                    offsets,
+                    closed,
+                    self.isoline_radius,
+                    normal,
+                    np.array([color / 255], dtype=np.float32),
+                    self.isoline_subdivisions,
+                )
         self.parent().structure_widget.update()
         self.set_isolines_visible()
 
@@ -7,7 +7,7 @@ from typing import TYPE_CHECKING, Literal
 import numpy as np
 from numpy.typing import NDArray
 from OpenGL.GL import GL_DEPTH_TEST, GL_MULTISAMPLE, glClearColor, glEnable
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QGuiApplication
 from PySide6.QtOpenGLWidgets import QOpenGLWidget
 
@@ -46,6 +46,11 @@ class StructureWidget(QOpenGLWidget):
         self.box = False
         self.rotate = False
         self.translate = False
+        # Zooming has no end event, so it counts as camera movement until the timer runs out
+        self.zoom_timer = QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(250)
+        self.zoom_timer.timeout.connect(self.update)
         self.click_position: NDArray | None = None
         self.rotation_angle_x = 0.0
         self.rotation_angle_y = 0.0
@@ -206,6 +211,8 @@ class StructureWidget(QOpenGLWidget):
             self.renderer.device_pixel_ratio = self.devicePixelRatio()
             self.renderer.create_framebuffers(self.width(), self.height())
             self.renderer.create_screen_vao()
+        # Coarser levels of detail of the surfaces are drawn while the camera moves
+        self.renderer.camera_moving = self.rotate or self.translate or self.zoom_timer.isActive()
         self.renderer.draw_scene()
 
     def update_molecule_spheres_cylinders(self) -> None:
@@ -227,6 +234,7 @@ class StructureWidget(QOpenGLWidget):
         num_steps = num_degrees / 100  # Empirical value to control zoom speed
         self.camera.set_distance_from_target(num_steps)
         self.camera.update()
+        self.zoom_timer.start()
         self.update()
 
     def mousePressEvent(self, event: QMouseEvent) -> None:  # noqa: N802
@@ -313,6 +321,8 @@ class StructureWidget(QOpenGLWidget):
         self.set_normalized_position(event)
         self.camera.update(save=True)
         self.click_position = None
+        # Redraw the full surfaces
+        self.update()
 
     def stop_rotation(self, event: QMouseEvent) -> None:
         """Stop the rotation of the structure.
@@ -324,6 +334,8 @@ class StructureWidget(QOpenGLWidget):
         self.set_normalized_position(event)
         self.camera.update(save=True)
         self.click_position = None
+        # Redraw the full surfaces
+        self.update()
 
     def toggle_axes(self) -> None:
         """Draws the cartesian axes."""
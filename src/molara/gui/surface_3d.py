@@ -2,22 +2,108 @@
 
 from __future__ import annotations
 
+import os
 from abc import abstractmethod
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
+from PySide6.QtCore import QCoreApplication, QThreadPool
 from PySide6.QtGui import QColor
 from PySide6.QtWidgets import QColorDialog, QDialog, QMainWindow, QPushButton
 
-from molara.eval.marchingcubes import marching_cubes
+from molara.eval.marchingcubes import extract_isosurfaces
+from molara.eval.mesh_simplification import calculate_levels_of_detail
 from molara.eval.voxel_grid import VoxelGrid3D
+from molara.gui.worker import Worker
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from numpy.typing import NDArray
     from PySide6.QtGui import QCloseEvent
 
     from molara.structure.molecule import Molecule
 
+    # Vertices (positions and normals), indices of the triangles and coarser levels of detail (or None) of the surfaces
+    # at +iso_value and -iso_value
+    SurfacesWithLevelsOfDetail = tuple[
+        tuple[NDArray, NDArray, list[tuple[NDArray, NDArray]] | None],
+        tuple[NDArray, NDArray, list[tuple[NDArray, NDArray]] | None],
+    ]
+
+
+def calculate_surfaces(
+    voxel_grid: VoxelGrid3D,
+    iso_value: float,
+    number_of_threads: int = 1,
+) -> tuple[tuple[NDArray, NDArray], tuple[NDArray, NDArray]]:
+    """Calculate the isosurfaces of a voxel grid at +iso_value and -iso_value with marching cubes.
+
+    The surfaces are indexed triangle meshes, whose vertices are shared by all triangles touching them. The grid is
+    split into slabs, whose surfaces are calculated in parallel. Only the blocks of voxels whose ranges of values
+    contain the iso values are visited, the ranges are kept by the voxel grid. The axes of the voxels may be rotated
+    or non-orthogonal, as in cube files.
+
+    :param voxel_grid: voxel grid to calculate the surfaces of
+    :param iso_value: iso value of the surfaces
+    :param number_of_threads: number of threads used to calculate the surfaces
+    :return: vertices (positions and normals) and indices of the triangles of the surfaces at +iso_value and -iso_value
+    """
+    return extract_isosurfaces(
+        voxel_grid.grid,
+        iso_value,
+        voxel_grid.origin,
+        np.asarray(voxel_grid.voxel_size, dtype=np.float64),
+        voxel_grid.voxel_number,
+        number_of_threads,
+        voxel_grid.block_ranges(),
+    )
+
+
+def add_levels_of_detail(
+    surfaces: tuple[tuple[NDArray, NDArray], tuple[NDArray, NDArray]],
+    voxel_grid: VoxelGrid3D,
+    moving_index_budget: int | None = None,
+) -> SurfacesWithLevelsOfDetail:
+    """Add the coarser levels of detail to the surfaces, which are drawn while the camera moves.
+
+    :param surfaces: vertices (positions and normals) and indices of the surfaces at +iso_value and -iso_value
+    :param voxel_grid: voxel grid the surfaces were extracted from
+    :param moving_index_budget: number of indices the renderer draws in full while the camera moves, smaller surfaces
+        get no levels of detail. None to add no levels of detail at all.
+    :return: vertices, indices and levels of detail (or None) of the surfaces
+    """
+    surfaces_with_levels_of_detail = []
+    for vertices, indices in surfaces:
+        levels_of_detail = None
+        if moving_index_budget is not None and indices.shape[0] > moving_index_budget:
+            levels_of_detail = calculate_levels_of_detail(vertices, indices, voxel_grid.origin, voxel_grid.voxel_size)
+        surfaces_with_levels_of_detail.append((vertices, indices, levels_of_detail))
+    return tuple(surfaces_with_levels_of_detail)
+
+
+def calculate_surfaces_task(
+    worker: Worker,
+    voxel_grid: VoxelGrid3D,
+    iso_value: float,
+    number_of_threads: int = 1,
+    moving_index_budget: int | None = None,
+) -> SurfacesWithLevelsOfDetail:
+    """Calculate the isosurfaces of a voxel grid and their levels of detail in a worker.
+
+    :param worker: worker running the calculation
+    :param voxel_grid: voxel grid to calculate the surfaces of
+    :param iso_value: iso value of the surfaces
+    :param number_of_threads: number of threads used to calculate the surfaces
+    :param moving_index_budget: number of indices drawn in full while the camera moves (see add_levels_of_detail)
+    :return: vertices, indices and levels of detail of the surfaces at +iso_value and -iso_value
+    """
+    worker.report_progress(0, "Calculating the surfaces")
+    surfaces = calculate_surfaces(voxel_grid, iso_value, number_of_threads)
+    worker.report_progress(80, "Simplifying the surfaces")
+    return add_levels_of_detail(surfaces, voxel_grid, moving_index_budget)
+
 
 class Surface3DDialog(QDialog):
     """Class for 3D surfaces, all dialogues plotting surface will inherit from this class."""
@@ -30,6 +116,11 @@ class Surface3DDialog(QDialog):
         self.iso_value = 0.0
         self.vertices_1: NDArray = np.array([])
         self.vertices_2: NDArray = np.array([])
+        self.indices_1: NDArray = np.array([], dtype=np.uint32)
+        self.indices_2: NDArray = np.array([], dtype=np.uint32)
+        # Coarser levels of detail of the surfaces, which are calculated by the workers together with the surfaces
+        self.levels_of_detail_1: list[tuple[NDArray, NDArray]] | None = None
+        self.levels_of_detail_2: list[tuple[NDArray, NDArray]] | None = None
         self.surfaces_are_visible = False
         self.surface_toggle_button: QPushButton = QPushButton()
         self.surface_text = "surface"
@@ -37,6 +128,13 @@ class Surface3DDialog(QDialog):
         self.voxel_grid_changed = False
         self.draw_wire_frame = False
 
+        # The grids and surfaces are calculated in the thread pool and only drawn in the main thread. Without
+        # background calculation, the workers are run directly in the main thread.
+        self.thread_pool = QThreadPool.globalInstance()
+        self.background_calculation = True
+        self.calculation: Worker | None = None
+        self.number_of_threads = os.cpu_count() or 1
+
         # Color initialization
         self.color_surface_1 = np.array([255, 0, 0])
         self.color_surface_2 = np.array([0, 0, 255])
@@ -76,6 +174,7 @@ class Surface3DDialog(QDialog):
 
     def closeEvent(self, event: QCloseEvent) -> None:  # noqa: N802
         """Close the dialog."""
+        self.cancel_calculation()
         self.remove_surfaces()
         self.parent().structure_widget.update()
         event.accept()
@@ -103,6 +202,7 @@ class Surface3DDialog(QDialog):
     def set_surfaces_hidden(self) -> None:
         """Set the isosurface to hidden."""
         self.surfaces_are_visible = False
+        self.cancel_calculation()
         self.remove_surfaces()
         if self.action_text == "":
             self.surface_toggle_button.setText(f"Show {self.surface_text}")
@@ -151,9 +251,15 @@ class Surface3DDialog(QDialog):
             self.draw_surfaces()
         else:
             self.visualize_surfaces()
-            self.voxel_grid_changed = False
         self.update_wire_frame_surfaces()
 
+    def moving_index_budget(self) -> int:
+        """Return the number of indices the renderer draws in full while the camera moves.
+
+        Larger surfaces get coarser levels of detail, which are calculated by the workers together with the surfaces.
+        """
+        return self.parent().structure_widget.renderer.moving_index_budget
+
     def draw_surfaces(self) -> None:
         """Draw the surfaces."""
         self.remove_surfaces()
@@ -162,12 +268,16 @@ class Surface3DDialog(QDialog):
                 "Surface_1",
                 self.vertices_1,
                 np.array([self.color_surface_1 / 255], dtype=np.float32),
+                self.indices_1,
+                self.levels_of_detail_1,
             )
         if self.vertices_2.size != 0:
             self.parent().structure_widget.renderer.draw_polygon(
                 "Surface_2",
                 self.vertices_2,
                 np.array([self.color_surface_2 / 255], dtype=np.float32),
+                self.indices_2,
+                self.levels_of_detail_2,
             )
         self.parent().structure_widget.update()
 
@@ -186,37 +296,92 @@ class Surface3DDialog(QDialog):
                 self.parent().structure_widget.renderer.objects3d[f"Surface_{i + 1}"].wire_frame = self.draw_wire_frame
 
     def visualize_surfaces(self) -> None:
-        """Visualize the surface. A grid has to be set before calling this function."""
-        # 24 because each voxel can have up to 12 vertices and 12 normals
-        # times 6 because each vertex has 3 coordinates and each normal has 3 coordinates
-        # The +1 is to save the number of vertices in the marching cubes routine.
-        max_vertices = (
-            24
-            * (self.voxel_grid.voxel_number[0] - 1)
-            * (self.voxel_grid.voxel_number[1] - 1)
-            * (self.voxel_grid.voxel_number[2] - 1)
-            * 6
-            + 1
-        )
-        vertices1 = np.zeros(max_vertices, dtype=np.float32)
-        vertices2 = np.zeros(max_vertices, dtype=np.float32)
-
-        _ = marching_cubes(
-            self.voxel_grid.grid,
-            self.iso_value,
-            self.voxel_grid.origin,
-            np.array(
-                [self.voxel_grid.voxel_size[0, 0], self.voxel_grid.voxel_size[1, 1], self.voxel_grid.voxel_size[2, 2]],
-                dtype=np.float64,
-            ),
-            self.voxel_grid.voxel_number,
-            vertices1,
-            vertices2,
+        """Visualize the surface. A grid has to be set before calling this function.
+
+        The surfaces are calculated by a worker and drawn, when the calculation has finished.
+        """
+        self.start_calculation(
+            calculate_surfaces_task,
+            (self.voxel_grid, self.iso_value, self.number_of_threads, self.moving_index_budget()),
+            self.set_surfaces,
         )
-        # Get the number of vertices from the last entry, to shrink the memory usage
-        number_of_vertices_entries_1 = int(vertices1[-1])
-        number_of_vertices_entries_2 = int(vertices2[-1])
-        self.vertices_1 = vertices1[:number_of_vertices_entries_1]
-        self.vertices_2 = vertices2[:number_of_vertices_entries_2]
 
-        self.draw_surfaces()
+    def set_surfaces(self, surfaces: SurfacesWithLevelsOfDetail) -> None:
+        """Set the surfaces of the current voxel grid and draw them, if the surfaces are visible.
+
+        :param surfaces: vertices (positions and normals), indices and levels of detail of the surfaces at +iso_value
+            and -iso_value
+        """
+        (
+            (self.vertices_1, self.indices_1, self.levels_of_detail_1),
+            (self.vertices_2, self.indices_2, self.levels_of_detail_2),
+        ) = surfaces
+        self.voxel_grid_changed = False
+        if self.surfaces_are_visible:
+            self.draw_surfaces()
+            self.update_wire_frame_surfaces()
+
+    def start_calculation(
+        self,
+        function: Callable[..., Any],
+        args: tuple,
+        finished: Callable[[Any], None],
+        partial_result: Callable[[Any], None] | None = None,
+    ) -> None:
+        """Start a calculation in the thread pool, the running calculation is cancelled.
+
+        :param function: function to run, taking the worker as its first argument
+        :param args: further arguments of the function
+        :param finished: called with the result in the main thread, when the calculation has finished
+        :param partial_result: called with each partial result in the main thread
+        """
+        self.cancel_calculation()
+        worker = Worker(function, *args)
+        worker.signals.progress.connect(partial(self.on_calculation_progress, worker))
+        worker.signals.finished.connect(partial(self.on_calculation_finished, worker, finished))
+        worker.signals.failed.connect(partial(self.on_calculation_failed, worker))
+        if partial_result is not None:
+            worker.signals.partial_result.connect(partial(self.on_calculation_partial_result, worker, partial_result))
+        self.calculation = worker
+        if self.background_calculation:
+            self.thread_pool.start(worker)
+        else:
+            worker.run()
+
+    def cancel_calculation(self) -> None:
+        """Cancel the running calculation, its results are discarded."""
+        if self.calculation is None:
+            return
+        self.calculation.cancel()
+        self.calculation = None
+        self.parent().statusBar().clearMessage()
+
+    def wait_for_calculation(self) -> None:
+        """Wait until the running calculation has finished and its results have been processed."""
+        self.thread_pool.waitForDone()
+        QCoreApplication.processEvents()
+
+    def on_calculation_progress(self, worker: Worker, percent: int, message: str) -> None:
+        """Show the progress of a calculation in the status bar."""
+        if worker is self.calculation:
+            self.parent().statusBar().showMessage(f"{message} ({percent} %)")
+
+    def on_calculation_partial_result(self, worker: Worker, callback: Callable[[Any], None], result: object) -> None:
+        """Pass a partial result of the running calculation to the callback."""
+        if worker is self.calculation:
+            callback(result)
+
+    def on_calculation_finished(self, worker: Worker, callback: Callable[[Any], None], result: object) -> None:
+        """Pass the result of the running calculation to the callback."""
+        if worker is not self.calculation:
+            return
+        self.calculation = None
+        self.parent().statusBar().clearMessage()
+        callback(result)
+
+    def on_calculation_failed(self, worker: Worker, message: str) -> None:
+        """Show the error of the running calculation in the status bar."""
+        if worker is not self.calculation:
+            return
+        self.calculation = None
+        self.parent().statusBar().showMessage(f"Calculation failed: {message}")
@@ -0,0 +1,90 @@
+"""Run calculations in a thread pool, so the user interface stays responsive."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class CalculationCancelledError(Exception):
+    """Raised inside a calculation, after it has been cancelled."""
+
+
+class WorkerSignals(QObject):
+    """Signals of a worker.
+
+    The signals object is created in the thread that starts the worker, so the connected slots are called in this
+    thread, even though the signals are emitted from the thread running the calculation.
+    """
+
+    progress = Signal(int, str)
+    partial_result = Signal(object)
+    finished = Signal(object)
+    failed = Signal(str)
+
+
+class Worker(QRunnable):
+    """Runs a function in a thread of a thread pool.
+
+    The function is called with the worker as its first argument, followed by the given arguments. It can report its
+    progress and partial results through the worker and should call check_cancelled between its steps, so that a
+    cancelled calculation stops early. The results of a cancelled calculation are never emitted.
+    """
+
+    def __init__(self, function: Callable[..., Any], *args: Any) -> None:  # noqa: ANN401
+        """Initialize the worker.
+
+        :param function: function to run, taking the worker as its first argument
+        :param args: further arguments of the function
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+        self.function = function
+        self.args = args
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel the calculation, it stops at the next call of check_cancelled."""
+        self.is_cancelled = True
+
+    def check_cancelled(self) -> None:
+        """Stop the calculation by raising a CalculationCancelledError, if it has been cancelled."""
+        if self.is_cancelled:
+            raise CalculationCancelledError
+
+    def report_progress(self, percent: int, message: str) -> None:
+        """Report the progress of the calculation.
+
+        :param percent: progress in percent
+        :param message: description of the current step
+        """
+        self.check_cancelled()
+        self.signals.progress.emit(percent, message)
+
+    def report_partial_result(self, result: object) -> None:
+        """Report a partial result, e.g. a preview of the final result.
+
+        :param result: partial result of the calculation
+        """
+        self.check_cancelled()
+        self.signals.partial_result.emit(result)
+
+    def run(self) -> None:
+        """Run the calculation and emit its result or the error that occurred."""
+        try:
+            result = self.function(self, *self.args)
+        except CalculationCancelledError:
+            return
+        except Exception as error:  # noqa: BLE001 (errors have to be passed to the thread that started the worker)
+            if not self.is_cancelled:
+                self.signals.failed.emit(str(error))
+            return
+        if not self.is_cancelled:
+            self.signals.finished.emit(result)
@@ -23,6 +23,8 @@ class Object3D:
         self.buffers = Buffers()
         self.number_of_vertices = 0
         self.number_of_indices = 0
+        # Offset of the first drawn index in the element buffer
+        self.first_index = 0
         self.colors = np.array([])
 
         self.translation_matrices = np.array([])
@@ -12,19 +12,69 @@ from molara.rendering.object3d import Object3D
 class Polygon(Object3D):
     """Creates a Polygon object, containing its vertices and colors."""
 
-    def __init__(self, vertices: NDArray, color: NDArray, wire_frame: bool = False) -> None:
-        """Create a Polygon object to be drawn."""
+    def __init__(
+        self,
+        vertices: NDArray,
+        color: NDArray,
+        indices: NDArray | None = None,
+        wire_frame: bool = False,
+        levels_of_detail: list[tuple[NDArray, NDArray]] | None = None,
+    ) -> None:
+        """Create a Polygon object to be drawn.
+
+        :param vertices: Vertices in the following order x,y,z,nx,ny,nz,...
+        :param color: Color of the polygon.
+        :param indices: Indices (uint32) of the vertices of the triangles. If None, each three consecutive vertices
+            form a triangle.
+        :param wire_frame: If True, the polygon is drawn as a wire frame.
+        :param levels_of_detail: Vertices and indices of coarser versions of the polygon, ordered from fine to coarse.
+            They are stored behind the full polygon in the same buffers, so that a level can be selected for drawing
+            without uploading it again. Requires indices.
+        """
         self.wire_frame = wire_frame
         super().__init__()
-        self.vertices = vertices
-        self.indices = None
         self.number_of_instances = 1
         # // 6 because each vertex has 3 coordinates and 3 normals!
         self.number_of_vertices = len(vertices) // 6
+        # (first index, number of indices) of the full polygon and of each level of detail
+        self.index_ranges: list[tuple[int, int]] = []
+        if indices is not None:
+            self.number_of_indices = len(indices)
+            self.index_ranges.append((0, len(indices)))
+        if levels_of_detail and indices is not None:
+            all_vertices = [vertices]
+            all_indices = [indices]
+            vertex_base = self.number_of_vertices
+            for level_vertices, level_indices in levels_of_detail:
+                all_vertices.append(level_vertices)
+                all_indices.append(level_indices + np.uint32(vertex_base))
+                self.index_ranges.append((self.index_ranges[-1][0] + self.index_ranges[-1][1], len(level_indices)))
+                vertex_base += len(level_vertices) // 6
+            vertices = np.concatenate(all_vertices).astype(np.float32, copy=False)
+            indices = np.concatenate(all_indices).astype(np.uint32, copy=False)
+        self.vertices = vertices
+        self.indices = indices
         self.model_matrices = np.array([np.identity(4, dtype=np.float32)])
 
         self.colors = color[0]
 
+    def select_level_of_detail(self, max_indices: int | None = None) -> None:
+        """Select the finest level of detail with at most max_indices triangle indices for drawing.
+
+        If no level is small enough, the coarsest one is selected.
+
+        :param max_indices: Maximum number of indices to draw. If None, the full polygon is selected.
+        """
+        if not self.index_ranges:
+            return
+        first_index, number_of_indices = self.index_ranges[-1]
+        for index_range in self.index_ranges:
+            if max_indices is None or index_range[1] <= max_indices:
+                first_index, number_of_indices = index_range
+                break
+        self.first_index = first_index
+        self.number_of_indices = number_of_indices
+
     def calculate_scaling_matrices(self, dimensions: NDArray) -> None:  # noqa: ARG002
         """Contain dummy function."""
         return
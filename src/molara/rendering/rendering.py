@@ -57,6 +57,7 @@ from molara.rendering.framebuffers import Framebuffer
 from molara.rendering.polygons import Polygon
 from molara.rendering.shaders import Shader
 from molara.rendering.spheres import Spheres
+from molara.rendering.tubes import generate_tubes
 
 if TYPE_CHECKING:
     from numpy import floating
@@ -92,6 +93,9 @@ class Renderer:
         self.ssaa_factor = 1.2
 
         self.device_pixel_ratio = 1
+        # While the camera moves, polygons are drawn with the finest level of detail within this number of indices
+        self.camera_moving = False
+        self.moving_index_budget = 300000
         self.objects3d: dict = {}
         self.textured_objects3d: dict = {}
         self.screen_vao = -1
@@ -251,16 +255,47 @@ class Renderer:
         name: str,
         vertices: NDArray,
         color: NDArray,
+        indices: NDArray | None = None,
+        levels_of_detail: list[tuple[NDArray, NDArray]] | None = None,
     ) -> None:
         """Draws one polygon.
 
         :param vertices: Vertices in the following order x,y,z,nx,ny,nz,..., where xyz are the cartesian coordinates.
         :param color: Colors of the vertices.
+        :param indices: Indices (uint32) of the vertices of the triangles. If None, each three consecutive vertices
+            form a triangle.
+        :param levels_of_detail: Vertices and indices of coarser versions of the polygon, ordered from fine to coarse.
+            A coarser version is drawn instead of the full polygon while the camera moves.
         """
         self.opengl_widget.makeCurrent()
-        self.objects3d[name] = Polygon(vertices, color)
+        self.objects3d[name] = Polygon(vertices, color, indices, levels_of_detail=levels_of_detail)
         self.objects3d[name].generate_buffers()
 
+    def draw_tubes(  # noqa: PLR0913
+        self,
+        name: str,
+        points: NDArray,
+        polyline_offsets: NDArray,
+        closed: NDArray,
+        radius: float,
+        normal: NDArray,
+        color: NDArray,
+        subdivisions: int,
+    ) -> None:
+        """Draws tubes around polylines in a plane as one polygon.
+
+        :param name: Name of the tubes that were created, this is used to remove the tubes again.
+        :param points: Points of the polylines.
+        :param polyline_offsets: Offsets of the polylines in the points (number of polylines + 1 entries).
+        :param closed: Flags of the closed polylines, whose last point connects to the first one.
+        :param radius: Radius of the tubes.
+        :param normal: Normal of the plane of the polylines.
+        :param color: Color of the tubes.
+        :param subdivisions: Number of subdivisions of the tubes.
+        """
+        vertices, indices = generate_tubes(points, polyline_offsets, closed, radius, normal, subdivisions)
+        self.draw_polygon(name, vertices, color, indices)
+
     def draw_cylinders(  # noqa: PLR0913
         self,
         name: str,
@@ -547,6 +582,8 @@ class Renderer:
 
         self._init_rendering(shader_name="Main" + self.shade)
         for object_ in self.objects3d.values():
+            if isinstance(object_, Polygon):
+                object_.select_level_of_detail(self.moving_index_budget if self.camera_moving else None)
             _render_object(object_)
 
         self._init_rendering(shader_name="Texture" + self.shade)
@@ -671,7 +708,8 @@ def _render_object(object_: Object3D) -> None:
             GL_TRIANGLES,
             object_.number_of_indices,
             GL_UNSIGNED_INT,
-            None,
+            # Byte offset into the element buffer, indices are uint32
+            ctypes.c_void_p(4 * object_.first_index) if object_.first_index else None,
             object_.number_of_instances,
         )
     else:
@@ -0,0 +1,86 @@
+"""Contains the generation of tube meshes around polylines.
+
+A tube mesh of all polylines is drawn as one indexed polygon, instead of one cylinder instance per line.
+"""
+
+import numpy as np
+from numpy.typing import NDArray
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+def generate_tubes(  # noqa: PLR0913
+    points: NDArray,
+    polyline_offsets: NDArray,
+    closed: NDArray,
+    radius: float,
+    normal: NDArray,
+    subdivisions: int,
+) -> tuple[NDArray, NDArray]:
+    """Calculate the vertices and indices of tubes around polylines in a plane.
+
+    A ring of vertices is placed around each point of the polylines, perpendicular to the mean direction of the
+    adjacent lines, and the rings of consecutive points are connected by quads. The rings of closed polylines are
+    connected from the last to the first point.
+
+    :param points: Points of the polylines.
+    :param polyline_offsets: Offsets of the polylines in the points (number of polylines + 1 entries).
+    :param closed: Flags of the closed polylines, whose last point connects to the first one.
+    :param radius: Radius of the tubes.
+    :param normal: Normal of the plane of the polylines.
+    :param subdivisions: Number of vertices of each ring.
+    :returns:
+        - **vertices** (numpy.array of numpy.float32) - Vertices in the following order x,y,z,nx,ny,nz,..., where\
+         xyz are the cartesian coordinates, and nxnynz are the components of the normal vector.
+        - **indices** (numpy.array of numpy.uint32) - Gives the connectivity of the vertices.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    polyline_offsets = np.asarray(polyline_offsets, dtype=np.int64)
+    closed = np.asarray(closed, dtype=np.bool_)
+    starts = polyline_offsets[:-1]
+    ends = polyline_offsets[1:]
+    lengths = ends - starts
+    if points.shape[0] == 0 or np.all(lengths < 2):  # noqa: PLR2004
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.uint32)
+
+    # Previous and next point of each point, wrapping around for closed polylines and clamped for open ones
+    polylines = np.repeat(np.arange(lengths.shape[0]), lengths)
+    point_indices = np.arange(points.shape[0])
+    is_first = point_indices == starts[polylines]
+    is_last = point_indices == ends[polylines] - 1
+    previous_indices = point_indices - 1
+    previous_indices[is_first] = np.where(closed[polylines], ends[polylines] - 1, point_indices)[is_first]
+    next_indices = point_indices + 1
+    next_indices[is_last] = np.where(closed[polylines], starts[polylines], point_indices)[is_last]
+
+    tangents = points[next_indices] - points[previous_indices]
+    sides = np.cross(tangents, np.asarray(normal, dtype=np.float64))
+    side_lengths = np.linalg.norm(sides, axis=1)
+    valid = side_lengths > np.finfo(np.float32).eps
+    sides[valid] /= side_lengths[valid, np.newaxis]
+    ups = np.cross(sides, tangents)
+    up_lengths = np.linalg.norm(ups, axis=1)
+    valid = up_lengths > np.finfo(np.float32).eps
+    ups[valid] /= up_lengths[valid, np.newaxis]
+
+    angles = 2 * np.pi * np.arange(subdivisions) / subdivisions
+    ring_normals = (
+        np.cos(angles)[np.newaxis, :, np.newaxis] * sides[:, np.newaxis]
+        + np.sin(angles)[np.newaxis, :, np.newaxis] * ups[:, np.newaxis]
+    )
+    vertices = np.concatenate((points[:, np.newaxis] + radius * ring_normals, ring_normals), axis=2)
+
+    # Each line between two points is a segment of subdivisions quads
+    has_segment = ~is_last | closed[polylines]
+    has_segment[lengths[polylines] < 2] = False  # noqa: PLR2004
+    segment_starts = point_indices[has_segment]
+    segment_ends = next_indices[has_segment]
+    ring = np.arange(subdivisions)
+    next_ring = (ring + 1) % subdivisions
+    a = segment_starts[:, np.newaxis] * subdivisions
+    b = segment_ends[:, np.newaxis] * subdivisions
+    quads = np.stack(
+        (a + ring, b + ring, b + next_ring, a + ring, b + next_ring, a + next_ring),
+        axis=2,
+    )
+    return vertices.astype(np.float32).reshape(-1), quads.astype(np.uint32).reshape(-1)
@@ -6,6 +6,8 @@ from typing import TYPE_CHECKING
 
 import numpy as np
 
+from molara.util.constants import ANGSTROM_TO_BOHR
+
 if TYPE_CHECKING:
     from numpy.typing import NDArray
 
@@ -223,6 +225,143 @@ class BasisFunction:
         )
 
 
+class PackedBasisSet:
+    """Class to store the basis functions of a molecule shell by shell in arrays, as used by the orbital kernels.
+
+    Only the primitives of the first basis function of each shell are stored, the other functions of the shell are
+    generated from them by the kernels. The arrays are packed once and shared by all calculations, so the basis
+    functions do not have to be iterated for each grid.
+    """
+
+    def __init__(
+        self,
+        basis_functions: list[BasisFunction],
+        spherical_transformations: list[NDArray] | None = None,
+    ) -> None:
+        """Pack the basis functions shell by shell.
+
+        If the transformations from the cartesian functions to the spherical harmonics of the shells are given, the
+        basis set consists of the spherical harmonics, i.e., 2l + 1 functions per shell, which the kernels evaluate
+        directly as polynomials of x, y and z.
+
+        :param basis_functions: list of all cartesian basis functions of the molecule, ordered shell by shell
+        :param spherical_transformations: transformation matrices (spherical x cartesian functions) of the shells of
+            each angular momentum, as in MolecularOrbitals.transformation_blocks
+        :return:
+        """
+        self.basis_functions = basis_functions
+        self.spherical = spherical_transformations is not None
+
+        # The first function of each shell is found by skipping the remaining functions of the shell
+        shell_starts = []
+        function_index = 0
+        while function_index < len(basis_functions):
+            shell_starts.append(function_index)
+            function_index += number_of_cartesian_functions(int(sum(basis_functions[function_index].ijk)))
+        number_of_shells = len(shell_starts)
+        max_length = max([len(basis_functions[i].exponents) for i in shell_starts], default=0)
+
+        self.shell_types = np.array([sum(basis_functions[i].ijk) for i in shell_starts], dtype=np.int64)
+        # Index of the first basis function of each shell and the number of basis functions as the last entry
+        shell_ends = [*shell_starts[1:], len(basis_functions)]
+        shell_sizes = 2 * self.shell_types + 1 if self.spherical else np.diff([0, *shell_ends])
+        self.shell_offsets = np.concatenate(([0], np.cumsum(shell_sizes))).astype(np.int64)
+        self.number_of_functions = int(self.shell_offsets[-1])
+        self.shell_primitives = np.zeros(number_of_shells, dtype=np.int64)
+        self.shell_positions = np.zeros((number_of_shells, 3), dtype=np.float64)
+        self.shell_exponents = np.zeros((number_of_shells, max_length), dtype=np.float64)
+        self.shell_coefficients = np.zeros((number_of_shells, max_length), dtype=np.float64)
+        self.shell_norms = np.zeros((number_of_shells, max_length), dtype=np.float64)
+        # Contraction coefficients times norms of the most diffuse function of each shell, which is the last one
+        self.shell_envelope_prefactors = np.zeros((number_of_shells, max_length), dtype=np.float64)
+
+        for shell_index, function_index in enumerate(shell_starts):
+            function = basis_functions[function_index]
+            last_function = basis_functions[shell_ends[shell_index] - 1]
+            length = len(function.exponents)
+            self.shell_primitives[shell_index] = length
+            self.shell_positions[shell_index, :] = np.asarray(function.position) * ANGSTROM_TO_BOHR
+            self.shell_exponents[shell_index, :length] = function.exponents
+            self.shell_coefficients[shell_index, :length] = function.coefficients
+            self.shell_norms[shell_index, :length] = function.norms
+            self.shell_envelope_prefactors[shell_index, :length] = np.asarray(last_function.coefficients) * np.asarray(
+                last_function.norms,
+            )
+
+        # Terms of the polynomials of the spherical harmonics of all angular momenta, the terms of the function f of
+        # the shells with angular momentum l start at spherical_term_offsets[l^2 + f]
+        self.spherical_term_offsets = np.zeros(1, dtype=np.int64)
+        self.spherical_term_exponents = np.zeros((0, 3), dtype=np.int64)
+        self.spherical_term_coefficients = np.zeros(0, dtype=np.float64)
+        if spherical_transformations is not None:
+            self.pack_spherical_terms(spherical_transformations)
+
+    def pack_spherical_terms(self, spherical_transformations: list[NDArray]) -> None:
+        """Pack the non-zero terms of the spherical harmonics as polynomials of x, y and z.
+
+        The coefficient of a term is the element of the transformation matrix times the normalization factor of the
+        cartesian function relative to the first function of the shell, so the terms are multiplied by the radial part
+        of the shell only.
+
+        :param spherical_transformations: transformation matrices (spherical x cartesian functions) of the shells of
+            each angular momentum
+        """
+        term_counts = []
+        exponents = []
+        coefficients = []
+        for angular_momentum, transformation in enumerate(spherical_transformations):
+            ijks = generate_ijks("spdfg"[angular_momentum])
+            factors = np.array([cartesian_normalization_factor(ijk) for ijk in ijks])
+            for row in np.asarray(transformation, dtype=np.float64):
+                nonzero = np.flatnonzero(row)
+                term_counts.append(nonzero.shape[0])
+                exponents += [ijks[index] for index in nonzero]
+                coefficients += list(row[nonzero] * factors[nonzero])
+        self.spherical_term_offsets = np.concatenate(([0], np.cumsum(term_counts))).astype(np.int64)
+        self.spherical_term_exponents = np.array(exponents, dtype=np.int64).reshape(-1, 3)
+        self.spherical_term_coefficients = np.array(coefficients, dtype=np.float64)
+
+    def __len__(self) -> int:
+        """Return the number of basis functions."""
+        return self.number_of_functions
+
+    @property
+    def number_of_shells(self) -> int:
+        """Return the number of shells."""
+        return self.shell_types.shape[0]
+
+
+def pack_basis_set(basis_functions: PackedBasisSet | list[BasisFunction]) -> PackedBasisSet:
+    """Return the packed basis set of a list of basis functions, packed basis sets are returned as they are.
+
+    :param basis_functions: packed basis set or list of all basis functions of the molecule
+    :return: packed basis set
+    """
+    if isinstance(basis_functions, PackedBasisSet):
+        return basis_functions
+    return PackedBasisSet(basis_functions)
+
+
+def cartesian_normalization_factor(ijk: list[int]) -> float:
+    """Return the factor between the norm of a cartesian function and the norm of the first function of its shell.
+
+    :param ijk: exponents of x, y and z of the function
+    :return: sqrt((2l - 1)!! / ((2i - 1)!! (2j - 1)!! (2k - 1)!!))
+    """
+    angular_momentum = sum(ijk)
+    denominator = np.prod([fact2[2 * exponent - 1] if exponent > 0 else 1 for exponent in ijk])
+    return float(np.sqrt((fact2[2 * angular_momentum - 1] if angular_momentum > 0 else 1) / denominator))
+
+
+def number_of_cartesian_functions(angular_momentum: int) -> int:
+    """Return the number of cartesian basis functions of a shell.
+
+    :param angular_momentum: angular momentum of the shell
+    :return: number of cartesian basis functions
+    """
+    return (angular_momentum + 1) * (angular_momentum + 2) // 2
+
+
 def hermite_coefs(  # noqa: PLR0913
     i: int,
     j: int,
@@ -122,6 +122,30 @@ class Drawer:
         self.sphere_colors = np.array([atom.color[self.color_scheme] for atom in self.atoms], dtype=np.float32)
         self.spheres.colors = self.sphere_colors
 
+    def set_atom_colors_from_values(self, values: NDArray, max_value: float | None = None) -> None:
+        """Color the atoms by a value of each atom, e.g., their partial charges.
+
+        :param values: value of each atom
+        :param max_value: absolute value mapped to the most saturated colors, by default the largest absolute value
+        """
+        assert self.spheres is not None
+        self.sphere_colors = values_to_colors(values, max_value)
+        self.spheres.colors = self.sphere_colors
+
+    def set_bond_colors_from_values(self, values: NDArray, max_value: float | None = None) -> None:
+        """Color the bonds by a value of each pair of atoms, e.g., their bond orders.
+
+        :param values: values of all pairs of atoms (number of atoms x number of atoms)
+        :param max_value: absolute value mapped to the most saturated colors, by default the largest absolute value of
+            the bonds
+        """
+        if self.cylinders is None or not self.has_bonds:
+            return
+        bond_values = np.asarray(values)[self.bonds[:, 0], self.bonds[:, 1]]
+        # Both halves of a bond get the color of the bond
+        self.cylinder_colors = np.repeat(values_to_colors(bond_values, max_value), 2, axis=0)
+        self.cylinders.colors = self.cylinder_colors
+
     def set_atom_positions(self) -> None:
         """Set the positions of the atoms."""
         assert self.atoms is not None
@@ -256,3 +280,22 @@ class Drawer:
         assert self.spheres is not None
 
         self.spheres.calculate_model_matrices()
+
+
+def values_to_colors(values: NDArray, max_value: float | None = None) -> NDArray:
+    """Map values to colors from blue (negative) over white (zero) to red (positive).
+
+    :param values: values to be mapped
+    :param max_value: absolute value mapped to pure blue and red, by default the largest absolute value
+    :return: colors (number of values x 3)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if max_value is None:
+        max_value = float(np.max(np.abs(values), initial=0.0))
+    scaled = np.clip(values / max_value, -1.0, 1.0) if max_value > 0.0 else np.zeros_like(values)
+    colors = np.ones((values.shape[0], 3), dtype=np.float32)
+    # Positive values reduce green and blue, negative values reduce red and green
+    colors[:, 0] -= np.maximum(-scaled, 0.0)
+    colors[:, 1] -= np.abs(scaled)
+    colors[:, 2] -= np.maximum(scaled, 0.0)
+    return colors
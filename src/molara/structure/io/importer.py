@@ -28,7 +28,7 @@ if TYPE_CHECKING:
     from typing import Any
 
     from molara.molecule.crystals import Crystals
-    from numpy.typing import NDArray
+    from numpy.typing import DTypeLike, NDArray
 
     try:
         from cclib.data import ccData
@@ -229,6 +229,8 @@ class MoldenImporter(MoleculesImporter):
                 list(molecules.mols[0].atoms[i].basis_set.basis_functions.keys()),
             )
         molecules.mols[0].mos.basis_functions = orbital_labels
+        # The basis set is packed once for all orbital calculations
+        molecules.mols[0].get_packed_basis_set()
         molecules.mols[0].mos.set_mo_coefficients(
             np.array(mo_coefficients).T,
             spherical_order=spherical_order,
@@ -384,6 +386,19 @@ class MoldenImporter(MoleculesImporter):
 class CubeImporter(MoleculesImporter):
     """Importer from *.molden files."""
 
+    def __init__(self, path: PathLike | str, dtype: DTypeLike = np.float64) -> None:
+        """Instantiate CubeImporter object.
+
+        :param path: input file path
+        :param dtype: type of the values of the voxel grid, float64 or float32, which halves the memory of large grids
+        """
+        super().__init__(path)
+
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            msg = "The grids must be of type float32 or float64"
+            raise ValueError(msg)
+
     def load(self) -> Molecules:
         """Read the file in self.path and creates a Molecules object."""
         molecules = Molecules()
@@ -442,7 +457,7 @@ class CubeImporter(MoleculesImporter):
             vals = [float(x) for x in line_.split()]
             all_vals += vals
             line_index += 1
-        grid = np.array(all_vals).reshape(number_of_voxels)
+        grid = np.array(all_vals, dtype=self.dtype).reshape(number_of_voxels)
 
         molecule = Molecule(np.array(atomic_numbers), np.array(coordinates))
         molecule.voxel_grid.set_grid(grid, origin, size_of_voxels)
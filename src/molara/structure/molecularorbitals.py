@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING
 import numpy as np
 
 from molara.eval.mos import calculate_mo_cartesian
+from molara.structure.basisset import PackedBasisSet, pack_basis_set
 from molara.util.constants import ANGSTROM_TO_BOHR
 
 if TYPE_CHECKING:
@@ -65,18 +66,35 @@ class MolecularOrbitals:
         self.coefficients_spherical: NDArray = np.array([])
         self.coefficients_display: NDArray = np.array([])
         self.cut_off_distances_shells: NDArray = np.array([])
+        # Radial envelopes of the shells of the last basis set used for the calculation of the cutoffs
+        self.shell_envelopes_cache: tuple | None = None
 
         # Construct transformation matrices for spherical to cartesian transformation
         self.t_sc_d: NDArray = np.array([])
         self.t_sc_f: NDArray = np.array([])
         self.t_sc_g: NDArray = np.array([])
-        self.transformation_matrix_spherical_cartesian: NDArray = np.array([])
+        # Transformation matrices of the shells of each angular momentum (s - g)
+        self.transformation_blocks: list[NDArray] = []
+        # Angular momenta of the shells and their offsets in the spherical and cartesian basis (number of shells + 1)
+        self.shell_angular_momenta: NDArray = np.array([], dtype=np.int64)
+        self.shell_spherical_offsets: NDArray = np.zeros(1, dtype=np.int64)
+        self.shell_cartesian_offsets: NDArray = np.zeros(1, dtype=np.int64)
         self.construct_transformation_matrices()
 
+    def get_coefficients(self, basis_functions: PackedBasisSet | list[BasisFunction]) -> NDArray:
+        """Return the coefficients of the molecular orbitals in the basis of a basis set.
+
+        :param basis_functions: packed basis set or list of all basis functions of the molecule
+        :return: spherical coefficients for a basis set of spherical harmonics, otherwise cartesian coefficients
+        """
+        if isinstance(basis_functions, PackedBasisSet) and basis_functions.spherical:
+            return self.coefficients_spherical
+        return self.coefficients
+
     def calculate_cut_offs(
         self,
-        basis_functions: list[BasisFunction],
-        orbital: int,
+        basis_functions: PackedBasisSet | list[BasisFunction],
+        orbital: int | list[int],
         threshold: float = 0.001,
         max_distance: float = 40.0,
         max_points_number: int = 200,
@@ -90,68 +108,179 @@ class MolecularOrbitals:
         orbital is used as the cutoff distance. If the threshold is never reached, the maximum distance (1.e300) is
         used. The algorithm ensures that the cutoff distance is never underestimated.
 
-        :param basis_functions: list of BasisFunction: list of all basis functions of the molecule
-        :param orbital: int: index of the molecular orbital
+        :param basis_functions: packed basis set or list of all basis functions of the molecule
+        :param orbital: int | list[int]: index of the molecular orbital. If a list of indices is given, the cutoffs are
+            valid for all of these orbitals
         :param threshold: float: threshold for the cutoff distance
         :param max_distance: float: maximum distance for the cutoff distance calculation
         :param max_points_number: int: number of sample points for the cutoff distance calculation
         :return: array of cutoff distances for each shell of the molecular orbital
         """
-        basis_function_labels = [item for row in self.basis_functions for item in row]
-        x_vals = np.linspace(0, max_distance, max_points_number)
-        calculation_keys = ["s", "pz", "dyz", "fxyz", "gzzxy"]
-        cut_off_distances = []
-        mo_coeff_basis_function = 0
+        coefficients = self.get_coefficients(basis_functions)
+        weights = np.abs(coefficients[: len(basis_functions), orbital]).reshape(len(basis_functions), -1)
+        return self.calculate_weighted_cut_offs(
+            basis_functions,
+            np.max(weights, axis=1, initial=0.0),
+            threshold=threshold,
+            max_distance=max_distance,
+            max_points_number=max_points_number,
+        )
+
+    def calculate_density_cut_offs(
+        self,
+        basis_functions: PackedBasisSet | list[BasisFunction],
+        density_matrix: NDArray,
+        threshold: float = 0.001,
+        max_distance: float = 40.0,
+        max_points_number: int = 200,
+    ) -> NDArray:
+        """Calculate the cut-offs for the evaluation of a density from its density matrix.
+
+        The cutoffs are calculated like those of a molecular orbital, using the square root of the largest absolute
+        element of the density matrix in the row of each basis function instead of the orbital coefficient. Thus, the
+        threshold refers to the square root of the density. Shells without any density matrix elements get a cutoff
+        distance of zero and are skipped entirely during the evaluation.
+
+        :param basis_functions: packed basis set or list of all basis functions of the molecule
+        :param density_matrix: NDArray: density matrix in the basis of the basis set
+        :param threshold: float: threshold for the cutoff distance
+        :param max_distance: float: maximum distance for the cutoff distance calculation
+        :param max_points_number: int: number of sample points for the cutoff distance calculation
+        :return: array of cutoff distances for each shell
+        """
+        return self.calculate_weighted_cut_offs(
+            basis_functions,
+            np.sqrt(np.max(np.abs(density_matrix), axis=1, initial=0.0)),
+            threshold=threshold,
+            max_distance=max_distance,
+            max_points_number=max_points_number,
+        )
+
+    def calculate_weighted_cut_offs(
+        self,
+        basis_functions: PackedBasisSet | list[BasisFunction],
+        weights: NDArray,
+        threshold: float = 0.001,
+        max_distance: float = 40.0,
+        max_points_number: int = 200,
+    ) -> NDArray:
+        """Calculate the cut-offs of the shells for given weights of the basis functions.
+
+        The radial envelopes of the shells (see calculate_shell_envelopes) are multiplied with the highest weight of
+        each shell. The cutoff distance is the first sample point below the threshold after the maximum of the
+        envelope. If the threshold is never reached, the maximum distance (1.e300) is used, and if the weights of the
+        shell are zero, the cutoff distance is set to zero. The envelopes are cached, so changing the weights or the
+        threshold only rescales them.
+
+        :param basis_functions: packed basis set or list of all basis functions of the molecule
+        :param weights: NDArray: non-negative weight of each basis function, e.g., its absolute mo coefficient
+        :param threshold: float: threshold for the cutoff distance
+        :param max_distance: float: maximum distance for the cutoff distance calculation
+        :param max_points_number: int: number of sample points for the cutoff distance calculation
+        :return: array of cutoff distances for each shell
+        """
+        x_vals, shell_starts, envelopes, max_indices = self.calculate_shell_envelopes(
+            basis_functions,
+            max_distance,
+            max_points_number,
+        )
         maximum_distance = 1.0e300
+        if len(shell_starts) == 0:
+            return np.array([], dtype=np.float64)
 
-        # Loop over all basis functions
-        for i in range(len(basis_functions)):
-            # The highest molecular orbital coefficient for each shell is determined for use in the calculation of the
-            # cutoffs
-            mo_coeff_basis_function_temp = abs(self.coefficients[i, orbital])
-            mo_coeff_basis_function = max(mo_coeff_basis_function_temp, mo_coeff_basis_function)
-
-            # Only calculate the cutoffs for one shell, because all functions are evaluated at the same distance for
-            # each shell. The key is the most diffuse atomic orbital (see calculation_keys), in order to use the
-            # worst case scenario for the cutoffs.
-            if any(key in basis_function_labels[i] for key in calculation_keys):
-                y_vals = []
-
-                # The atomic orbitals are evaluated for different distances, assuming x direction only
-                for x in x_vals:
-                    # The radial part of the atomic orbital is calculated
-                    coeffs = basis_functions[i].coefficients
-                    norms = basis_functions[i].norms
-                    exponents = basis_functions[i].exponents
-                    radial = np.sum(coeffs * norms * np.exp(-exponents * x))
-
-                    # The angular part of the atomic orbital is calculated using only the highest order x function
-                    # to make sure to never underestimate the value of the atomic orbital
-                    complete_val = radial * x ** sum(basis_functions[i].ijk)
-                    y_vals.append(complete_val)
-
-                # The atomic orbital is multiplied with the largest molecular orbital coefficient of the shell
-                y_vals = np.abs(np.array(y_vals) * mo_coeff_basis_function)
-                max_index = np.array(y_vals).argmax()
-
-                # The cutoff distance is determined by the first point below the threshold after crossing the maximum
-                # of the atomic orbital
-                for ao_val_index in range(max_index, len(y_vals)):
-                    if y_vals[ao_val_index] < threshold:
-                        cut_off_distances.append(x_vals[ao_val_index])
-                        break
-
-                # If the threshold is never reached, the maximum distance (1.e300) is used
-                else:
-                    cut_off_distances.append(maximum_distance)
-
-                # If the molecular orbital coefficients of the shell are zero, the cutoff distance is set to zero
-                if mo_coeff_basis_function == 0.0:
-                    cut_off_distances[-1] = 0.0
-
-                mo_coeff_basis_function = 0
-
-        return np.array(cut_off_distances, dtype=np.float64)
+        # The highest weight for each shell is determined for use in the calculation of the cutoffs
+        shell_weights = np.maximum.reduceat(
+            np.asarray(weights, dtype=np.float64)[: shell_starts[-1, 1]],
+            shell_starts[:, 0],
+        )
+
+        # The cutoff distance is determined by the first point below the threshold after crossing the maximum of the
+        # atomic orbital
+        below_threshold = envelopes * shell_weights[:, np.newaxis] < threshold
+        below_threshold &= np.arange(len(x_vals)) >= max_indices[:, np.newaxis]
+        cut_off_distances = np.where(
+            below_threshold.any(axis=1),
+            x_vals[np.argmax(below_threshold, axis=1)],
+            maximum_distance,
+        )
+
+        # If the weights of the shell are zero, the cutoff distance is set to zero
+        cut_off_distances[shell_weights == 0.0] = 0.0
+        return cut_off_distances
+
+    def calculate_shell_envelopes(
+        self,
+        basis_functions: PackedBasisSet | list[BasisFunction],
+        max_distance: float,
+        max_points_number: int,
+    ) -> tuple[NDArray, NDArray, NDArray, NDArray]:
+        """Calculate the radial envelopes of all shells, which are used to determine the cutoff distances.
+
+        Only one function per shell is evaluated, because all functions are evaluated at the same distance for each
+        shell. It is the most diffuse atomic orbital of the shell (the last one, e.g., pz or dyz), in order to use the
+        worst case scenario for the cutoffs. The envelope is the absolute value of the radial part times the highest
+        order x function, sampled along the x direction, to make sure to never underestimate the value of the atomic
+        orbital. The result is cached for the last basis set and sampling.
+
+        :param basis_functions: packed basis set or list of all basis functions of the molecule
+        :param max_distance: float: maximum distance for the cutoff distance calculation
+        :param max_points_number: int: number of sample points for the cutoff distance calculation
+        :return: sample points, index of the first and one past the last basis function of each shell, envelopes of
+            the shells (shells x sample points) and index of the maximum of each envelope
+        """
+        cache_key = (max_distance, max_points_number, len(basis_functions))
+        if self.shell_envelopes_cache is not None:
+            cached_basis_functions, cached_key, cached_envelopes = self.shell_envelopes_cache
+            if cached_basis_functions is basis_functions and cached_key == cache_key:
+                return cached_envelopes
+
+        basis_set = pack_basis_set(basis_functions)
+        x_vals = np.linspace(0, max_distance, max_points_number)
+        shell_starts = np.stack((basis_set.shell_offsets[:-1], basis_set.shell_offsets[1:]), axis=1)
+
+        # The primitives are padded with zero coefficients to evaluate all shells at once
+        radial = np.einsum(
+            "sp,spx->sx",
+            basis_set.shell_envelope_prefactors,
+            np.exp(-basis_set.shell_exponents[:, :, np.newaxis] * x_vals),
+        )
+        envelopes = np.abs(radial * x_vals ** basis_set.shell_types[:, np.newaxis])
+        max_indices = np.argmax(envelopes, axis=1) if basis_set.number_of_shells > 0 else np.zeros(0, dtype=np.int64)
+
+        result = (x_vals, shell_starts, envelopes, max_indices)
+        self.shell_envelopes_cache = (basis_functions, cache_key, result)
+        return result
+
+    def calculate_density_matrix(self, spin: int | None = None, spherical: bool = False) -> NDArray:
+        """Calculate the density matrix in the cartesian basis of the atomic orbitals.
+
+        :param spin: int | None: 1 for the alpha, -1 for the beta and None for the total density matrix. For restricted
+            orbitals, the alpha and beta density matrices are half of the total density matrix
+        :param spherical: bool: if true, calculate the density matrix in the basis of the spherical harmonics
+        :return: density matrix sum_i n_i C_mu,i C_nu,i
+        """
+        occupations = np.array(self.occupations, dtype=np.float64)
+        spins = np.array(self.spins)
+        if spin is not None:
+            occupations = np.where(spins == spin, occupations, 0.0) if -1 in spins else occupations / 2
+
+        # Only the occupied orbitals contribute to the density matrix
+        occupied = occupations != 0.0
+        coefficients = (self.coefficients_spherical if spherical else self.coefficients)[:, occupied]
+        return np.dot(coefficients * occupations[occupied], coefficients.T)
+
+    def calculate_spin_density_matrix(self, spherical: bool = False) -> NDArray:
+        """Calculate the difference of the alpha and beta density matrices.
+
+        :param spherical: bool: if true, calculate the density matrix in the basis of the spherical harmonics
+        :return: spin density matrix in the cartesian basis of the atomic orbitals
+        """
+        return self.calculate_density_matrix(1, spherical) - self.calculate_density_matrix(-1, spherical)
+
+    @property
+    def has_spherical_coefficients(self) -> bool:
+        """Return whether the coefficients were given for spherical harmonics, so they can be evaluated directly."""
+        return self.coefficients_spherical.size > 0
 
     def set_mo_coefficients(
         self,
@@ -168,7 +297,7 @@ class MolecularOrbitals:
         if spherical_order == "none":
             self.coefficients = self.coefficients_display
         elif spherical_order == "molden":
-            self.calculate_transformation_matrix()
+            self.calculate_transformation_blocks()
             self.coefficients_spherical = mo_coefficients
             self.coefficients = self.spherical_to_cartesian_transformation(
                 mo_coefficients,
@@ -180,7 +309,7 @@ class MolecularOrbitals:
     def get_mo_value(
         self,
         index: int,
-        aos: list[BasisFunction],
+        aos: PackedBasisSet | list[BasisFunction],
         electron_position: NDArray,
     ) -> float:
         """Calculate the value of one mo for a given electron position. Cartesian only!.
@@ -188,67 +317,26 @@ class MolecularOrbitals:
         It is a slow method and should be used only for testing purposes. It wraps the cython function.
 
         :param index: index of the mo
-        :param aos: list of all the aos
+        :param aos: packed basis set or list of all the aos
         :param electron_position: position of the electron in angstrom
         :return: value of the mo
         """
-        s = 0
-        p = 1
-        d = 2
-        f = 3
-        g = 4
-
-        max_length = 0
-        for ao in aos:
-            len_ao = len(ao.exponents)
-            max_length = max(len_ao, max_length)
-        basis_set_exponents = np.zeros((len(aos), max_length), dtype=np.float64)
-        basis_set_coefficients = np.zeros((len(aos), max_length), dtype=np.float64)
-        basis_set_norms = np.zeros((len(aos), max_length), dtype=np.float64)
-        basis_set_ijk = np.zeros((len(aos), 3), dtype=np.int64)
-        basis_set_position = np.zeros((len(aos), 3), dtype=np.float64)
-
-        skip_shells = 0
-        shells = []
-
-        for ao_index, ao in enumerate(aos):
-            basis_set_exponents[ao_index, : len(ao.exponents)] = ao.exponents
-            basis_set_coefficients[ao_index, : len(ao.coefficients)] = ao.coefficients
-            basis_set_norms[ao_index, : len(ao.norms)] = ao.norms
-            basis_set_ijk[ao_index, :] = ao.ijk
-            basis_set_position[ao_index, :] = ao.position * ANGSTROM_TO_BOHR
-            if skip_shells == 0:
-                if sum(ao.ijk) == s:
-                    shells.append(s)
-                elif sum(ao.ijk) == p:
-                    shells.append(p)
-                    skip_shells = 2
-                elif sum(ao.ijk) == d:
-                    shells.append(d)
-                    skip_shells = 5
-                elif sum(ao.ijk) == f:
-                    shells.append(f)
-                    skip_shells = 9
-                elif sum(ao.ijk) == g:
-                    shells.append(g)
-                    skip_shells = 14
-            else:
-                skip_shells -= 1
-
-        new_shells = np.array(shells, dtype=np.int64)
-        cut_off_distances = np.zeros_like(new_shells, dtype=np.float64)
-        cut_off_distances[:] = 100.0
+        basis_set = pack_basis_set(aos)
+        if basis_set.spherical:
+            basis_set = PackedBasisSet(basis_set.basis_functions)
+        cut_off_distances = np.full(basis_set.number_of_shells, 100.0, dtype=np.float64)
 
         mo_coefficients = np.array(self.coefficients[:, index], dtype=np.float64)
         aos_values = np.zeros(len(mo_coefficients), dtype=np.float64)
         electron_position = np.array(electron_position, dtype=np.float64) * ANGSTROM_TO_BOHR
         return calculate_mo_cartesian(
             electron_position,
-            basis_set_position,
-            basis_set_coefficients,
-            basis_set_exponents,
-            basis_set_norms,
-            new_shells,
+            basis_set.shell_positions,
+            basis_set.shell_coefficients,
+            basis_set.shell_exponents,
+            basis_set.shell_norms,
+            basis_set.shell_types,
+            basis_set.shell_offsets,
             mo_coefficients,
             aos_values,
             cut_off_distances,
@@ -424,79 +512,73 @@ class MolecularOrbitals:
         # sqrt(7) is taken into account when calculating the aos values
         transformation_g[g4s, gyyyx] = np.sqrt(5) / 2
         self.t_sc_g = transformation_g
+        self.transformation_blocks = [np.eye(1), np.eye(3), self.t_sc_d, self.t_sc_f, self.t_sc_g]
 
-    def calculate_transformation_matrix(self) -> None:  # noqa: C901 PLR0912
-        """Calculate the transformation matrix for the spherical to cartesian transformation.
+    def calculate_transformation_blocks(self) -> None:
+        """Calculate the shells of the block diagonal transformation from spherical harmonics to cartesian functions.
 
-        Uses the matrices generated before to build the transformation matrix as a block diagonal matrix. This matrix
-        enable the transformation from spherical harmonics to cartesian. It is not a square matrix if l>1!
+        The transformation matrix is block diagonal with one block per shell, which is the identity for s and p shells
+        and one of the matrices generated before for d, f and g shells. Instead of the dense matrix, only the angular
+        momenta and the offsets of the shells in the spherical and the cartesian basis are stored, so that the
+        transformation is applied to the shells of each angular momentum at once.
         """
-        # Get the number of basis functions
-        d_count = 0
-        f_count = 0
-        g_count = 0
+        orbital_keys = {"s": 0, "px": 1, "dxx": 2, "fxxx": 3, "gxxxx": 4}
+        angular_momenta = []
         number_of_cartesian_basis_functions = 0
-        orbital_keys_dfg = ["dxx", "fxxx", "gxxxx"]
-        orbital_keys_sp = ["s", "px"]
-        basis_functions_block_list = []
         for atom_basis in self.basis_functions:
             for basis_function in atom_basis:
                 number_of_cartesian_basis_functions += 1
-                for key_dfg in orbital_keys_dfg:
-                    if key_dfg in basis_function:
-                        if key_dfg == "dxx":
-                            basis_functions_block_list.append("d")
-                            d_count += 1
-                        elif key_dfg == "fxxx":
-                            basis_functions_block_list.append("f")
-                            f_count += 1
-                        elif key_dfg == "gxxxx":
-                            basis_functions_block_list.append("g")
-                            g_count += 1
-                for key_sp in orbital_keys_sp:
-                    if key_sp in basis_function:
-                        if key_sp == "s":
-                            basis_functions_block_list.append("s")
-                        elif key_sp == "px":
-                            basis_functions_block_list.append("p")
-
-        number_of_spherical_basis_functions = number_of_cartesian_basis_functions - (
-            d_count * 1 + f_count * 3 + g_count * 6
+                # The label of the first function of each shell starts with one of the keys
+                for key, angular_momentum in orbital_keys.items():
+                    if basis_function.startswith(key):
+                        angular_momenta.append(angular_momentum)
+
+        self.shell_angular_momenta = np.array(angular_momenta, dtype=np.int64)
+        self.shell_spherical_offsets = np.concatenate(([0], np.cumsum(2 * self.shell_angular_momenta + 1)))
+        self.shell_cartesian_offsets = np.concatenate(
+            ([0], np.cumsum((self.shell_angular_momenta + 1) * (self.shell_angular_momenta + 2) // 2)),
         )
+        if self.shell_cartesian_offsets[-1] != number_of_cartesian_basis_functions:
+            msg = "The basis functions are not ordered by complete shells."
+            raise ValueError(msg)
 
-        # Allocate the transformation matrix
-        transformation_matrix = np.zeros(
-            (number_of_spherical_basis_functions, number_of_cartesian_basis_functions),
-        )
+    def transform_spherical_to_cartesian(self, values: NDArray, transpose: bool = False) -> NDArray:
+        """Apply the transposed transformation matrix to the first axis of an array, shell block by shell block.
+
+        For each angular momentum, the blocks of the values of all its shells are gathered and multiplied with the
+        transformation block at once.
+
+        :param values: array with one entry per spherical basis function along the first axis
+        :param transpose: if true, apply the transformation matrix itself to an array with one entry per cartesian basis
+            function, i.e., transform from cartesian to spherical functions
+        :return: array with one entry per cartesian (spherical, if transposed) basis function along the first axis
+        """
+        input_offsets, output_offsets = self.shell_spherical_offsets, self.shell_cartesian_offsets
+        if transpose:
+            input_offsets, output_offsets = output_offsets, input_offsets
+        if values.shape[0] != input_offsets[-1]:
+            msg = "The number of basis functions does not match between the transformation and the values."
+            raise ValueError(msg)
 
-        # Fill the transformation matrix as a block diagonal matrix
-        i_index = 0
-        j_index = 0
-        for block in basis_functions_block_list:
-            if block == "s":
-                transformation_matrix[i_index, j_index] = 1
-                i_index += 1
-                j_index += 1
-            elif block == "p":
-                transformation_matrix[i_index : i_index + 3, j_index : j_index + 3] = np.array(
-                    [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
-                )
-                i_index += 3
-                j_index += 3
-            elif block == "d":
-                transformation_matrix[i_index : i_index + 5, j_index : j_index + 6] = self.t_sc_d
-                i_index += 5
-                j_index += 6
-            elif block == "f":
-                transformation_matrix[i_index : i_index + 7, j_index : j_index + 10] = self.t_sc_f
-                i_index += 7
-                j_index += 10
-            elif block == "g":
-                transformation_matrix[i_index : i_index + 9, j_index : j_index + 15] = self.t_sc_g
-                i_index += 9
-                j_index += 15
-
-        self.transformation_matrix_spherical_cartesian = transformation_matrix
+        transformed = np.zeros((output_offsets[-1], *values.shape[1:]), dtype=np.float64)
+        for angular_momentum, block in enumerate(self.transformation_blocks):
+            shells = np.flatnonzero(self.shell_angular_momenta == angular_momentum)
+            if shells.size == 0:
+                continue
+            matrix = block if transpose else block.T
+            input_indices = input_offsets[shells, np.newaxis] + np.arange(matrix.shape[1])
+            output_indices = output_offsets[shells, np.newaxis] + np.arange(matrix.shape[0])
+            transformed[output_indices] = np.einsum("ij,sj...->si...", matrix, values[input_indices])
+        return transformed
+
+    def project_to_spherical(self, matrix: NDArray) -> NDArray:
+        """Project a matrix in the cartesian basis to the spherical basis, e.g., the overlap matrix.
+
+        :param matrix: matrix in the cartesian basis (number of cartesian x number of cartesian basis functions)
+        :return: T M T^T in the spherical basis (number of spherical x number of spherical basis functions)
+        """
+        half_projected = self.transform_spherical_to_cartesian(matrix, transpose=True)
+        return self.transform_spherical_to_cartesian(half_projected.T, transpose=True).T
 
     def spherical_to_cartesian_transformation(
         self,
@@ -508,23 +590,7 @@ class MolecularOrbitals:
         :return: NDArray: cartesian coefficients
         """
         # Only works if the number of MOS is correct, i.e. not for truncated molden files...
-        number_of_spherical_basis_functions_mos, number_of_mos = mo_coefficients.shape
-        number_of_spherical_basis_functions_transformation = self.transformation_matrix_spherical_cartesian.shape[0]
-        if number_of_spherical_basis_functions_transformation != number_of_spherical_basis_functions_mos:
-            msg = (
-                "The number of spherical basis functions does not match between the transformation matrix and"
-                " MO coefficients."
-            )
+        if mo_coefficients.ndim != 2:  # noqa: PLR2004
+            msg = "The MO coefficients must be a matrix with one column per MO."
             raise ValueError(msg)
-
-        number_of_cartesian_basis_functions = self.transformation_matrix_spherical_cartesian.shape[1]
-
-        new_coefficients = np.zeros(
-            (number_of_cartesian_basis_functions, number_of_mos),
-        )
-        for i in range(number_of_mos):
-            new_coefficients[:, i] = np.dot(
-                mo_coefficients[:, i],
-                self.transformation_matrix_spherical_cartesian,
-            )
-        return np.array(new_coefficients, dtype=np.float64)
+        return self.transform_spherical_to_cartesian(mo_coefficients)
@@ -7,6 +7,7 @@ from typing import TYPE_CHECKING
 import numpy as np
 
 from molara.eval.voxel_grid import VoxelGrid3D
+from molara.structure.basisset import PackedBasisSet
 from molara.structure.molecularorbitals import MolecularOrbitals
 from molara.structure.structure import Structure
 
@@ -42,6 +43,9 @@ class Molecule(Structure):
         self.subdivisions = 20
         self.gen_energy_information(header)
         self.basis_set: list = []
+        # The basis set packed shell by shell for the orbital kernels, packed again only after the atoms have moved
+        self.packed_basis_set: PackedBasisSet | None = None
+        self.packed_spherical_basis_set: PackedBasisSet | None = None
         self.voxel_grid = VoxelGrid3D()
         super().__init__(atomic_numbers, coordinates, draw_bonds)
 
@@ -54,6 +58,23 @@ class Molecule(Structure):
             for basis_function in atom.basis_set.basis_functions.values():
                 if basis_function is not None:
                     self.basis_set.append(basis_function)
+        self.packed_basis_set = None
+        self.packed_spherical_basis_set = None
+
+    def get_packed_basis_set(self, spherical: bool = False) -> PackedBasisSet:
+        """Return the basis set packed shell by shell, which is packed once and kept until the atoms move.
+
+        :param spherical: if true, return the basis set of the spherical harmonics of the shells, in the order of the
+            spherical coefficients of the molecular orbitals
+        :return: packed basis set
+        """
+        if spherical:
+            if self.packed_spherical_basis_set is None:
+                self.packed_spherical_basis_set = PackedBasisSet(self.basis_set, self.mos.transformation_blocks)
+            return self.packed_spherical_basis_set
+        if self.packed_basis_set is None:
+            self.packed_basis_set = PackedBasisSet(self.basis_set)
+        return self.packed_basis_set
 
     def center_coordinates(self: Molecule) -> None:
         """Centers the structure around the center of mass."""
@@ -0,0 +1,117 @@
+"""Least recently used cache, whose entries are limited by their total size in bytes."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from molara.eval.voxel_grid import VoxelGrid
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+def size_in_bytes(value: object) -> int:
+    """Return the number of bytes of the arrays contained in a value.
+
+    Arrays, voxel grids and (nested) tuples, lists and dicts of them are counted, all other objects are neglected.
+
+    :param value: value to measure
+    :return: number of bytes
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, VoxelGrid):
+        return size_in_bytes(value.grid)
+    if isinstance(value, tuple | list):
+        return sum(size_in_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(size_in_bytes(item) for item in value.values())
+    return 0
+
+
+class LRUCache:
+    """Least recently used cache, whose entries are limited by their total size in bytes.
+
+    If adding an entry exceeds the byte budget, the least recently used entries are removed until the budget is met
+    again. Entries that are larger than the whole budget are not stored at all.
+    """
+
+    def __init__(self, byte_budget: int) -> None:
+        """Initialize an empty cache.
+
+        :param byte_budget: maximal total size of the entries in bytes
+        """
+        self.entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self.size_in_bytes = 0
+        self._byte_budget = byte_budget
+
+    @property
+    def byte_budget(self) -> int:
+        """Return the maximal total size of the entries in bytes."""
+        return self._byte_budget
+
+    @byte_budget.setter
+    def byte_budget(self, byte_budget: int) -> None:
+        """Set the maximal total size of the entries in bytes and remove entries exceeding it.
+
+        :param byte_budget: maximal total size of the entries in bytes
+        """
+        self._byte_budget = byte_budget
+        self.evict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Check if the cache contains an entry, without marking it as used."""
+        return key in self.entries
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self.entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:  # noqa: ANN401
+        """Return an entry and mark it as the most recently used one.
+
+        :param key: key of the entry
+        :param default: value returned if the entry does not exist
+        :return: the entry or the default value
+        """
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key: Hashable, value: object) -> None:
+        """Add an entry as the most recently used one, replacing an existing entry with the same key.
+
+        :param key: key of the entry
+        :param value: value of the entry
+        """
+        self.remove(key)
+        size = size_in_bytes(value)
+        if size > self.byte_budget:
+            return
+        self.entries[key] = (value, size)
+        self.size_in_bytes += size
+        self.evict()
+
+    def remove(self, key: Hashable) -> None:
+        """Remove an entry, if it exists.
+
+        :param key: key of the entry
+        """
+        if key in self.entries:
+            self.size_in_bytes -= self.entries.pop(key)[1]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self.entries.clear()
+        self.size_in_bytes = 0
+
+    def evict(self) -> None:
+        """Remove the least recently used entries, until the total size is within the byte budget."""
+        while self.size_in_bytes > self.byte_budget and self.entries:
+            self.size_in_bytes -= self.entries.popitem(last=False)[1][1]
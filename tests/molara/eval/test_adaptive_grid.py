@@ -0,0 +1,235 @@
+"""Test the coarse-to-fine evaluation of voxel grids."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+import pytest
+from molara.eval.generate_voxel_grid import generate_voxel_grids
+
+from molara.eval.adaptive_grid import (
+    coarse_grid_parameters,
+    generate_voxel_grids_in_chunks,
+    interpolate_coarse_grid,
+    refine_voxel_grids,
+    refinement_mask,
+)
+from molara.structure.io.importer import GeneralImporter
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestAdaptiveGrid(TestCase):
+    """Test the coarse-to-fine evaluation of voxel grids."""
+
+    def setUp(self) -> None:
+        """Load a molecule with molecular orbitals and set up a grid."""
+        molecule = GeneralImporter("examples/molden/h2o.molden").load().mols[0]
+        self.mos = molecule.mos
+        self.aos = molecule.basis_set
+        self.orbitals = [3, 4]
+        self.origin = np.array([-2.5, -2.4, -2.6], dtype=np.float64)
+        self.voxel_size = np.eye(3, dtype=np.float64) * 0.1
+        self.voxel_count = np.array([50, 47, 53], dtype=np.int64)
+        self.cut_offs = self.mos.calculate_cut_offs(self.aos, self.orbitals, threshold=1e-6, max_distance=30.0)
+        self.coefficients = self.mos.coefficients[:, self.orbitals]
+
+    def test_coarse_grid_parameters(self) -> None:
+        """Test that the coarse grid covers the fine grid."""
+        voxel_size, voxel_count = coarse_grid_parameters(self.voxel_size, self.voxel_count, 4)
+        np.testing.assert_allclose(voxel_size, self.voxel_size * 4)
+        np.testing.assert_array_equal(voxel_count, [14, 13, 14])
+        assert np.all((voxel_count - 1) * 4 >= self.voxel_count - 1)
+        with pytest.raises(ValueError, match="The coarsening factor must be a positive integer"):
+            coarse_grid_parameters(self.voxel_size, self.voxel_count, 0)
+
+    def test_interpolation(self) -> None:
+        """Test that a linear function is interpolated exactly and the coarse points are kept."""
+        coarse_voxel_count = coarse_grid_parameters(self.voxel_size, self.voxel_count, 3)[1]
+        indices = np.indices(coarse_voxel_count) * 3.0
+        coarse_grid = 0.5 * indices[0] - 0.25 * indices[1] + indices[2]
+        grid = interpolate_coarse_grid(coarse_grid, self.voxel_count, 3)
+        indices = np.indices(self.voxel_count)
+        np.testing.assert_allclose(grid, 0.5 * indices[0] - 0.25 * indices[1] + indices[2], atol=1e-12)
+
+    def test_mask(self) -> None:
+        """Test that only the masked points of a grid are evaluated."""
+        mask = np.zeros(self.voxel_count, dtype=bool)
+        mask[10:20, 5:40, 3:45] = True
+        mask[30, 30, ::7] = True
+        grids = generate_voxel_grids(
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+            2,
+            mask,
+        )
+        grids_full = generate_voxel_grids(
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+        )
+        np.testing.assert_allclose(grids, np.where(mask, grids_full, 0.0), rtol=0.0, atol=1e-14)
+        with pytest.raises(ValueError, match="The mask must have the shape of the voxel grid"):
+            generate_voxel_grids(
+                self.origin,
+                self.voxel_size,
+                self.voxel_count,
+                self.aos,
+                self.coefficients,
+                self.cut_offs,
+                1,
+                mask[1:],
+            )
+
+    def test_chunks(self) -> None:
+        """Test that the grids evaluated in chunks of slabs are exact and stop, when they are cancelled."""
+        voxel_size = np.array([[0.1, 0.02, 0.0], [0.0, 0.1, 0.0], [0.01, 0.0, 0.1]], dtype=np.float64)
+        voxel_count = np.array([21, 17, 19], dtype=np.int64)
+        mask = np.zeros(voxel_count, dtype=bool)
+        mask[5:15, 3:, ::2] = True
+        for dtype in [np.float64, np.float32]:
+            grids = generate_voxel_grids(
+                self.origin,
+                voxel_size,
+                voxel_count,
+                self.aos,
+                self.coefficients,
+                self.cut_offs,
+                2,
+                mask,
+                dtype,
+            )
+            chunked_grids = generate_voxel_grids_in_chunks(
+                self.origin,
+                voxel_size,
+                voxel_count,
+                self.aos,
+                self.coefficients,
+                self.cut_offs,
+                2,
+                mask,
+                dtype,
+                slabs_per_chunk=4,
+            )
+            assert chunked_grids.dtype == grids.dtype
+            np.testing.assert_allclose(chunked_grids, grids, rtol=1e-6 if dtype == np.float32 else 1e-12, atol=0.0)
+
+        # The evaluation stops at the first chunk after the calculation has been cancelled
+        checks = []
+
+        def cancel_in_second_chunk() -> None:
+            checks.append(len(checks))
+            if len(checks) == 2:  # noqa: PLR2004
+                msg = "Cancelled"
+                raise RuntimeError(msg)
+
+        with pytest.raises(RuntimeError, match="Cancelled"):
+            generate_voxel_grids_in_chunks(
+                self.origin,
+                voxel_size,
+                voxel_count,
+                self.aos,
+                self.coefficients,
+                self.cut_offs,
+                check_cancelled=cancel_in_second_chunk,
+            )
+        assert len(checks) == 2  # noqa: PLR2004
+
+    def test_refined_grids(self) -> None:
+        """Test that the refined grids are exact around the isosurfaces and only partially evaluated."""
+        iso_value = 0.05
+        coarse_voxel_size, coarse_voxel_count = coarse_grid_parameters(self.voxel_size, self.voxel_count, 4)
+        coarse_grids = generate_voxel_grids(
+            self.origin,
+            coarse_voxel_size,
+            coarse_voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+        )
+        grids, refined_points = refine_voxel_grids(
+            coarse_grids,
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+            iso_value,
+        )
+        grids_full = generate_voxel_grids(
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+        )
+        assert grids.shape == grids_full.shape
+        np.testing.assert_allclose(coarse_grids[:, :2, :3, :4], grids_full[:, :5:4, :9:4, :13:4], atol=1e-14)
+
+        # Every voxel whose corners enclose an iso value is evaluated exactly
+        mask = refinement_mask(coarse_grids, self.voxel_count, 4, iso_value)
+        np.testing.assert_array_equal(refined_points, mask)
+        for level in (iso_value, -iso_value):
+            above = grids_full >= level
+            crossed = np.zeros(above.shape, dtype=bool)
+            crossed[:, :-1] |= above[:, :-1] != above[:, 1:]
+            crossed[:, :, :-1] |= above[:, :, :-1] != above[:, :, 1:]
+            crossed[:, :, :, :-1] |= above[:, :, :, :-1] != above[:, :, :, 1:]
+            assert np.all(mask[np.any(crossed, axis=0)])
+            np.testing.assert_allclose(grids[crossed], grids_full[crossed], rtol=0.0, atol=1e-14)
+        max_refined_fraction = 0.5
+        assert np.mean(mask) < max_refined_fraction
+
+        # Another iso value only evaluates the points which are not exact yet, the given grids are kept
+        other_iso_value = 0.01
+        other_grids, other_refined_points = refine_voxel_grids(
+            coarse_grids,
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+            other_iso_value,
+            grids=grids,
+            refined_points=refined_points,
+        )
+        np.testing.assert_array_equal(
+            other_refined_points,
+            mask | refinement_mask(coarse_grids, self.voxel_count, 4, other_iso_value),
+        )
+        assert np.count_nonzero(other_refined_points) > np.count_nonzero(refined_points)
+        np.testing.assert_allclose(
+            other_grids[:, other_refined_points],
+            grids_full[:, other_refined_points],
+            rtol=0.0,
+            atol=1e-14,
+        )
+        np.testing.assert_array_equal(other_grids[:, ~other_refined_points], grids[:, ~other_refined_points])
+        np.testing.assert_array_equal(refined_points, mask)
+
+        # Grids which are already exact around the isosurfaces are returned unchanged
+        same_grids, same_refined_points = refine_voxel_grids(
+            coarse_grids,
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.coefficients,
+            self.cut_offs,
+            iso_value,
+            grids=other_grids,
+            refined_points=other_refined_points,
+        )
+        assert same_grids is other_grids
+        assert same_refined_points is other_refined_points
@@ -0,0 +1,126 @@
+"""Test the calculation of electron density and spin density grids."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+import pytest
+from molara.eval.generate_voxel_grid import generate_density_grid, generate_voxel_grids
+
+from molara.eval.density import calculate_electron_density, calculate_spin_density
+from molara.structure.io.importer import GeneralImporter
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestDensity(TestCase):
+    """Test the calculation of electron density and spin density grids."""
+
+    def setUp(self) -> None:
+        """Set up a small grid around the molecules."""
+        self.origin = np.array([-2.5, -2.4, -2.3], dtype=np.float64)
+        self.voxel_size = np.eye(3, dtype=np.float64) * 0.25
+        self.voxel_number = np.array([20, 19, 18], dtype=np.int64)
+
+    def _orbital_grids(self, file_path: str) -> tuple:
+        """Calculate the grids of all occupied orbitals of a molecule without screening."""
+        molecule = GeneralImporter(file_path).load().mols[0]
+        occupations = np.array(molecule.mos.occupations)
+        occupied = np.nonzero(occupations)[0]
+        cut_offs = np.full(len(molecule.basis_set), 1.0e300)
+        grids = generate_voxel_grids(
+            self.origin,
+            self.voxel_size,
+            self.voxel_number,
+            molecule.basis_set,
+            molecule.mos.coefficients[:, occupied],
+            cut_offs,
+        )
+        return molecule, occupied, grids
+
+    def test_electron_density(self) -> None:
+        """Test that the density is the sum of the squared occupied orbitals."""
+        molecule, occupied, grids = self._orbital_grids("examples/molden/h2o.molden")
+        occupations = np.array(molecule.mos.occupations)[occupied]
+        reference = np.einsum("o,oijk->ijk", occupations, grids**2)
+
+        voxel_grid = calculate_electron_density(
+            molecule,
+            self.origin,
+            self.voxel_size,
+            self.voxel_number,
+            threshold=1e-7,
+            number_of_threads=2,
+        )
+        assert voxel_grid.is_initialized
+        np.testing.assert_array_equal(voxel_grid.voxel_number, self.voxel_number)
+        np.testing.assert_allclose(voxel_grid.grid, reference, rtol=0.0, atol=1e-6)
+
+        # The spin density of a restricted calculation vanishes
+        spin_density = calculate_spin_density(molecule, self.origin, self.voxel_size, self.voxel_number)
+        np.testing.assert_array_equal(spin_density.grid, 0.0)
+
+    def test_spin_density(self) -> None:
+        """Test the spin density of an unrestricted calculation."""
+        molecule, occupied, grids = self._orbital_grids("examples/molden/o2.molden")
+        occupations = np.array(molecule.mos.occupations)[occupied]
+        spins = np.array(molecule.mos.spins)[occupied]
+        reference = np.einsum("o,oijk->ijk", occupations * spins, grids**2)
+
+        voxel_grid = calculate_spin_density(
+            molecule,
+            self.origin,
+            self.voxel_size,
+            self.voxel_number,
+            threshold=1e-7,
+        )
+        np.testing.assert_allclose(voxel_grid.grid, reference, rtol=0.0, atol=1e-6)
+
+    def test_full_rank_density_matrix(self) -> None:
+        """Test a density matrix of full rank, which is evaluated from the blocks of the density matrix."""
+        molecule = GeneralImporter("examples/molden/h2o.molden").load().mols[0]
+        aos = molecule.basis_set
+        rng = np.random.default_rng(42)
+        factors = rng.uniform(-0.5, 0.5, (len(aos), len(aos)))
+        cut_offs = np.full(len(aos), 1.0e300)
+
+        grid = generate_density_grid(
+            self.origin,
+            self.voxel_size,
+            self.voxel_number,
+            aos,
+            np.dot(factors, factors.T),
+            cut_offs,
+            2,
+        )
+        grids = generate_voxel_grids(self.origin, self.voxel_size, self.voxel_number, aos, factors, cut_offs)
+        np.testing.assert_allclose(grid, np.sum(grids**2, axis=0), rtol=1e-10, atol=1e-12)
+
+    def test_screened_blocks(self) -> None:
+        """Test density matrices of full and low rank on a grid whose blocks are reached by only some of the shells."""
+        molecule = GeneralImporter("examples/molden/caffeine.molden").load().mols[0]
+        aos = molecule.basis_set
+        origin = np.array([-5.0, -4.5, -2.0], dtype=np.float64)
+        voxel_size = np.eye(3, dtype=np.float64) * 0.2
+        voxel_number = np.array([48, 42, 20], dtype=np.int64)
+        rng = np.random.default_rng(7)
+        cut_offs = np.full(len(aos), 2.0)
+        for rank in [len(aos), 2]:
+            factors = rng.uniform(-0.5, 0.5, (len(aos), rank))
+            grid = generate_density_grid(origin, voxel_size, voxel_number, aos, np.dot(factors, factors.T), cut_offs, 2)
+            grids = generate_voxel_grids(origin, voxel_size, voxel_number, aos, factors, cut_offs)
+            np.testing.assert_allclose(grid, np.sum(grids**2, axis=0), rtol=1e-10, atol=1e-12)
+
+    def test_density_matrix_size(self) -> None:
+        """Test that density matrices of the wrong size are rejected."""
+        molecule = GeneralImporter("examples/molden/h2o.molden").load().mols[0]
+        with pytest.raises(ValueError, match="The density matrix must be a square matrix"):
+            generate_density_grid(
+                self.origin,
+                self.voxel_size,
+                self.voxel_number,
+                molecule.basis_set,
+                np.eye(3),
+                np.zeros(3),
+            )
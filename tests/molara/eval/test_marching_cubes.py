@@ -0,0 +1,309 @@
+"""Test the calculation of isosurfaces with marching cubes."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+from molara.eval.marchingcubes import (
+    calculate_block_ranges,
+    count_marching_cubes,
+    extract_isosurface_levels,
+    extract_isosurfaces,
+    marching_cubes,
+    marching_cubes_indexed,
+)
+
+from molara.eval.voxel_grid import VoxelGrid3D
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestMarchingCubes(TestCase):
+    """Test the calculation of isosurfaces with marching cubes."""
+
+    def setUp(self) -> None:
+        """Set up a grid of a function with a positive and a negative lobe."""
+        self.voxel_number = np.array([23, 19, 27], dtype=np.int64)
+        self.origin = np.array([-3.0, -3.0, -3.0], dtype=np.float64)
+        self.voxel_size = np.diag(6.0 / (self.voxel_number - 1))
+        x, y, z = np.meshgrid(
+            *[self.origin[i] + self.voxel_size[i, i] * np.arange(self.voxel_number[i]) for i in range(3)],
+            indexing="ij",
+        )
+        self.grid = x * np.exp(-(x**2 + y**2 + z**2) / 2) + 0.3 * np.exp(-((x - 1) ** 2 + y**2 + (z + 1) ** 2))
+        self.iso_value = 0.05
+
+    def _calculate_triangle_soups(
+        self,
+        grid: np.ndarray | None = None,
+        origin: np.ndarray | None = None,
+        voxel_size: np.ndarray | None = None,
+        voxel_number: np.ndarray | None = None,
+        iso_value: float | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Calculate the surfaces as triangle soups, with one row (x, y, z, nx, ny, nz) per triangle corner.
+
+        The grid and its parameters default to the ones set up for the tests.
+        """
+        grid = self.grid if grid is None else grid
+        voxel_number = self.voxel_number if voxel_number is None else voxel_number
+        max_vertices = 24 * int(np.prod(voxel_number - 1)) * 6 + 1
+        vertices_1 = np.zeros(max_vertices, dtype=np.float32)
+        vertices_2 = np.zeros(max_vertices, dtype=np.float32)
+        marching_cubes(
+            grid,
+            self.iso_value if iso_value is None else iso_value,
+            self.origin if origin is None else origin,
+            self.voxel_size if voxel_size is None else voxel_size,
+            voxel_number,
+            vertices_1,
+            vertices_2,
+        )
+        return (
+            vertices_1[: int(vertices_1[-1])].reshape(-1, 6),
+            vertices_2[: int(vertices_2[-1])].reshape(-1, 6),
+        )
+
+    def test_indexed_surfaces(self) -> None:
+        """Test that the indexed surfaces contain the triangles of the triangle soups with shared vertices."""
+        max_vertices = 18 * int(np.prod(self.voxel_number))
+        max_indices = 15 * int(np.prod(self.voxel_number - 1))
+        vertices_1 = np.zeros(max_vertices, dtype=np.float32)
+        vertices_2 = np.zeros(max_vertices, dtype=np.float32)
+        indices_1 = np.zeros(max_indices, dtype=np.uint32)
+        indices_2 = np.zeros(max_indices, dtype=np.uint32)
+        counts = marching_cubes_indexed(
+            self.grid,
+            self.iso_value,
+            self.origin,
+            self.voxel_size,
+            self.voxel_number,
+            vertices_1,
+            indices_1,
+            vertices_2,
+            indices_2,
+        )
+
+        soups = self._calculate_triangle_soups()
+        meshes = [
+            (vertices_1[: counts[0]].reshape(-1, 6), indices_1[: counts[1]]),
+            (vertices_2[: counts[2]].reshape(-1, 6), indices_2[: counts[3]]),
+        ]
+        for soup, (vertices, indices) in zip(soups, meshes, strict=True):
+            assert soup.shape[0] > 0
+            np.testing.assert_array_equal(vertices[indices], soup)
+            # Each vertex is stored only once
+            assert np.unique(vertices[:, :3], axis=0).shape[0] == vertices.shape[0]
+            assert vertices.shape[0] < soup.shape[0] / 4
+
+    def test_count(self) -> None:
+        """Test that the counted vertices and triangle indices match the indexed surfaces."""
+        rng = np.random.default_rng(1)
+        # A noisy grid has many small surfaces and covers most of the marching cubes cases
+        for grid in [self.grid, 0.1 * rng.normal(size=tuple(self.voxel_number))]:
+            counts = count_marching_cubes(grid, np.array([self.iso_value]), self.voxel_number)
+            assert counts.shape == (2, 1, self.voxel_number[0], 3)
+            max_vertices = 18 * int(np.prod(self.voxel_number))
+            max_indices = 15 * int(np.prod(self.voxel_number - 1))
+            result = marching_cubes_indexed(
+                grid,
+                self.iso_value,
+                self.origin,
+                self.voxel_size,
+                self.voxel_number,
+                np.zeros(max_vertices, dtype=np.float32),
+                np.zeros(max_indices, dtype=np.uint32),
+                np.zeros(max_vertices, dtype=np.float32),
+                np.zeros(max_indices, dtype=np.uint32),
+            )
+            expected = []
+            for phase in range(2):
+                expected += [6 * np.sum(counts[phase, 0, :, :2]), np.sum(counts[phase, 0, :, 2])]
+            assert list(result) == expected
+
+    def test_extract_isosurfaces(self) -> None:
+        """Test that the surfaces extracted in parallel slabs contain the triangles of the triangle soups."""
+        soups = self._calculate_triangle_soups()
+        for number_of_threads in [1, 2, 5]:
+            surfaces = extract_isosurfaces(
+                self.grid,
+                self.iso_value,
+                self.origin,
+                self.voxel_size,
+                self.voxel_number,
+                number_of_threads,
+            )
+            for soup, (vertices, indices) in zip(soups, surfaces, strict=True):
+                assert vertices.dtype == np.float32
+                assert indices.dtype == np.uint32
+                np.testing.assert_array_equal(vertices.reshape(-1, 6)[indices], soup)
+
+        # Without voxels, the surfaces are empty
+        voxel_number = np.array([1, 19, 27], dtype=np.int64)
+        surfaces = extract_isosurfaces(self.grid[:1], self.iso_value, self.origin, self.voxel_size, voxel_number, 2)
+        assert all(array.size == 0 for surface in surfaces for array in surface)
+
+    def test_extract_isosurface_levels(self) -> None:
+        """Test that the surfaces of several isovalues are the same as the surfaces extracted one by one."""
+        iso_values = np.array([0.01, 0.05, 0.2, 0.5, 1.0])
+        block_ranges = calculate_block_ranges(self.grid)
+        for number_of_threads in [1, 3]:
+            levels = extract_isosurface_levels(
+                self.grid,
+                iso_values,
+                self.origin,
+                self.voxel_size,
+                self.voxel_number,
+                number_of_threads,
+                block_ranges,
+            )
+            for level, iso_value in enumerate(iso_values):
+                surfaces = extract_isosurfaces(
+                    self.grid,
+                    iso_value,
+                    self.origin,
+                    self.voxel_size,
+                    self.voxel_number,
+                    number_of_threads,
+                )
+                for (vertices, indices, vertex_offsets, index_offsets), (expected_vertices, expected_indices) in zip(
+                    levels,
+                    surfaces,
+                    strict=True,
+                ):
+                    assert vertex_offsets.shape == index_offsets.shape == (iso_values.shape[0] + 1,)
+                    # The vertices are indexed from the start of the segment of the isovalue
+                    level_vertices = vertices[vertex_offsets[level] : vertex_offsets[level + 1]].reshape(-1, 6)
+                    level_indices = indices[index_offsets[level] : index_offsets[level + 1]]
+                    np.testing.assert_array_equal(
+                        level_vertices[level_indices],
+                        expected_vertices.reshape(-1, 6)[expected_indices],
+                    )
+
+        # The values of the grid lie between -1 and 1, so the segments of the isosurfaces at +1 and -1 are empty
+        for _, _, vertex_offsets, index_offsets in levels:
+            assert vertex_offsets[-1] == vertex_offsets[-2]
+            assert index_offsets[-1] == index_offsets[-2]
+
+    def test_non_orthogonal_voxels(self) -> None:
+        """Test that the isosurfaces of grids with skewed voxel axes lie on the surface and have its normals."""
+        voxel_number = np.array([30, 34, 28], dtype=np.int64)
+        voxel_size = np.array([[0.25, 0.05, 0.0], [0.1, 0.22, 0.04], [-0.05, 0.08, 0.27]], dtype=np.float64)
+        center = np.array([0.4, -0.3, 0.2])
+        radius = 2.0
+        origin = center - 0.5 * (voxel_number - 1) @ voxel_size
+        indices = np.stack(np.meshgrid(*[np.arange(n) for n in voxel_number], indexing="ij"), axis=-1)
+        positions = origin + indices @ voxel_size
+        # The grid values decrease with the distance from the center, the surface at 0 is a sphere
+        grid = radius - np.linalg.norm(positions - center, axis=-1)
+        max_distance_error = 0.02
+        min_alignment = 0.99
+        for number_of_threads in [1, 3]:
+            (vertices, indices), _ = extract_isosurfaces(
+                grid,
+                0.0,
+                origin,
+                voxel_size,
+                voxel_number,
+                number_of_threads,
+            )
+            rows = vertices.reshape(-1, 6)
+            assert indices.shape[0] > 0
+            radial = rows[:, :3] - center
+            distances = np.linalg.norm(radial, axis=1)
+            assert np.max(np.abs(distances - radius)) < max_distance_error
+            # The normals point outwards along the radius
+            alignment = np.sum(radial * rows[:, 3:], axis=1) / distances
+            assert np.min(alignment) > min_alignment
+
+            soups = self._calculate_triangle_soups(grid, origin, voxel_size, voxel_number, 0.0)
+            np.testing.assert_array_equal(rows[indices], soups[0])
+
+    def test_single_precision(self) -> None:
+        """Test that the isosurfaces of grids of single precision match the ones of double precision."""
+        single_grid = self.grid.astype(np.float32)
+        block_ranges = calculate_block_ranges(self.grid)
+        single_block_ranges = calculate_block_ranges(single_grid)
+        for single_range, block_range in zip(single_block_ranges, block_ranges, strict=True):
+            np.testing.assert_array_equal(single_range, block_range.astype(np.float32))
+        iso_values = np.array([self.iso_value])
+        np.testing.assert_array_equal(
+            count_marching_cubes(single_grid, iso_values, self.voxel_number),
+            count_marching_cubes(self.grid, iso_values, self.voxel_number),
+        )
+        for number_of_threads in [1, 3]:
+            surfaces = extract_isosurfaces(
+                self.grid,
+                self.iso_value,
+                self.origin,
+                self.voxel_size,
+                self.voxel_number,
+                number_of_threads,
+                block_ranges,
+            )
+            single_surfaces = extract_isosurfaces(
+                single_grid,
+                self.iso_value,
+                self.origin,
+                self.voxel_size,
+                self.voxel_number,
+                number_of_threads,
+                single_block_ranges,
+            )
+            for (vertices, indices), (single_vertices, single_indices) in zip(surfaces, single_surfaces, strict=True):
+                assert single_vertices.dtype == np.float32
+                np.testing.assert_array_equal(single_indices, indices)
+                np.testing.assert_allclose(single_vertices, vertices, rtol=0.0, atol=1e-5)
+
+    def test_block_ranges(self) -> None:
+        """Test the ranges of the blocks of voxels and that skipping the blocks without isosurfaces is exact."""
+        minima, maxima = calculate_block_ranges(self.grid)
+        assert minima.shape == (3, 3, 4)
+        for block in np.ndindex(minima.shape):
+            points = self.grid[tuple(slice(8 * b, 8 * b + 9) for b in block)]
+            assert minima[block] == np.min(points)
+            assert maxima[block] == np.max(points)
+
+        rng = np.random.default_rng(2)
+        # The noise is only added to a corner, so most blocks are skipped, while the others have many small surfaces
+        noisy_grid = self.grid.copy()
+        noisy_grid[:9, :9, :9] += 0.1 * rng.normal(size=(9, 9, 9))
+        for grid in [self.grid, noisy_grid]:
+            block_ranges = calculate_block_ranges(grid)
+            for number_of_threads in [1, 3]:
+                surfaces = extract_isosurfaces(
+                    grid,
+                    self.iso_value,
+                    self.origin,
+                    self.voxel_size,
+                    self.voxel_number,
+                    number_of_threads,
+                )
+                skipping_surfaces = extract_isosurfaces(
+                    grid,
+                    self.iso_value,
+                    self.origin,
+                    self.voxel_size,
+                    self.voxel_number,
+                    number_of_threads,
+                    block_ranges,
+                )
+                for (vertices, indices), (skipping_vertices, skipping_indices) in zip(
+                    surfaces,
+                    skipping_surfaces,
+                    strict=True,
+                ):
+                    np.testing.assert_array_equal(
+                        skipping_vertices.reshape(-1, 6)[skipping_indices],
+                        vertices.reshape(-1, 6)[indices],
+                    )
+
+    def test_voxel_grid_block_ranges(self) -> None:
+        """Test that the voxel grid keeps the block ranges until another grid is set."""
+        voxel_grid = VoxelGrid3D()
+        voxel_grid.set_grid(self.grid, self.origin, self.voxel_size)
+        block_ranges = voxel_grid.block_ranges()
+        assert voxel_grid.block_ranges() is block_ranges
+        voxel_grid.grid = -self.grid
+        np.testing.assert_array_equal(voxel_grid.block_ranges()[0], -block_ranges[1])
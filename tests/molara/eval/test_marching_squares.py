@@ -0,0 +1,84 @@
+"""Test the calculation of isolines with marching squares."""
+
+from __future__ import annotations
+
+from itertools import pairwise
+from unittest import TestCase
+
+import numpy as np
+from molara.eval.marchingsquares import marching_squares, marching_squares_levels, marching_squares_polylines
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestMarchingSquares(TestCase):
+    """Test the calculation of isolines with marching squares."""
+
+    def setUp(self) -> None:
+        """Set up a grid of a function with a positive and a negative lobe in a tilted plane."""
+        self.voxel_number = np.array([31, 24, 1], dtype=np.int64)
+        self.origin = np.array([-3.0, -2.0, 0.5], dtype=np.float64)
+        self.voxel_size = np.array([[0.2, 0.0, 0.05], [0.0, 0.2, 0.1], [0.0, 0.0, 0.0]], dtype=np.float64)
+        x, y = np.meshgrid(
+            0.2 * np.arange(self.voxel_number[0]) - 3,
+            0.2 * np.arange(self.voxel_number[1]) - 2,
+            indexing="ij",
+        )
+        self.grid = x * np.exp(-(x**2 + y**2) / 2) + 0.3 * np.exp(-((x - 1) ** 2 + y**2))
+
+    def test_marching_squares_levels(self) -> None:
+        """Test that the isolines of several isovalues are the same as the isolines calculated one by one."""
+        iso_values = np.array([0.003, 0.01, 0.05, 0.2, 0.5, 1.0])
+        levels = marching_squares_levels(self.grid, iso_values, self.origin, self.voxel_size, self.voxel_number)
+
+        number_of_entries = (self.voxel_number[0] - 1) * (self.voxel_number[1] - 1) * 4 + 1
+        for level, iso_value in enumerate(iso_values):
+            lines_1 = np.zeros((number_of_entries, 3), dtype=np.float32)
+            lines_2 = np.zeros((number_of_entries, 3), dtype=np.float32)
+            marching_squares(self.grid, iso_value, self.origin, self.voxel_size, self.voxel_number, lines_1, lines_2)
+            for (lines, offsets), expected_lines in zip(levels, [lines_1, lines_2], strict=True):
+                assert lines.dtype == np.float32
+                assert offsets.shape == (iso_values.shape[0] + 1,)
+                np.testing.assert_allclose(
+                    lines[offsets[level] : offsets[level + 1]],
+                    expected_lines[: int(expected_lines[-1, -1])].reshape(-1, 2, 3),
+                    atol=1e-5,
+                )
+
+        # The values of the grid lie between -1 and 1, so the segments of the isolines at +1 and -1 are empty
+        for lines, offsets in levels:
+            assert offsets[-2] == offsets[-1] == lines.shape[0]
+            assert offsets[-2] > offsets[0]
+
+    def test_marching_squares_polylines(self) -> None:
+        """Test that the polylines of each isovalue consist of the lines of marching squares."""
+        iso_values = np.array([0.003, 0.01, 0.05, 0.2, 0.5, 1.0])
+        levels = marching_squares_levels(self.grid, iso_values, self.origin, self.voxel_size, self.voxel_number)
+        polylines = marching_squares_polylines(self.grid, iso_values, self.origin, self.voxel_size, self.voxel_number)
+        for (points, polyline_offsets, closed, level_offsets), (lines, offsets) in zip(polylines, levels, strict=True):
+            assert points.dtype == np.float32
+            assert level_offsets.shape == (iso_values.shape[0] + 1,)
+            assert polyline_offsets.shape == (closed.shape[0] + 1,)
+            assert polyline_offsets[-1] == points.shape[0]
+            assert np.any(closed)
+            assert not np.all(closed)
+            for level in range(iso_values.shape[0]):
+                polyline_lines = []
+                for polyline in range(level_offsets[level], level_offsets[level + 1]):
+                    polyline_points = points[polyline_offsets[polyline] : polyline_offsets[polyline + 1]]
+                    if closed[polyline]:
+                        polyline_points = np.vstack((polyline_points, polyline_points[:1]))
+                    polyline_lines += list(pairwise(polyline_points))
+                # Each line is contained once, in either direction, up to the rounding of the shared end points
+                expected_lines = lines[offsets[level] : offsets[level + 1]]
+                assert len(polyline_lines) == expected_lines.shape[0]
+                if not polyline_lines:
+                    continue
+                polyline_lines = np.array(polyline_lines)
+                distances = np.minimum(
+                    np.abs(polyline_lines[:, np.newaxis] - expected_lines[np.newaxis]).max(axis=(2, 3)),
+                    np.abs(polyline_lines[:, np.newaxis, ::-1] - expected_lines[np.newaxis]).max(axis=(2, 3)),
+                )
+                matches = np.argmin(distances, axis=1)
+                assert np.unique(matches).shape[0] == expected_lines.shape[0]
+                np.testing.assert_allclose(np.min(distances, axis=1), 0.0, atol=1e-5)
@@ -0,0 +1,103 @@
+"""Test the simplification of isosurface meshes by vertex clustering."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+import pytest
+from molara.eval.marchingcubes import extract_isosurfaces
+
+from molara.eval.mesh_simplification import calculate_levels_of_detail, cluster_vertices
+from molara.rendering.polygons import Polygon
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestMeshSimplification(TestCase):
+    """Test the simplification of isosurface meshes by vertex clustering."""
+
+    def setUp(self) -> None:
+        """Set up the isosurface of a sphere."""
+        self.voxel_number = np.array([41, 37, 45], dtype=np.int64)
+        self.origin = np.array([-3.0, -3.0, -3.0], dtype=np.float64)
+        self.voxel_size = 6.0 / (self.voxel_number - 1)
+        x, y, z = np.meshgrid(
+            *[self.origin[i] + self.voxel_size[i] * np.arange(self.voxel_number[i]) for i in range(3)],
+            indexing="ij",
+        )
+        self.radius = 2.0
+        grid = self.radius - np.sqrt(x**2 + y**2 + z**2)
+        (self.vertices, self.indices), _ = extract_isosurfaces(
+            grid,
+            0.0,
+            self.origin,
+            np.diag(self.voxel_size),
+            self.voxel_number,
+        )
+
+    def test_cluster_vertices(self) -> None:
+        """Test that the simplified meshes are valid, coarser and close to the surface."""
+        previous_triangles = self.indices.shape[0] // 3
+        min_alignment = 0.9
+        for clustering_factor in [1, 2, 4]:
+            vertices, indices = cluster_vertices(
+                self.vertices,
+                self.indices,
+                self.origin,
+                np.diag(self.voxel_size),
+                clustering_factor,
+            )
+            assert vertices.dtype == np.float32
+            assert indices.dtype == np.uint32
+            rows = vertices.reshape(-1, 6)
+            triangles = indices.reshape(-1, 3)
+            assert np.all(indices < rows.shape[0])
+            # Collapsed triangles are removed
+            assert np.all(triangles[:, 0] != triangles[:, 1])
+            assert np.all(triangles[:, 1] != triangles[:, 2])
+            assert np.all(triangles[:, 0] != triangles[:, 2])
+            assert triangles.shape[0] <= previous_triangles
+            previous_triangles = triangles.shape[0]
+
+            np.testing.assert_allclose(np.linalg.norm(rows[:, 3:], axis=1), 1.0, atol=1e-5)
+            # The vertices are means of vertices on the sphere within a cell of the coarse lattice
+            distances = np.linalg.norm(rows[:, :3], axis=1)
+            assert np.max(np.abs(distances - self.radius)) < clustering_factor * np.max(self.voxel_size)
+            # The normals point outwards, like the normals of the original surface
+            original_rows = self.vertices.reshape(-1, 6)
+            original_sign = np.sign(np.sum(original_rows[:, :3] * original_rows[:, 3:]))
+            alignment = np.sum(rows[:, :3] * rows[:, 3:], axis=1) / distances
+            assert np.all(original_sign * alignment > min_alignment)
+
+        with pytest.raises(ValueError, match="The clustering factor must be a positive integer"):
+            cluster_vertices(self.vertices, self.indices, self.origin, np.diag(self.voxel_size), 0)
+
+        vertices, indices = cluster_vertices(np.zeros(0), np.zeros(0), self.origin, np.diag(self.voxel_size), 2)
+        assert vertices.size == indices.size == 0
+
+    def test_polygon_levels_of_detail(self) -> None:
+        """Test that the levels of detail are stored behind the polygon and selected by the number of indices."""
+        levels = calculate_levels_of_detail(self.vertices, self.indices, self.origin, np.diag(self.voxel_size))
+        polygon = Polygon(self.vertices, np.array([[1.0, 0.0, 0.0]]), self.indices, levels_of_detail=levels)
+        assert len(polygon.index_ranges) == len(levels) + 1
+        assert polygon.indices.shape[0] == sum(count for _, count in polygon.index_ranges)
+        rows = polygon.vertices.reshape(-1, 6)
+        # Each level of detail addresses its own vertices in the combined buffers
+        for (first_index, count), (level_vertices, level_indices) in zip(
+            polygon.index_ranges[1:],
+            levels,
+            strict=True,
+        ):
+            np.testing.assert_array_equal(
+                rows[polygon.indices[first_index : first_index + count]],
+                level_vertices.reshape(-1, 6)[level_indices],
+            )
+
+        polygon.select_level_of_detail(polygon.index_ranges[1][1])
+        assert (polygon.first_index, polygon.number_of_indices) == polygon.index_ranges[1]
+        # Without a small enough level of detail, the coarsest one is selected
+        polygon.select_level_of_detail(0)
+        assert (polygon.first_index, polygon.number_of_indices) == polygon.index_ranges[-1]
+        polygon.select_level_of_detail()
+        assert (polygon.first_index, polygon.number_of_indices) == (0, self.indices.shape[0])
@@ -0,0 +1,54 @@
+"""Test the calculation of the overlap integrals of the basis functions."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+import pytest
+from molara.eval.overlap import calculate_overlap_matrix
+
+from molara.eval.populationanalysis import PopulationAnalysis
+from molara.structure.basisset import contracted_overlap
+from molara.structure.io.importer import GeneralImporter
+from molara.util.constants import ANGSTROM_TO_BOHR
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestOverlap(TestCase):
+    """Test the calculation of the overlap integrals of the basis functions."""
+
+    def test_overlap_matrix(self) -> None:
+        """Test the overlap matrix against the overlaps of the basis functions calculated pair by pair."""
+        for file in ["examples/molden/SPDFG_orbitals.molden", "examples/molden/h2o.molden"]:
+            molecule = GeneralImporter(file).load().mols[0]
+            overlap = calculate_overlap_matrix(molecule.get_packed_basis_set())
+            reference = np.array(
+                [
+                    [
+                        contracted_overlap(a, b, a.position * ANGSTROM_TO_BOHR, b.position * ANGSTROM_TO_BOHR)
+                        for b in molecule.basis_set
+                    ]
+                    for a in molecule.basis_set
+                ],
+            )
+            np.testing.assert_allclose(overlap, reference, atol=1e-12)
+            np.testing.assert_allclose(np.diag(overlap), 1.0, atol=1e-12)
+            # A list of basis functions is packed on the fly
+            np.testing.assert_array_equal(calculate_overlap_matrix(molecule.basis_set), overlap)
+
+    def test_screening(self) -> None:
+        """Test that skipping the distant pairs of primitives only changes negligible overlaps."""
+        molecule = GeneralImporter("examples/molden/caffeine.molden").load().mols[0]
+        overlap = calculate_overlap_matrix(molecule.basis_set, 0.0)
+        screened_overlap = calculate_overlap_matrix(molecule.basis_set)
+        assert np.count_nonzero(screened_overlap) < np.count_nonzero(overlap)
+        np.testing.assert_allclose(screened_overlap, overlap, atol=1e-10)
+        np.testing.assert_array_equal(screened_overlap, screened_overlap.T)
+
+    def test_population_analysis(self) -> None:
+        """Test that the populations add up to the number of electrons."""
+        molecule = GeneralImporter("examples/molden/h2o.molden").load().mols[0]
+        population = PopulationAnalysis(molecule)
+        assert population.calculated_number_of_electrons == pytest.approx(population.number_of_electrons, abs=1e-4)
@@ -0,0 +1,97 @@
+"""Test the charges and bond orders of the population analysis."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+import pytest
+
+from molara.eval.populationanalysis import PopulationAnalysis
+from molara.structure.drawer import values_to_colors
+from molara.structure.io.importer import GeneralImporter
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestPopulationAnalysis(TestCase):
+    """Test the charges and bond orders of the population analysis."""
+
+    def setUp(self) -> None:
+        """Set up the population analysis of water."""
+        self.population = PopulationAnalysis(GeneralImporter("examples/molden/h2o.molden").load().mols[0])
+
+    def test_charges(self) -> None:
+        """Test that the charges of neutral molecules add up to zero and are symmetric."""
+        for file in ["examples/molden/h2o.molden", "examples/molden/hf.molden", "examples/molden/benzene.molden"]:
+            population = PopulationAnalysis(GeneralImporter(file).load().mols[0])
+            for charges in [population.calculate_mulliken_charges(), population.calculate_lowdin_charges()]:
+                assert charges.shape == (population.number_of_atoms,)
+                assert np.sum(charges) == pytest.approx(0.0, abs=1e-4)
+
+        hydrogens = self.population.molecule.atomic_numbers == 1
+        for charges in [self.population.calculate_mulliken_charges(), self.population.calculate_lowdin_charges()]:
+            assert np.all(charges[~hydrogens] < 0.0)
+            assert np.all(charges[hydrogens] > 0.0)
+            assert charges[hydrogens][0] == pytest.approx(charges[hydrogens][1], abs=1e-6)
+
+    def test_mayer_bond_orders(self) -> None:
+        """Test the Mayer bond orders of single and double bonds."""
+        bond_orders = self.population.calculate_mayer_bond_orders()
+        np.testing.assert_allclose(bond_orders, bond_orders.T, atol=1e-12)
+        np.testing.assert_array_equal(np.diag(bond_orders), 0.0)
+        hydrogens = np.flatnonzero(self.population.molecule.atomic_numbers == 1)
+        oxygen = np.flatnonzero(self.population.molecule.atomic_numbers == 8)[0]  # noqa: PLR2004
+        for hydrogen in hydrogens:
+            assert bond_orders[oxygen, hydrogen] == pytest.approx(0.9, abs=0.1)
+        assert bond_orders[hydrogens[0], hydrogens[1]] < 0.1  # noqa: PLR2004
+
+        # The triplet oxygen molecule has unrestricted orbitals and a double bond
+        population = PopulationAnalysis(GeneralImporter("examples/molden/o2.molden").load().mols[0])
+        assert population.calculate_mayer_bond_orders()[0, 1] == pytest.approx(2.0, abs=0.3)
+
+    def test_values_to_colors(self) -> None:
+        """Test the diverging colors of the values."""
+        colors = values_to_colors(np.array([-2.0, -1.0, 0.0, 1.0, 2.0]))
+        assert colors.dtype == np.float32
+        np.testing.assert_allclose(colors[0], [0.0, 0.0, 1.0])
+        np.testing.assert_allclose(colors[1], [0.5, 0.5, 1.0])
+        np.testing.assert_allclose(colors[2], [1.0, 1.0, 1.0])
+        np.testing.assert_allclose(colors[4], [1.0, 0.0, 0.0])
+        # Values beyond the maximum are clipped
+        np.testing.assert_allclose(values_to_colors(np.array([3.0]), max_value=1.0), [[1.0, 0.0, 0.0]])
+        np.testing.assert_array_equal(values_to_colors(np.zeros(2)), 1.0)
+
+    def test_drawer_colors(self) -> None:
+        """Test the coloring of the atoms by their charges and of the bonds by their bond orders."""
+        molecule = self.population.molecule
+        drawer = molecule.drawer
+        assert drawer.spheres is not None
+        assert drawer.cylinders is not None
+
+        charges = self.population.calculate_mulliken_charges()
+        drawer.set_atom_colors_from_values(charges)
+        np.testing.assert_array_equal(drawer.spheres.colors, values_to_colors(charges))
+        oxygen = np.flatnonzero(molecule.atomic_numbers == 8)[0]  # noqa: PLR2004
+        # The negative oxygen is blue, the positive hydrogens are red
+        assert drawer.spheres.colors[oxygen, 2] == pytest.approx(1.0)
+        assert drawer.spheres.colors[oxygen, 0] < 1.0
+        for hydrogen in np.flatnonzero(molecule.atomic_numbers == 1):
+            assert drawer.spheres.colors[hydrogen, 0] == pytest.approx(1.0)
+            assert drawer.spheres.colors[hydrogen, 2] < 1.0
+
+        bond_orders = self.population.calculate_mayer_bond_orders()
+        drawer.set_bond_colors_from_values(bond_orders, max_value=2.0)
+        bond_colors = values_to_colors(bond_orders[drawer.bonds[:, 0], drawer.bonds[:, 1]], max_value=2.0)
+        np.testing.assert_array_equal(drawer.cylinders.colors, np.repeat(bond_colors, 2, axis=0))
+
+        # Both halves of each bond follow each other in the order of the bonds
+        values = np.zeros((molecule.n_at, molecule.n_at))
+        first, second = drawer.bonds[0], drawer.bonds[1]
+        values[first[0], first[1]] = values[first[1], first[0]] = 1.0
+        values[second[0], second[1]] = values[second[1], second[0]] = -1.0
+        drawer.set_bond_colors_from_values(values)
+        np.testing.assert_allclose(
+            drawer.cylinders.colors,
+            [[1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, 0.0, 1.0]],
+        )
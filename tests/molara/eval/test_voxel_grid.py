@@ -0,0 +1,359 @@
+"""Test the generation of voxel grids."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+import pytest
+from molara.eval.generate_voxel_grid import (
+    calculate_mo_gradients,
+    generate_density_grid,
+    generate_density_plane,
+    generate_plane_grid,
+    generate_voxel_grid,
+    generate_voxel_grids,
+)
+
+from molara.structure.io.importer import GeneralImporter
+from molara.util.constants import ANGSTROM_TO_BOHR
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestVoxelGrid(TestCase):
+    """Test the generation of voxel grids."""
+
+    def setUp(self) -> None:
+        """Load a molecule with molecular orbitals and set up a small grid."""
+        importer = GeneralImporter("examples/molden/h2o.molden")
+        self.molecule = importer.load().mols[0]
+        self.mos = self.molecule.mos
+        self.aos = self.molecule.basis_set
+        self.orbital = 4
+        self.origin = np.array([-2.0, -2.1, -1.9], dtype=np.float64)
+        self.voxel_size = np.eye(3, dtype=np.float64) * 0.3
+        self.voxel_count = np.array([14, 13, 12], dtype=np.int64)
+        self.cut_offs = self.mos.calculate_cut_offs(
+            self.aos,
+            self.orbital,
+            threshold=1e-6,
+            max_distance=30.0,
+            max_points_number=150,
+        )
+
+    def _generate_grid(self, number_of_threads: int) -> np.ndarray:
+        """Generate the grid of the selected orbital with the given number of threads."""
+        return np.array(
+            generate_voxel_grid(
+                self.origin,
+                self.voxel_size,
+                self.voxel_count,
+                self.aos,
+                self.mos.coefficients[:, self.orbital],
+                self.cut_offs,
+                number_of_threads,
+            ),
+        )
+
+    def test_grid_matches_mo_values(self) -> None:
+        """Test that the grid values match the values of the single point evaluation."""
+        grid = self._generate_grid(1)
+        threshold = 1e-5
+        assert grid.shape == tuple(self.voxel_count)
+        for index in [(0, 0, 0), (7, 6, 5), (13, 12, 11), (3, 9, 2)]:
+            position = self.origin + np.dot(np.array(index), self.voxel_size)
+            reference = self.mos.get_mo_value(self.orbital, self.aos, position)
+            assert np.abs(grid[index] - reference) < threshold
+
+    def test_grid_all_shell_types(self) -> None:
+        """Test the row kernel for basis sets containing s, p, d, f and g shells."""
+        molecule = GeneralImporter("examples/molden/SPDFG_orbitals.molden").load().mols[0]
+        mos = molecule.mos
+        aos = molecule.basis_set
+        origin = np.array([-1.5, -1.4, -1.3], dtype=np.float64)
+        voxel_size = np.eye(3, dtype=np.float64) * 0.25
+        voxel_count = np.array([12, 11, 10], dtype=np.int64)
+        threshold = 1e-10
+        for orbital in range(mos.coefficients.shape[1]):
+            cut_offs = mos.calculate_cut_offs(aos, orbital, threshold=1e-6, max_distance=30.0, max_points_number=150)
+            grid = np.array(
+                generate_voxel_grid(origin, voxel_size, voxel_count, aos, mos.coefficients[:, orbital], cut_offs, 2),
+            )
+            for index in [(0, 0, 0), (5, 6, 7), (11, 10, 9), (2, 8, 3)]:
+                position = origin + np.dot(np.array(index), voxel_size)
+                reference = mos.get_mo_value(orbital, aos, position)
+                assert np.abs(grid[index] - reference) < threshold
+
+    def test_parallel_grid(self) -> None:
+        """Test that the parallel evaluation yields the same grid as the serial one."""
+        grid_serial = self._generate_grid(1)
+        grid_parallel = self._generate_grid(4)
+        np.testing.assert_allclose(grid_parallel, grid_serial, rtol=0.0, atol=1e-14)
+
+    def test_multiple_orbitals(self) -> None:
+        """Test that several orbitals evaluated in one pass match the grids of the single orbitals."""
+        orbitals = [2, 3, 4, 5, 6]
+        cut_offs = self.mos.calculate_cut_offs(
+            self.aos,
+            orbitals,
+            threshold=1e-6,
+            max_distance=30.0,
+            max_points_number=150,
+        )
+        grids = generate_voxel_grids(
+            self.origin,
+            self.voxel_size,
+            self.voxel_count,
+            self.aos,
+            self.mos.coefficients[:, orbitals],
+            cut_offs,
+            2,
+        )
+        assert grids.shape == (len(orbitals), *self.voxel_count)
+        for index, orbital in enumerate(orbitals):
+            grid = generate_voxel_grid(
+                self.origin,
+                self.voxel_size,
+                self.voxel_count,
+                self.aos,
+                self.mos.coefficients[:, orbital],
+                cut_offs,
+            )
+            np.testing.assert_allclose(grids[index], grid, rtol=0.0, atol=1e-14)
+
+    def test_cut_offs_of_multiple_orbitals(self) -> None:
+        """Test that the cutoffs of several orbitals are the largest cutoffs of the single orbitals."""
+        orbitals = [2, 3, 4, 5, 6]
+        cut_offs = self.mos.calculate_cut_offs(self.aos, orbitals, threshold=1e-6, max_distance=30.0)
+        cut_offs_single = [
+            self.mos.calculate_cut_offs(self.aos, orbital, threshold=1e-6, max_distance=30.0) for orbital in orbitals
+        ]
+        np.testing.assert_array_equal(cut_offs, np.max(cut_offs_single, axis=0))
+
+    def test_block_screening(self) -> None:
+        """Test the screening of shells on a grid with several blocks and segments and a skewed voxel basis."""
+        voxel_size = np.array([[0.35, 0.0, 0.0], [0.05, 0.3, 0.0], [0.02, 0.03, 0.1]], dtype=np.float64)
+        voxel_count = np.array([19, 18, 75], dtype=np.int64)
+        origin = np.array([-3.0, -2.8, -3.5], dtype=np.float64)
+        cut_offs = self.mos.calculate_cut_offs(self.aos, self.orbital, threshold=1e-8, max_distance=30.0)
+        grid = generate_voxel_grid(
+            origin,
+            voxel_size,
+            voxel_count,
+            self.aos,
+            self.mos.coefficients[:, self.orbital],
+            cut_offs,
+        )
+        grid_unscreened = generate_voxel_grid(
+            origin,
+            voxel_size,
+            voxel_count,
+            self.aos,
+            self.mos.coefficients[:, self.orbital],
+            np.full_like(cut_offs, 1.0e300),
+        )
+        np.testing.assert_allclose(grid, grid_unscreened, rtol=0.0, atol=1e-7)
+
+    def test_single_precision(self) -> None:
+        """Test that grids of single precision are the rounded grids of double precision."""
+        orbitals = [2, 3, 4]
+        cut_offs = self.mos.calculate_cut_offs(self.aos, orbitals, threshold=1e-8, max_distance=30.0)
+        voxel_count = np.array([19, 18, 75], dtype=np.int64)
+        rng = np.random.default_rng(3)
+        for mask in [None, rng.random(tuple(voxel_count)) < 0.3]:  # noqa: PLR2004
+            grids = generate_voxel_grids(
+                self.origin,
+                self.voxel_size,
+                voxel_count,
+                self.aos,
+                self.mos.coefficients[:, orbitals],
+                cut_offs,
+                2,
+                mask,
+            )
+            single_grids = generate_voxel_grids(
+                self.origin,
+                self.voxel_size,
+                voxel_count,
+                self.aos,
+                self.mos.coefficients[:, orbitals],
+                cut_offs,
+                2,
+                mask,
+                dtype=np.float32,
+            )
+            assert single_grids.dtype == np.float32
+            np.testing.assert_array_equal(single_grids, grids.astype(np.float32))
+
+        density_matrix = self.mos.calculate_density_matrix()
+        density_cut_offs = self.mos.calculate_density_cut_offs(self.aos, density_matrix, threshold=1e-6)
+        density = generate_density_grid(
+            self.origin,
+            self.voxel_size,
+            voxel_count,
+            self.aos,
+            density_matrix,
+            density_cut_offs,
+        )
+        single_density = generate_density_grid(
+            self.origin,
+            self.voxel_size,
+            voxel_count,
+            self.aos,
+            density_matrix,
+            density_cut_offs,
+            dtype=np.float32,
+        )
+        assert single_density.dtype == np.float32
+        np.testing.assert_array_equal(single_density, density.astype(np.float32))
+
+        with pytest.raises(ValueError, match="The grids must be of type float32 or float64"):
+            generate_voxel_grid(
+                self.origin,
+                self.voxel_size,
+                voxel_count,
+                self.aos,
+                self.mos.coefficients[:, self.orbital],
+                cut_offs,
+                dtype=np.float16,
+            )
+
+    def test_plane_grid(self) -> None:
+        """Test the sampling of orbitals and densities on a rotated plane against the grid with a single layer."""
+        angle = 0.6
+        voxel_size = 0.2 * np.array(
+            [[np.cos(angle), np.sin(angle), 0.3], [-np.sin(angle), np.cos(angle), 0.0]],
+            dtype=np.float64,
+        )
+        voxel_count = np.array([23, 71], dtype=np.int64)
+        origin = np.array([-2.0, -3.5, 0.1], dtype=np.float64)
+        layer_voxel_size = np.concatenate((voxel_size, [[0.0, 0.0, 1.0]]))
+        layer_voxel_count = np.array([*voxel_count, 1], dtype=np.int64)
+        mo_coefficients = self.mos.coefficients[:, self.orbital]
+        grid = generate_voxel_grid(
+            origin,
+            layer_voxel_size,
+            layer_voxel_count,
+            self.aos,
+            mo_coefficients,
+            self.cut_offs,
+        )[:, :, 0]
+        density_matrix = np.outer(mo_coefficients, mo_coefficients)
+        density = generate_density_grid(
+            origin,
+            layer_voxel_size,
+            layer_voxel_count,
+            self.aos,
+            density_matrix,
+            self.cut_offs,
+        )[:, :, 0]
+        for number_of_threads in [1, 3]:
+            plane = generate_plane_grid(
+                origin,
+                voxel_size,
+                voxel_count,
+                self.aos,
+                mo_coefficients,
+                self.cut_offs,
+                number_of_threads,
+            )
+            assert plane.shape == tuple(voxel_count)
+            np.testing.assert_allclose(plane, grid, rtol=0.0, atol=1e-14)
+            density_plane = generate_density_plane(
+                origin,
+                voxel_size,
+                voxel_count,
+                self.aos,
+                density_matrix,
+                self.cut_offs,
+                number_of_threads,
+            )
+            np.testing.assert_allclose(density_plane, density, rtol=0.0, atol=1e-14)
+
+        threshold = 1e-5
+        for index in [(0, 0), (11, 35), (22, 70), (4, 60)]:
+            position = origin + np.dot(np.array(index), voxel_size)
+            assert np.abs(plane[index] - self.mos.get_mo_value(self.orbital, self.aos, position)) < threshold
+
+    def test_mo_gradients(self) -> None:
+        """Test the analytic gradients for s, p, d, f and g shells against central finite differences."""
+        molecule = GeneralImporter("examples/molden/SPDFG_orbitals.molden").load().mols[0]
+        mos = molecule.mos
+        aos = molecule.basis_set
+        positions = np.random.default_rng(3).uniform(-1.5, 1.5, size=(5, 3))
+        step = 1e-5
+        threshold = 1e-8
+        for orbital in range(mos.coefficients.shape[1]):
+            cut_offs = mos.calculate_cut_offs(aos, orbital, threshold=1e-8, max_distance=30.0, max_points_number=150)
+            gradients = calculate_mo_gradients(positions, aos, mos.coefficients[:, orbital], cut_offs, 2)
+            assert gradients.shape == positions.shape
+            for position, gradient in zip(positions, gradients, strict=True):
+                # The finite differences are taken in angstrom, the gradients are given per bohr
+                reference = [
+                    (
+                        mos.get_mo_value(orbital, aos, position + step * direction)
+                        - mos.get_mo_value(orbital, aos, position - step * direction)
+                    )
+                    / (2 * step * ANGSTROM_TO_BOHR)
+                    for direction in np.eye(3)
+                ]
+                np.testing.assert_allclose(gradient, reference, rtol=0.0, atol=threshold)
+
+    def test_spherical_harmonics(self) -> None:
+        """Test that the grids evaluated in the basis of the spherical harmonics match the cartesian ones."""
+        for file in ["examples/molden/SPDFG_orbitals.molden", "examples/molden/o2.molden"]:
+            molecule = GeneralImporter(file).load().mols[0]
+            mos = molecule.mos
+            aos = molecule.get_packed_basis_set()
+            spherical_aos = molecule.get_packed_basis_set(spherical=True)
+            assert spherical_aos.spherical
+            assert molecule.get_packed_basis_set(spherical=True) is spherical_aos
+            assert len(spherical_aos) == mos.coefficients_spherical.shape[0] < len(aos)
+            np.testing.assert_array_equal(mos.get_coefficients(spherical_aos), mos.coefficients_spherical)
+
+            orbitals = list(range(6))
+            cut_offs = mos.calculate_cut_offs(aos, orbitals, threshold=1e-6, max_distance=30.0)
+            origin = np.array([-1.5, -1.4, -1.3], dtype=np.float64)
+            voxel_size = np.eye(3, dtype=np.float64) * 0.25
+            voxel_count = np.array([12, 11, 10], dtype=np.int64)
+            grids = generate_voxel_grids(origin, voxel_size, voxel_count, aos, mos.coefficients[:, orbitals], cut_offs)
+            spherical_grids = generate_voxel_grids(
+                origin,
+                voxel_size,
+                voxel_count,
+                spherical_aos,
+                mos.coefficients_spherical[:, orbitals],
+                cut_offs,
+                2,
+            )
+            np.testing.assert_allclose(spherical_grids, grids, rtol=0.0, atol=1e-12)
+
+            positions = np.random.default_rng(4).uniform(-1.5, 1.5, size=(5, 3))
+            for orbital in orbitals:
+                np.testing.assert_allclose(
+                    calculate_mo_gradients(positions, spherical_aos, mos.coefficients_spherical[:, orbital], cut_offs),
+                    calculate_mo_gradients(positions, aos, mos.coefficients[:, orbital], cut_offs),
+                    rtol=0.0,
+                    atol=1e-12,
+                )
+
+            for spin in [None, 1]:
+                density_cut_offs = np.full(aos.number_of_shells, 30.0)
+                density = generate_density_grid(
+                    origin,
+                    voxel_size,
+                    voxel_count,
+                    aos,
+                    mos.calculate_density_matrix(spin),
+                    density_cut_offs,
+                )
+                spherical_density = generate_density_grid(
+                    origin,
+                    voxel_size,
+                    voxel_count,
+                    spherical_aos,
+                    mos.calculate_density_matrix(spin, spherical=True),
+                    density_cut_offs,
+                )
+                np.testing.assert_allclose(spherical_density, density, rtol=0.0, atol=1e-10)
@@ -46,6 +46,7 @@ class WorkaroundTestCubeFileDialog:
         """Test the toggle_surfaces method."""
         self.main_window.surface_3d_dialog.toggle_surfaces()
         assert self.main_window.surface_3d_dialog.surfaces_are_visible
+        self.main_window.surface_3d_dialog.wait_for_calculation()
 
     def _test_change_iso_value(self) -> None:
         """Test the change_iso_value method."""
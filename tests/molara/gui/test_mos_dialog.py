@@ -122,6 +122,7 @@ class WorkaroundTestMOsDialog:
     def _test_wire_mesh(self) -> None:
         """Test the wire mesh toggle button."""
         self.mo_dialog.toggle_surfaces()
+        self.mo_dialog.wait_for_calculation()
         assert not self.mo_dialog.parent().structure_widget.renderer.objects3d["Surface_1"].wire_frame
         self.mo_dialog.toggle_wire_mesh()
         assert self.mo_dialog.parent().structure_widget.renderer.objects3d["Surface_1"].wire_frame
@@ -152,10 +153,15 @@ class WorkaroundTestMOsDialog:
     def _test_visualization(self) -> None:
         """Test the visualization of the orbitals not their correctness."""
         self.mo_dialog.toggle_surfaces()
-        number_of_vertices = 2640
+        # The grids and surfaces are calculated in the background and drawn when finished
+        assert self.mo_dialog.calculation is not None
+        self.mo_dialog.wait_for_calculation()
+        assert self.mo_dialog.calculation is None
+        # The surfaces are indexed meshes, each corner of the triangles is one index
+        number_of_indices = 2640
         assert (
-            self.mo_dialog.parent().structure_widget.renderer.objects3d["Surface_1"].number_of_vertices
-            == number_of_vertices
+            self.mo_dialog.parent().structure_widget.renderer.objects3d["Surface_1"].number_of_indices
+            == number_of_indices
         )
         self.mo_dialog.remove_surfaces()
         assert "Surface_1" not in self.mo_dialog.parent().structure_widget.renderer.objects3d
@@ -187,7 +193,37 @@ class WorkaroundTestMOsDialog:
         self.mo_dialog.select_row()
         assert self.mo_dialog.voxel_grid_parameters_changed
         self.mo_dialog.recalculate_orbital()
+        self.mo_dialog.wait_for_calculation()
         assert not self.mo_dialog.voxel_grid_parameters_changed
+        grid_parameters, selected_orbital = self.mo_dialog.voxel_grid_key
+        assert selected_orbital == self.mo_dialog.selected_orbital
+        assert (grid_parameters, selected_orbital + 1) in self.mo_dialog.grid_cache
+        surfaces_key = (self.mo_dialog.voxel_grid_key, self.mo_dialog.iso_value, self.mo_dialog.analytic_normals)
+        assert surfaces_key in self.mo_dialog.grid_cache
+
+        # The neighbouring orbital is taken from the grids which were evaluated together
+        neighbour_grid, _, _ = self.mo_dialog.grid_cache.get((grid_parameters, selected_orbital + 1))
+        self.mo_dialog.ui.orbitalSelector.setCurrentCell(6, 0)
+        self.mo_dialog.select_row()
+        self.mo_dialog.recalculate_orbital()
+        assert self.mo_dialog.voxel_grid.grid is neighbour_grid
+        self.mo_dialog.wait_for_calculation()
+
+        # Revisiting the orbital takes the grid and the surfaces from the cache without a calculation
+        self.mo_dialog.ui.orbitalSelector.setCurrentCell(5, 0)
+        self.mo_dialog.select_row()
+        assert self.mo_dialog.calculation is None
+        assert self.mo_dialog.voxel_grid_key == (grid_parameters, selected_orbital)
+
+        # Another iso value only refines the progressive grid of the selected orbital around its surfaces
+        refined_points = self.mo_dialog.refined_points
+        self.mo_dialog.ui.isoValueSpinBox.setValue(self.mo_dialog.iso_value / 2)
+        self.mo_dialog.wait_for_calculation()
+        assert self.mo_dialog.voxel_grid_key == (grid_parameters, selected_orbital)
+        assert np.all(self.mo_dialog.refined_points[refined_points])
+        assert (grid_parameters, selected_orbital + 1) in self.mo_dialog.grid_cache
+        surfaces_key = (self.mo_dialog.voxel_grid_key, self.mo_dialog.iso_value, self.mo_dialog.analytic_normals)
+        assert surfaces_key in self.mo_dialog.grid_cache
 
     def _test_isoline_border_drawing(self) -> None:
         """Test the drawing of the isoline border."""
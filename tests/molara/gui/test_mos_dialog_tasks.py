@@ -0,0 +1,170 @@
+"""Test the calculation of the orbital grids and surfaces of the MOs dialog."""
+
+from __future__ import annotations
+
+from typing import Any
+from unittest import TestCase
+
+import numpy as np
+from molara.eval.generate_voxel_grid import generate_voxel_grids
+
+from molara.eval.voxel_grid import VoxelGrid3D
+from molara.gui.mos_dialog import calculate_orbital_grids_task, refine_orbital_grid_task
+from molara.gui.surface_3d import calculate_surfaces
+from molara.gui.worker import Worker
+from molara.structure.io.importer import GeneralImporter
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestMOsDialogTasks(TestCase):
+    """Test the calculation of the orbital grids and surfaces of the MOs dialog."""
+
+    def setUp(self) -> None:
+        """Set up the grids of three orbitals of water."""
+        self.molecule = GeneralImporter("examples/molden/h2o.molden").load().mols[0]
+        orbitals = [3, 4, 5]
+        self.voxel_grid = VoxelGrid3D()
+        self.voxel_grid.origin = np.array([-2.5, -2.4, -2.6], dtype=np.float64)
+        self.voxel_grid.voxel_size = np.eye(3, dtype=np.float64) * 0.1
+        self.voxel_grid.voxel_number = np.array([50, 47, 53], dtype=np.int64)
+        self.mo_coefficients = self.molecule.mos.coefficients[:, orbitals]
+        self.cut_offs = self.molecule.mos.calculate_cut_offs(
+            self.molecule.basis_set,
+            orbitals,
+            threshold=1e-6,
+            max_distance=30.0,
+        )
+        self.grids = generate_voxel_grids(
+            self.voxel_grid.origin,
+            self.voxel_grid.voxel_size,
+            self.voxel_grid.voxel_number,
+            self.molecule.basis_set,
+            self.mo_coefficients,
+            self.cut_offs,
+        )
+
+    @staticmethod
+    def _run(task: Any, *args: Any) -> tuple[Any, list]:  # noqa: ANN401
+        """Run a task with a worker and collect its partial results."""
+        worker = Worker(task)
+        partial_results: list = []
+        worker.signals.partial_result.connect(partial_results.append)
+        return task(worker, *args), partial_results
+
+    def test_orbital_grids_task(self) -> None:
+        """Test the calculation of orbital grids and surfaces with and without the coarse preview."""
+        iso_value = 0.05
+        self.voxel_grid.grid = self.grids[1]
+        surfaces = calculate_surfaces(self.voxel_grid, iso_value, number_of_threads=2)
+
+        for coarsening_factor in [1, 4]:
+            result, partial_results = self._run(
+                calculate_orbital_grids_task,
+                self.voxel_grid,
+                self.molecule.basis_set,
+                self.mo_coefficients,
+                self.cut_offs,
+                1,
+                iso_value,
+                coarsening_factor,
+                2,
+            )
+            assert len(partial_results) == (coarsening_factor > 1)
+            result_grids, coarse_grids, refined_points, result_surfaces = result
+            assert result_grids.shape == self.grids.shape
+            assert (coarse_grids is None) == (refined_points is None) == (coarsening_factor == 1)
+            for (result_vertices, result_indices, _), (vertices, indices) in zip(
+                result_surfaces,
+                surfaces,
+                strict=True,
+            ):
+                np.testing.assert_allclose(result_vertices, vertices, atol=1e-6)
+                np.testing.assert_array_equal(result_indices, indices)
+
+        # The analytic normals are unit vectors close to the normals of the grid at the same vertices
+        analytic_normals = True
+        minimum_mean_alignment = 0.99
+        result, _ = self._run(
+            calculate_orbital_grids_task,
+            self.voxel_grid,
+            self.molecule.basis_set,
+            self.mo_coefficients,
+            self.cut_offs,
+            1,
+            iso_value,
+            1,
+            2,
+            analytic_normals,
+        )
+        for (result_vertices, result_indices, _), (vertices, indices) in zip(result[-1], surfaces, strict=True):
+            result_rows = result_vertices.reshape(-1, 6)
+            rows = vertices.reshape(-1, 6)
+            np.testing.assert_allclose(result_rows[:, :3], rows[:, :3], atol=1e-6)
+            np.testing.assert_array_equal(result_indices, indices)
+            np.testing.assert_allclose(np.linalg.norm(result_rows[:, 3:], axis=1), 1.0, atol=1e-5)
+            assert np.mean(np.sum(result_rows[:, 3:] * rows[:, 3:], axis=1)) > minimum_mean_alignment
+
+    def test_refine_orbital_grid_task(self) -> None:
+        """Test that a progressive grid is refined for another iso value without evaluating it again."""
+        exact_grid = self.grids[1]
+        (grids, coarse_grids, refined_points, _), _ = self._run(
+            calculate_orbital_grids_task,
+            self.voxel_grid,
+            self.molecule.basis_set,
+            self.mo_coefficients,
+            self.cut_offs,
+            1,
+            0.1,
+            4,
+            2,
+        )
+
+        iso_value = 0.01
+        self.voxel_grid.grid = grids[1]
+        (grid, new_refined_points, surfaces), _ = self._run(
+            refine_orbital_grid_task,
+            self.voxel_grid,
+            coarse_grids[1],
+            refined_points,
+            self.molecule.basis_set,
+            self.mo_coefficients[:, 1],
+            self.cut_offs,
+            iso_value,
+            4,
+            2,
+        )
+        assert grid is not self.voxel_grid.grid
+        assert np.all(new_refined_points[refined_points])
+        assert np.count_nonzero(new_refined_points) > np.count_nonzero(refined_points)
+        np.testing.assert_allclose(grid[new_refined_points], exact_grid[new_refined_points], atol=1e-14)
+        np.testing.assert_array_equal(grid[~new_refined_points], grids[1][~new_refined_points])
+        exact_voxel_grid = VoxelGrid3D()
+        exact_voxel_grid.grid = exact_grid
+        exact_voxel_grid.origin = self.voxel_grid.origin
+        exact_voxel_grid.voxel_size = self.voxel_grid.voxel_size
+        exact_voxel_grid.voxel_number = self.voxel_grid.voxel_number
+        for (vertices, indices, _), (exact_vertices, exact_indices) in zip(
+            surfaces,
+            calculate_surfaces(exact_voxel_grid, iso_value, 2),
+            strict=True,
+        ):
+            np.testing.assert_allclose(vertices, exact_vertices, atol=1e-6)
+            np.testing.assert_array_equal(indices, exact_indices)
+
+        # The grid is kept, if it is already refined for the iso value
+        self.voxel_grid.grid = grid
+        result, _ = self._run(
+            refine_orbital_grid_task,
+            self.voxel_grid,
+            coarse_grids[1],
+            new_refined_points,
+            self.molecule.basis_set,
+            self.mo_coefficients[:, 1],
+            self.cut_offs,
+            iso_value,
+            4,
+            2,
+        )
+        assert result[0] is grid
+        assert result[1] is new_refined_points
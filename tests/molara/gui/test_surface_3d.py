@@ -0,0 +1,60 @@
+"""Test the calculation of the surfaces of the 3D surface dialog."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+from molara.eval.generate_voxel_grid import generate_voxel_grids
+
+from molara.eval.mesh_simplification import calculate_levels_of_detail
+from molara.eval.voxel_grid import VoxelGrid3D
+from molara.gui.surface_3d import calculate_surfaces, calculate_surfaces_task
+from molara.gui.worker import Worker
+from molara.structure.io.importer import GeneralImporter
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestSurface3D(TestCase):
+    """Test the calculation of the surfaces of the 3D surface dialog."""
+
+    def test_levels_of_detail(self) -> None:
+        """Test that the levels of detail are calculated with the surfaces, but only for surfaces above the budget."""
+        molecule = GeneralImporter("examples/molden/h2o.molden").load().mols[0]
+        voxel_grid = VoxelGrid3D()
+        voxel_grid.origin = np.array([-2.5, -2.4, -2.6], dtype=np.float64)
+        voxel_grid.voxel_size = np.eye(3, dtype=np.float64) * 0.1
+        voxel_grid.voxel_number = np.array([50, 47, 53], dtype=np.int64)
+        cut_offs = molecule.mos.calculate_cut_offs(molecule.basis_set, [4], threshold=1e-6, max_distance=30.0)
+        voxel_grid.grid = generate_voxel_grids(
+            voxel_grid.origin,
+            voxel_grid.voxel_size,
+            voxel_grid.voxel_number,
+            molecule.basis_set,
+            molecule.mos.coefficients[:, [4]],
+            cut_offs,
+        )[0]
+        surfaces = calculate_surfaces(voxel_grid, 0.05)
+        budget = (surfaces[0][1].shape[0] + surfaces[1][1].shape[0]) // 2
+        for moving_index_budget in [None, 0, budget]:
+            worker = Worker(calculate_surfaces_task)
+            for (vertices, indices, levels_of_detail), (expected_vertices, expected_indices) in zip(
+                calculate_surfaces_task(worker, voxel_grid, 0.05, 1, moving_index_budget),
+                surfaces,
+                strict=True,
+            ):
+                np.testing.assert_array_equal(vertices, expected_vertices)
+                np.testing.assert_array_equal(indices, expected_indices)
+                if moving_index_budget is None or indices.shape[0] <= moving_index_budget:
+                    assert levels_of_detail is None
+                    continue
+                expected_levels = calculate_levels_of_detail(
+                    vertices,
+                    indices,
+                    voxel_grid.origin,
+                    voxel_grid.voxel_size,
+                )
+                for level, expected_level in zip(levels_of_detail, expected_levels, strict=True):
+                    np.testing.assert_array_equal(level[0], expected_level[0])
+                    np.testing.assert_array_equal(level[1], expected_level[1])
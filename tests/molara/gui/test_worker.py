@@ -0,0 +1,65 @@
+"""Test the calculations in the thread pool."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import pytest
+from PySide6.QtCore import QCoreApplication, QThreadPool
+from PySide6.QtWidgets import QApplication
+
+from molara.gui.worker import CalculationCancelledError, Worker
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+def add(worker: Worker, a: int, b: int) -> int:
+    """Add two numbers and report the progress."""
+    worker.report_progress(50, "Adding")
+    return a + b
+
+
+def fail(_: Worker) -> None:
+    """Raise an error."""
+    msg = "Calculation failed"
+    raise ValueError(msg)
+
+
+class TestWorker(TestCase):
+    """Test the calculations in the thread pool."""
+
+    def setUp(self) -> None:
+        """Set up the application and the thread pool."""
+        # A QApplication is needed, because it is shared with the tests of the dialogs
+        self.app = QApplication.instance() or QApplication([])
+        self.thread_pool = QThreadPool.globalInstance()
+        self.results: list = []
+
+    def _run(self, worker: Worker) -> None:
+        """Run a worker in the thread pool and collect its signals."""
+        worker.signals.progress.connect(lambda percent, message: self.results.append(("progress", percent, message)))
+        worker.signals.partial_result.connect(lambda result: self.results.append(("partial_result", result)))
+        worker.signals.finished.connect(lambda result: self.results.append(("finished", result)))
+        worker.signals.failed.connect(lambda message: self.results.append(("failed", message)))
+        self.thread_pool.start(worker)
+        self.thread_pool.waitForDone()
+        QCoreApplication.processEvents()
+
+    def test_finished(self) -> None:
+        """Test that the progress and the result are delivered."""
+        self._run(Worker(add, 1, 2))
+        assert self.results == [("progress", 50, "Adding"), ("finished", 3)]
+
+    def test_failed(self) -> None:
+        """Test that errors are delivered."""
+        self._run(Worker(fail))
+        assert self.results == [("failed", "Calculation failed")]
+
+    def test_cancelled(self) -> None:
+        """Test that a cancelled worker stops and does not deliver its result."""
+        worker = Worker(add, 1, 2)
+        worker.cancel()
+        with pytest.raises(CalculationCancelledError):
+            worker.check_cancelled()
+        self._run(worker)
+        assert self.results == []
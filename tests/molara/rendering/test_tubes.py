@@ -0,0 +1,47 @@
+"""Test the generation of tube meshes around polylines."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+
+from molara.rendering.tubes import generate_tubes
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestTubes(TestCase):
+    """Test the generation of tube meshes around polylines."""
+
+    def test_generate_tubes(self) -> None:
+        """Test that the tubes surround the polylines and connect the points of each polyline."""
+        angles = 2 * np.pi * np.arange(12) / 12
+        circle = np.stack((np.cos(angles), np.sin(angles), np.zeros(12)), axis=1)
+        line = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [2.0, 0.5, 0.0]])
+        points = np.vstack((circle, line))
+        polyline_offsets = np.array([0, 12, 15])
+        closed = np.array([True, False])
+        radius = 0.1
+        subdivisions = 6
+        normal = np.array([0.0, 0.0, 1.0])
+        vertices, indices = generate_tubes(points, polyline_offsets, closed, radius, normal, subdivisions)
+        assert vertices.dtype == np.float32
+        assert indices.dtype == np.uint32
+        rows = vertices.reshape(-1, 6)
+        assert rows.shape[0] == points.shape[0] * subdivisions
+        # The closed polyline has as many segments as points, the open one one less
+        assert indices.shape[0] == (12 + 2) * subdivisions * 6
+        assert np.all(indices < rows.shape[0])
+
+        # The vertices lie on the rings around the points, with the normals pointing away from the points
+        centers = np.repeat(points, subdivisions, axis=0)
+        np.testing.assert_allclose(rows[:, :3], centers + radius * rows[:, 3:], atol=1e-6)
+        np.testing.assert_allclose(np.linalg.norm(rows[:, 3:], axis=1), 1.0, atol=1e-6)
+        # The rings of the circle are perpendicular to the circle
+        tangents = np.stack((-np.sin(angles), np.cos(angles), np.zeros(12)), axis=1)
+        ring_normals = rows[: 12 * subdivisions, 3:].reshape(12, subdivisions, 3)
+        np.testing.assert_allclose(np.einsum("ijk,ik->ij", ring_normals, tangents), 0.0, atol=1e-6)
+
+        vertices, indices = generate_tubes(np.zeros((0, 3)), np.array([0]), np.array([]), radius, normal, subdivisions)
+        assert vertices.size == indices.size == 0
@@ -148,3 +148,48 @@ class TestCubeImporter(TestCase):
         assert isinstance(self.structure.mols[0], Molecule)
         number_of_atoms = 62
         assert len(self.structure.mols[0].atoms) == number_of_atoms
+
+
+class TestCubeImporterPrecision(TestCase):
+    """Test the import of cube files into voxel grids of single and double precision."""
+
+    def setUp(self) -> None:
+        """Write a small cube file with values of very different magnitudes."""
+        rng = np.random.default_rng(4)
+        self.values = rng.normal(size=(3, 4, 5)) * 10.0 ** rng.integers(-8, 2, size=(3, 4, 5))
+        lines = [
+            "Test cube file\n",
+            "Values of very different magnitudes\n",
+            "    2   -1.000000   -1.500000   -2.000000\n",
+            "    3    0.500000    0.000000    0.000000\n",
+            "    4    0.000000    0.500000    0.000000\n",
+            "    5    0.000000    0.000000    0.500000\n",
+            "    1    1.000000    0.000000    0.000000    0.000000\n",
+            "    1    1.000000    0.000000    0.000000    1.400000\n",
+        ]
+        lines += [" ".join(f"{value:13.5E}" for value in row) + "\n" for row in self.values.reshape(-1, 5)]
+        with NamedTemporaryFile(suffix=".cube") as file:
+            self.filename = file.name
+        with Path(self.filename).open("w", encoding="utf-8") as file:
+            file.writelines(lines)
+
+    def tearDown(self) -> None:
+        """Remove the cube file."""
+        Path(self.filename).unlink()
+
+    def test_single_precision(self) -> None:
+        """Test that the grid of single precision is the rounded grid of double precision."""
+        voxel_grid = CubeImporter(self.filename).load().mols[0].voxel_grid
+        single_voxel_grid = CubeImporter(self.filename, dtype=np.float32).load().mols[0].voxel_grid
+        assert voxel_grid.grid.dtype == np.float64
+        assert single_voxel_grid.grid.dtype == np.float32
+        np.testing.assert_allclose(voxel_grid.grid, self.values, rtol=1e-5, atol=0.0)
+        np.testing.assert_array_equal(single_voxel_grid.grid, voxel_grid.grid.astype(np.float32))
+        np.testing.assert_array_equal(single_voxel_grid.voxel_size, voxel_grid.voxel_size)
+        np.testing.assert_array_equal(
+            single_voxel_grid.block_ranges()[1],
+            voxel_grid.block_ranges()[1].astype(np.float32),
+        )
+
+        with pytest.raises(ValueError, match="The grids must be of type float32 or float64"):
+            CubeImporter(self.filename, dtype=np.int64)
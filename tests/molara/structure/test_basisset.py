@@ -9,6 +9,7 @@ import numpy as np
 from numpy.testing import assert_array_almost_equal_nulp
 
 from molara.structure.io.importer import GeneralImporter
+from molara.util.constants import ANGSTROM_TO_BOHR
 
 if TYPE_CHECKING:
     from numpy.typing import NDArray
@@ -66,6 +67,37 @@ class TestBasisset(TestCase):
                 )
         assert_array_almost_equal_nulp(overlap_matrix, self.correct_matrix, 2)
 
+    def test_packed_basis_set(self) -> None:
+        """Test that the packed basis set stores the first function of each shell and is kept until atoms move."""
+        molecule = GeneralImporter("examples/molden/SPDFG_orbitals.molden").load().mols[0]
+        basis_set = molecule.packed_basis_set
+        assert basis_set is not None
+        assert molecule.get_packed_basis_set() is basis_set
+        assert len(basis_set) == len(molecule.basis_set)
+        assert basis_set.shell_offsets.shape == (basis_set.number_of_shells + 1,)
+        assert basis_set.shell_offsets[-1] == len(molecule.basis_set)
+        for shell_index in range(basis_set.number_of_shells):
+            first, end = basis_set.shell_offsets[shell_index : shell_index + 2]
+            function = molecule.basis_set[first]
+            length = basis_set.shell_primitives[shell_index]
+            assert all(sum(molecule.basis_set[i].ijk) == basis_set.shell_types[shell_index] for i in range(first, end))
+            assert (
+                end - first == (basis_set.shell_types[shell_index] + 1) * (basis_set.shell_types[shell_index] + 2) // 2
+            )
+            np.testing.assert_array_equal(basis_set.shell_exponents[shell_index, :length], function.exponents)
+            np.testing.assert_array_equal(basis_set.shell_coefficients[shell_index, :length], function.coefficients)
+            np.testing.assert_array_equal(basis_set.shell_norms[shell_index, :length], function.norms)
+            np.testing.assert_allclose(basis_set.shell_positions[shell_index], function.position * ANGSTROM_TO_BOHR)
+
+        # Moving the atoms packs the basis set again with the new positions
+        molecule.center_coordinates()
+        moved_basis_set = molecule.get_packed_basis_set()
+        assert moved_basis_set is not basis_set
+        np.testing.assert_allclose(
+            moved_basis_set.shell_positions[0],
+            molecule.basis_set[0].position * ANGSTROM_TO_BOHR,
+        )
+
 
 def hermite_coefs(i: int, j: int, t: int, qx: float, a: float, b: float) -> float:  # noqa: PLR0913
     """Recursive definition of Hermite Gaussian coefficients.
@@ -5,6 +5,8 @@ from __future__ import annotations
 from unittest import TestCase
 
 import numpy as np
+import pytest
+from scipy.linalg import block_diag
 
 from molara.structure.io.importer import GeneralImporter
 
@@ -34,3 +36,63 @@ class TestMos(TestCase):
         # plt.plot(x, y)
         # plt.show()
         assert True
+
+    def test_cut_offs(self) -> None:
+        """Test the cutoff distances against a sample point by sample point evaluation of each shell."""
+        molecule = GeneralImporter("examples/molden/SPDFG_orbitals.molden").load().mols[0]
+        mos = molecule.mos
+        aos = molecule.basis_set
+        threshold = 1e-4
+        x_vals = np.linspace(0, 20.0, 100)
+        for orbital in [0, 7, 16]:
+            cut_offs = mos.calculate_cut_offs(aos, orbital, threshold, max_distance=20.0, max_points_number=100)
+
+            # The last function of each shell is the one evaluated for the cutoffs (s, pz, dyz, fxyz, gzzxy)
+            shell_index = 0
+            ao_index = 0
+            while ao_index < len(aos):
+                angular_momentum = sum(aos[ao_index].ijk)
+                number_of_functions = (angular_momentum + 1) * (angular_momentum + 2) // 2
+                function = aos[ao_index + number_of_functions - 1]
+                weight = np.max(np.abs(mos.coefficients[ao_index : ao_index + number_of_functions, orbital]))
+                values = np.array(
+                    [
+                        np.sum(function.coefficients * function.norms * np.exp(-function.exponents * x))
+                        * x**angular_momentum
+                        for x in x_vals
+                    ],
+                )
+                values = np.abs(values * weight)
+                below = np.nonzero(values[values.argmax() :] < threshold)[0]
+                reference = x_vals[values.argmax() + below[0]] if below.size > 0 else 1.0e300
+                if weight == 0.0:
+                    reference = 0.0
+                assert cut_offs[shell_index] == reference
+                shell_index += 1
+                ao_index += number_of_functions
+            assert shell_index == len(cut_offs)
+
+        # The envelopes are cached for the basis set and only recalculated for a different sampling
+        envelopes = mos.calculate_shell_envelopes(aos, 20.0, 100)
+        assert mos.calculate_shell_envelopes(aos, 20.0, 100) is envelopes
+        assert mos.calculate_shell_envelopes(aos, 25.0, 100) is not envelopes
+
+    def test_block_transformation(self) -> None:
+        """Test the shell block by shell block transformation against the dense block diagonal matrix."""
+        for file in ["examples/molden/SPDFG_orbitals.molden", "examples/molden/caffeine.molden"]:
+            mos = GeneralImporter(file).load().mols[0].mos
+            transformation = block_diag(
+                *[mos.transformation_blocks[angular_momentum] for angular_momentum in mos.shell_angular_momenta],
+            )
+            assert transformation.shape == (mos.shell_spherical_offsets[-1], mos.shell_cartesian_offsets[-1])
+            np.testing.assert_allclose(mos.coefficients, transformation.T @ mos.coefficients_spherical, atol=1e-14)
+
+            rng = np.random.default_rng(3)
+            matrix = rng.normal(size=(transformation.shape[1], transformation.shape[1]))
+            np.testing.assert_allclose(
+                mos.project_to_spherical(matrix),
+                transformation @ matrix @ transformation.T,
+                atol=1e-12,
+            )
+            with pytest.raises(ValueError, match="The number of basis functions does not match"):
+                mos.spherical_to_cartesian_transformation(mos.coefficients)
@@ -0,0 +1,5 @@
+"""Init file for util tests module."""
+
+from __future__ import annotations
+
+__copyright__ = "Copyright 2024, Molara"
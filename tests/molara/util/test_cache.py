@@ -0,0 +1,77 @@
+"""Test the least recently used cache."""
+
+from __future__ import annotations
+
+from unittest import TestCase
+
+import numpy as np
+
+from molara.eval.voxel_grid import VoxelGrid3D
+from molara.util.cache import LRUCache, size_in_bytes
+
+__copyright__ = "Copyright 2024, Molara"
+
+
+class TestLRUCache(TestCase):
+    """Test the least recently used cache."""
+
+    def setUp(self) -> None:
+        """Set up a cache for three arrays of 800 bytes."""
+        self.array_size = 800
+        self.number_of_arrays = 3
+        self.cache = LRUCache(byte_budget=self.number_of_arrays * self.array_size)
+        self.arrays = [np.full(100, i, dtype=np.float64) for i in range(4)]
+
+    def test_size_in_bytes(self) -> None:
+        """Test the size of nested values."""
+        voxel_grid = VoxelGrid3D()
+        voxel_grid.grid = np.zeros((2, 3, 4), dtype=np.float32)
+        grid_size = 96
+        assert size_in_bytes(self.arrays[0]) == self.array_size
+        assert size_in_bytes(voxel_grid) == grid_size
+        nested_value = (self.arrays[0], [self.arrays[1], {"a": voxel_grid}], "key", 3)
+        assert size_in_bytes(nested_value) == 2 * self.array_size + grid_size
+        assert size_in_bytes(None) == 0
+
+    def test_eviction(self) -> None:
+        """Test that the least recently used entries are evicted first."""
+        for i in range(3):
+            self.cache.put(i, self.arrays[i])
+        assert len(self.cache) == self.number_of_arrays
+        assert self.cache.size_in_bytes == self.cache.byte_budget
+
+        # Using the first entry makes the second one the least recently used
+        assert self.cache.get(0) is self.arrays[0]
+        self.cache.put(3, self.arrays[3])
+        assert 1 not in self.cache
+        assert all(i in self.cache for i in (0, 2, 3))
+        assert self.cache.size_in_bytes == self.cache.byte_budget
+        assert self.cache.get(1) is None
+        assert self.cache.get(1, "missing") == "missing"
+
+    def test_replace_and_remove(self) -> None:
+        """Test that replaced and removed entries are no longer counted."""
+        self.cache.put("a", self.arrays[0])
+        self.cache.put("a", (self.arrays[1], self.arrays[2]))
+        assert len(self.cache) == 1
+        assert self.cache.size_in_bytes == 2 * self.array_size
+        self.cache.remove("a")
+        self.cache.remove("b")
+        assert len(self.cache) == 0
+        assert self.cache.size_in_bytes == 0
+
+    def test_budget(self) -> None:
+        """Test that entries larger than the budget are skipped and a smaller budget evicts entries."""
+        self.cache.put("large", np.zeros(1000, dtype=np.float64))
+        assert "large" not in self.cache
+        assert self.cache.size_in_bytes == 0
+
+        for i in range(3):
+            self.cache.put(i, self.arrays[i])
+        self.cache.byte_budget = self.array_size + 200
+        assert len(self.cache) == 1
+        assert self.number_of_arrays - 1 in self.cache
+        assert self.cache.size_in_bytes == self.array_size
+        self.cache.clear()
+        assert len(self.cache) == 0
+        assert self.cache.size_in_bytes == 0